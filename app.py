@@ -54,10 +54,24 @@ with app.app_context():
     # Import models here to avoid circular imports
     import models
     db.create_all()
+    
+    # Bring tables created by earlier versions up to date
+    from migrations import run_migrations
+    run_migrations()
+    
+    # Fill the booking analytics rollups for bookings made before they existed
+    from booking_stats import backfill_booking_rollups
+    backfill_booking_rollups()
 
 # Import and register routes
 from routes import init_routes
 init_routes(app)
 
+# Register command line tools (flask --app app import-bookings ..., flask --app app run-worker)
+import booking_import
+import job_queue
+booking_import.init_cli(app)
+job_queue.init_cli(app)
+
 # Log that the application is ready
 logging.debug("Application initialized and ready to serve requests")
@@ -0,0 +1,182 @@
+import logging
+from datetime import datetime, timedelta
+import pytz
+
+# Event statuses that block a time slot
+BUSY_STATUSES = ('busy', 'tentative', 'oof', 'workingElsewhere')
+
+WEEKDAY_ORDER = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+def to_utc(value):
+    """Return a timezone-aware UTC datetime, assuming UTC for naive values"""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=pytz.UTC)
+    return value.astimezone(pytz.UTC)
+
+def parse_event_time(value):
+    """
+    Convert an event boundary into a UTC datetime
+
+    Events can come straight from a feed refresh (datetime objects), from the
+    JSON cache (ISO strings) or in the legacy Graph API shape ({'dateTime': ...}).
+    """
+    if isinstance(value, dict):
+        value = value.get('dateTime')
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return to_utc(value)
+
+def is_busy_event(event):
+    """Check whether an event blocks the time it covers"""
+    show_as = event.get('show_as', event.get('showAs', 'busy'))
+    return show_as in BUSY_STATUSES
+
+def merge_busy_intervals(events):
+    """
+    Merge busy events into a sorted list of non-overlapping (start, end) intervals
+
+    Overlapping and touching events are coalesced, so the result can be swept
+    once from left to right.
+    """
+    intervals = []
+    for event in events:
+        if not is_busy_event(event):
+            continue
+        try:
+            start = parse_event_time(event['start'])
+            end = parse_event_time(event['end'])
+        except (KeyError, TypeError, ValueError) as e:
+            logging.warning(f"Skipping event with invalid times: {e}")
+            continue
+        if end > start:
+            intervals.append((start, end))
+
+    return merge_intervals(intervals)
+
+def merge_intervals(intervals):
+    """Sort (start, end) ranges and coalesce the ones that overlap or touch"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+def iter_free_slots(slots, busy_intervals):
+    """
+    Yield the slots that do not overlap any busy interval
+
+    Both inputs must be sorted by start time and busy_intervals must be merged
+    (see merge_busy_intervals), which lets a single pointer walk the busy list
+    while the slots are swept in order.
+    """
+    index = 0
+    count = len(busy_intervals)
+    for slot in slots:
+        slot_start = to_utc(slot['start'])
+        slot_end = to_utc(slot['end'])
+
+        # Skip busy intervals that end before this slot begins
+        while index < count and busy_intervals[index][1] <= slot_start:
+            index += 1
+
+        if index == count or busy_intervals[index][0] >= slot_end:
+            yield slot
+
+class TimeSlot:
+    """
+    A bookable slot whose display strings are only formatted when read
+
+    Slots used to be dicts, so item access (slot['start'],
+    slot['display']) still works; to_dict gives the JSON shape.
+    """
+
+    __slots__ = ('start', 'end', 'duration')
+
+    FIELDS = ('start', 'end', 'duration', 'formatted_start', 'formatted_end', 'display')
+
+    def __init__(self, start, end, duration):
+        self.start = start
+        self.end = end
+        self.duration = duration
+
+    @property
+    def formatted_start(self):
+        return self.start.strftime('%Y-%m-%dT%H:%M:%S')
+
+    @property
+    def formatted_end(self):
+        return self.end.strftime('%Y-%m-%dT%H:%M:%S')
+
+    @property
+    def display(self):
+        return self.start.strftime('%A, %B %d, %Y %I:%M %p') + ' - ' + self.end.strftime('%I:%M %p')
+
+    def __getitem__(self, key):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __eq__(self, other):
+        if not isinstance(other, TimeSlot):
+            return NotImplemented
+        return (self.start, self.end, self.duration) == (other.start, other.end, other.duration)
+
+    def __repr__(self):
+        return f"<TimeSlot {self.formatted_start} - {self.formatted_end}>"
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+def iter_time_slots(start_date, end_date, slot_duration=30):
+    """Yield TimeSlots between start_date and end_date with the given duration in minutes"""
+    current_time = start_date
+    
+    # Assuming working hours are 9 AM to 5 PM
+    working_start_hour = 9
+    working_end_hour = 17
+    
+    while current_time < end_date:
+        day_start = datetime(
+            current_time.year, current_time.month, current_time.day,
+            working_start_hour, 0, 0, tzinfo=current_time.tzinfo
+        )
+        day_end = datetime(
+            current_time.year, current_time.month, current_time.day,
+            working_end_hour, 0, 0, tzinfo=current_time.tzinfo
+        )
+        
+        # Skip if current_time is past working hours for the day
+        if current_time.time() >= day_end.time():
+            # Move to the next day
+            current_time = datetime(
+                current_time.year, current_time.month, current_time.day,
+                0, 0, 0, tzinfo=current_time.tzinfo
+            ) + timedelta(days=1)
+            continue
+        
+        # Start from working hours if current_time is before working hours
+        if current_time.time() < day_start.time():
+            current_time = day_start
+        
+        slot_start = current_time
+        slot_end = slot_start + timedelta(minutes=slot_duration)
+        
+        # Skip if slot ends after working hours
+        if slot_end.time() > day_end.time():
+            # Move to the next day
+            current_time = datetime(
+                current_time.year, current_time.month, current_time.day,
+                0, 0, 0, tzinfo=current_time.tzinfo
+            ) + timedelta(days=1)
+            continue
+        
+        # Skip weekends (assuming 0 = Monday, 6 = Sunday)
+        weekday = slot_start.weekday()
+        if weekday < 5:  # Only include Monday to Friday
+            yield TimeSlot(slot_start, slot_end, slot_duration)
+        
+        # Move to the next slot
+        current_time = slot_end
@@ -0,0 +1,51 @@
+import numpy as np
+
+MINUTES_PER_DAY = 24 * 60
+
+def cells_per_day(resolution):
+    """Bitmap cells in one day at a resolution in minutes (which must divide a day)"""
+    if resolution <= 0 or MINUTES_PER_DAY % resolution:
+        raise ValueError(f"Bitmap resolution must divide a day, got {resolution} minutes")
+    return MINUTES_PER_DAY // resolution
+
+def cell_range(starts, ends, origin, resolution, cells):
+    """
+    First and past-the-last cell touched by each [start, end) range (datetime64 arrays)
+
+    Starts round down and ends round up, so a range that covers part of a
+    cell takes the whole cell. Indexes are clipped to [0, cells].
+    """
+    step = np.timedelta64(resolution, 'm')
+    first = (starts - origin) // step
+    last = -((origin - ends) // step)  # Ceiling division
+    return np.clip(first, 0, cells), np.clip(last, 0, cells)
+
+def busy_bitmap(starts, ends, origin, days, resolution):
+    """
+    Boolean (days, cells per day) array of the cells any busy range touches
+
+    starts and ends are naive UTC datetime64 arrays, origin the midnight
+    (UTC) of the first day. Ranges outside the days are clipped away.
+    """
+    cells = days * cells_per_day(resolution)
+    positive = ends > starts
+    first, last = cell_range(starts[positive], ends[positive], origin, resolution, cells)
+    marked = last > first
+    # +1 where a range opens and -1 where it closes; a cell is busy while the running sum is positive
+    changes = np.zeros(cells + 1, dtype=np.int32)
+    np.add.at(changes, first[marked], 1)
+    np.add.at(changes, last[marked], -1)
+    return (np.cumsum(changes[:-1]) > 0).reshape(days, -1)
+
+def bitmap_free_mask(slot_starts, slot_ends, busy, origin, resolution):
+    """
+    Which [start, end) slots cover no busy cell of a (days, cells per day) bitmap
+
+    A prefix sum of the busy cells answers each slot with two lookups,
+    however long the slot is.
+    """
+    flat = busy.ravel()
+    prefix = np.zeros(len(flat) + 1, dtype=np.int64)
+    np.cumsum(flat, out=prefix[1:])
+    first, last = cell_range(slot_starts, slot_ends, origin, resolution, len(flat))
+    return prefix[last] == prefix[first]
@@ -0,0 +1,266 @@
+"""
+Per-link availability rules
+
+A shared link's rules say when it can be booked: weekly opening hours in
+the owner's time zone, the slot duration and step between slot starts,
+buffers kept free around other appointments and the minimum notice
+before a booking. They are stored as JSON on the link and compiled into
+a SlotTemplate: the slot offsets of every weekday are worked out once, so
+producing the slots of any window only turns each day's opening hours
+into UTC (which is where DST is accounted for) and adds the offsets.
+"""
+
+import json
+import re
+from datetime import datetime, time, timedelta
+from functools import lru_cache
+import pytz
+from availability import WEEKDAY_ORDER, TimeSlot, to_utc
+from config import DEFAULT_SLOT_DURATION
+
+WEEKDAYS = [day.lower() for day in WEEKDAY_ORDER]
+TIME_OF_DAY = re.compile(r'^(\d{1,2}):(\d{2})$')
+
+# Monday to Friday, 9:00 to 17:00, as iter_time_slots assumes
+DEFAULT_WEEKLY_HOURS = {day: [('09:00', '17:00')] for day in WEEKDAYS[:5]}
+
+# Upper bounds for the minute settings
+MAX_SLOT_MINUTES = 24 * 60
+MAX_NOTICE_MINUTES = 366 * 24 * 60
+
+def parse_time_of_day(value):
+    """Minutes after midnight for "HH:MM" ("24:00" is the end of the day)"""
+    match = TIME_OF_DAY.match(str(value).strip())
+    if not match:
+        raise ValueError(f"Invalid time {value!r}, expected HH:MM")
+    hours, minutes = int(match.group(1)), int(match.group(2))
+    if minutes > 59 or hours * 60 + minutes > 24 * 60:
+        raise ValueError(f"Invalid time {value!r}")
+    return hours * 60 + minutes
+
+def format_time_of_day(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+def parse_minutes(data, name, default, minimum, maximum):
+    value = data.get(name, default)
+    if value is None:
+        return default
+    if isinstance(value, bool) or not isinstance(value, int) or not minimum <= value <= maximum:
+        raise ValueError(f"{name} must be a whole number of minutes between {minimum} and {maximum}")
+    return value
+
+class AvailabilityRules:
+    """
+    Validated availability rules of a shared link
+
+    weekly_hours maps lowercase weekday names to lists of (start, end)
+    minutes after midnight; days that are missing are closed.
+    """
+
+    def __init__(self, timezone='UTC', weekly_hours=None, slot_duration=DEFAULT_SLOT_DURATION, slot_step=None,
+                 buffer_before=0, buffer_after=0, minimum_notice=0):
+        self.timezone = timezone
+        self.weekly_hours = weekly_hours if weekly_hours is not None else {
+            day: [(parse_time_of_day(start), parse_time_of_day(end)) for start, end in ranges]
+            for day, ranges in DEFAULT_WEEKLY_HOURS.items()
+        }
+        self.slot_duration = slot_duration
+        self.slot_step = slot_step or slot_duration
+        self.buffer_before = buffer_before
+        self.buffer_after = buffer_after
+        self.minimum_notice = minimum_notice
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build rules from their JSON form, filling in defaults; raises ValueError for invalid rules"""
+        if not isinstance(data, dict):
+            raise ValueError("Availability rules must be an object")
+        unknown = set(data) - {'timezone', 'weekly_hours', 'slot_duration', 'slot_step',
+                               'buffer_before', 'buffer_after', 'minimum_notice'}
+        if unknown:
+            raise ValueError(f"Unknown settings: {', '.join(sorted(unknown))}")
+
+        timezone = data.get('timezone') or 'UTC'
+        try:
+            pytz.timezone(timezone)
+        except pytz.UnknownTimeZoneError:
+            raise ValueError(f"Unknown time zone {timezone!r}")
+
+        weekly_hours = None
+        if data.get('weekly_hours') is not None:
+            if not isinstance(data['weekly_hours'], dict):
+                raise ValueError("weekly_hours must map weekdays to lists of [start, end] times")
+            weekly_hours = {}
+            for day, ranges in data['weekly_hours'].items():
+                if day.lower() not in WEEKDAYS:
+                    raise ValueError(f"Unknown weekday {day!r}")
+                if not isinstance(ranges, list):
+                    raise ValueError(f"Hours for {day} must be a list of [start, end] times")
+                parsed = []
+                for time_range in ranges:
+                    if not isinstance(time_range, (list, tuple)) or len(time_range) != 2:
+                        raise ValueError(f"Hours for {day} must be a list of [start, end] times")
+                    start, end = parse_time_of_day(time_range[0]), parse_time_of_day(time_range[1])
+                    if end <= start:
+                        raise ValueError(f"Hours for {day} must end after they start")
+                    parsed.append((start, end))
+                parsed.sort()
+                if any(later[0] < earlier[1] for earlier, later in zip(parsed, parsed[1:])):
+                    raise ValueError(f"Hours for {day} overlap")
+                weekly_hours[day.lower()] = parsed
+
+        slot_duration = parse_minutes(data, 'slot_duration', DEFAULT_SLOT_DURATION, 5, MAX_SLOT_MINUTES)
+        return cls(
+            timezone=timezone,
+            weekly_hours=weekly_hours,
+            slot_duration=slot_duration,
+            slot_step=parse_minutes(data, 'slot_step', slot_duration, 5, MAX_SLOT_MINUTES),
+            buffer_before=parse_minutes(data, 'buffer_before', 0, 0, MAX_SLOT_MINUTES),
+            buffer_after=parse_minutes(data, 'buffer_after', 0, 0, MAX_SLOT_MINUTES),
+            minimum_notice=parse_minutes(data, 'minimum_notice', 0, 0, MAX_NOTICE_MINUTES)
+        )
+
+    @classmethod
+    def from_json(cls, value):
+        """Rules stored on a shared link; None (never configured) gives the defaults"""
+        return cls.from_dict(json.loads(value)) if value else cls()
+
+    def to_dict(self):
+        return {
+            'timezone': self.timezone,
+            'weekly_hours': {
+                day: [[format_time_of_day(start), format_time_of_day(end)] for start, end in self.weekly_hours[day]]
+                for day in WEEKDAYS if self.weekly_hours.get(day)
+            },
+            'slot_duration': self.slot_duration,
+            'slot_step': self.slot_step,
+            'buffer_before': self.buffer_before,
+            'buffer_after': self.buffer_after,
+            'minimum_notice': self.minimum_notice
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), sort_keys=True)
+
+    def compile(self):
+        return SlotTemplate(self)
+
+class SlotTemplate:
+    """
+    Availability rules compiled for slot generation
+
+    For each weekday, the opening hours are kept as (open, close, slot
+    offsets): open and close in minutes after local midnight, the offsets
+    of the slot starts as timedeltas from it.
+    """
+
+    def __init__(self, rules):
+        self.timezone = pytz.timezone(rules.timezone)
+        self.slot_duration = rules.slot_duration
+        self.duration = timedelta(minutes=rules.slot_duration)
+        self.step = timedelta(minutes=rules.slot_step)
+        self.buffer_before = timedelta(minutes=rules.buffer_before)
+        self.buffer_after = timedelta(minutes=rules.buffer_after)
+        self.minimum_notice = timedelta(minutes=rules.minimum_notice)
+        self.days = []
+        for day in WEEKDAYS:
+            ranges = []
+            for start, end in rules.weekly_hours.get(day, []):
+                offsets = tuple(timedelta(minutes=offset)
+                                for offset in range(start, end - rules.slot_duration + 1, rules.slot_step))
+                if offsets:
+                    ranges.append((start, end, offsets))
+            self.days.append(tuple(ranges))
+
+    def local_time(self, day, minutes):
+        """The UTC datetime of a wall-clock time in the owner's time zone, or None if it does not exist"""
+        wall = datetime.combine(day, time()) + timedelta(minutes=minutes)
+        try:
+            return self.timezone.localize(wall, is_dst=None).astimezone(pytz.UTC)
+        except pytz.NonExistentTimeError:
+            # Skipped by a DST change
+            return None
+        except pytz.AmbiguousTimeError:
+            # Repeated by a DST change: take the first occurrence
+            return self.timezone.localize(wall, is_dst=True).astimezone(pytz.UTC)
+
+    def utc_offset(self, day, minutes):
+        """The owner's UTC offset at a wall-clock time, or None if the time does not exist"""
+        utc = self.local_time(day, minutes)
+        if utc is None:
+            return None
+        return datetime.combine(day, time()) + timedelta(minutes=minutes) - utc.replace(tzinfo=None)
+
+    def iter_day_starts(self, day, ranges):
+        """UTC starts of the slots of one day (with None for starts that do not exist)"""
+        first_offset = self.utc_offset(day, ranges[0][0])
+        if first_offset is not None and first_offset == self.utc_offset(day, ranges[-1][1]):
+            # No DST change during opening hours: one offset serves every slot
+            midnight = (datetime.combine(day, time()) - first_offset).replace(tzinfo=pytz.UTC)
+            for _, _, offsets in ranges:
+                for offset in offsets:
+                    yield midnight + offset
+            return
+        for _, close_minutes, offsets in ranges:
+            closes = self.local_time(day, close_minutes)
+            for offset in offsets:
+                slot_start = self.local_time(day, offset // timedelta(minutes=1))
+                # Hours shortened by the change can no longer fit the slot
+                if slot_start is not None and closes is not None and slot_start + self.duration > closes:
+                    slot_start = None
+                yield slot_start
+
+    def iter_slots(self, start_date, end_date):
+        """Yield the TimeSlots (in UTC) that start in [start_date, end_date), in order"""
+        start_date, end_date = to_utc(start_date), to_utc(end_date)
+        if start_date >= end_date:
+            return
+        day = start_date.astimezone(self.timezone).date()
+        last_day = end_date.astimezone(self.timezone).date()
+        while day <= last_day:
+            ranges = self.days[day.weekday()]
+            if ranges:
+                for slot_start in self.iter_day_starts(day, ranges):
+                    if slot_start is None or slot_start < start_date:
+                        continue
+                    if slot_start >= end_date:
+                        return
+                    yield TimeSlot(slot_start, slot_start + self.duration, self.slot_duration)
+            day += timedelta(days=1)
+
+    def is_slot(self, start, end):
+        """Whether [start, end) is one of the slots the rules generate (weekly hours, duration and step)"""
+        start, end = to_utc(start), to_utc(end)
+        if end - start != self.duration:
+            return False
+        return next(self.iter_slots(start, start + timedelta(microseconds=1)), None) is not None
+
+    def expand_busy_intervals(self, intervals):
+        """
+        Widen merged busy intervals by the buffers
+
+        A slot then only needs to miss the widened intervals to keep
+        buffer_before free before it and buffer_after free after it.
+        """
+        if not self.buffer_before and not self.buffer_after:
+            return intervals
+        widened = []
+        for start, end in intervals:
+            start, end = start - self.buffer_after, end + self.buffer_before
+            if widened and start <= widened[-1][1]:
+                widened[-1] = (widened[-1][0], max(widened[-1][1], end))
+            else:
+                widened.append((start, end))
+        return widened
+
+    def earliest_start(self, now=None):
+        """The earliest slot start that respects the minimum notice"""
+        return (now or datetime.now(pytz.UTC)) + self.minimum_notice
+
+@lru_cache(maxsize=1024)
+def compile_rules(rules_json):
+    """The SlotTemplate for a link's stored rules JSON, compiled once per distinct value"""
+    return AvailabilityRules.from_json(rules_json).compile()
+
+def get_slot_template(shared_link):
+    return compile_rules(shared_link.availability_rules or None)
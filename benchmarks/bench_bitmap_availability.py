@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Compare the bitmap availability engine with the interval engine
+
+Fills a throwaway SQLite database with links over 1, 4 and 16 calendars
+whose busy events fall on 5-minute boundaries, then times get_free_slots
+(interval sweep) against get_bitmap_free_slots, cold (bitmaps built from
+the event store) and warm (bitmaps served from the per-calendar cache).
+Exits with status 1 if the two engines return different slots.
+
+Usage:
+    python benchmarks/bench_bitmap_availability.py [--days 90] [--events-per-day 12] [--calendars 1 4 16]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def timed(func, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--events-per-day', type=int, default=12, help='busy events per calendar per day')
+    parser.add_argument('--calendars', type=int, nargs='+', default=[1, 4, 16])
+    args = parser.parse_args()
+
+    # Keep the database and session files out of the project tree
+    workdir = tempfile.mkdtemp(prefix='bitmap_bench_')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.setdefault('SESSION_SECRET', 'bench')
+    os.chdir(workdir)
+
+    import logging
+    import pytz
+    from sqlalchemy import insert
+    from app import app, db
+    from calendar_sync import get_free_slots
+    from models import Calendar, CalendarEvent, SharedLink, User
+    from slot_cache import calendar_bitmaps, get_bitmap_free_slots
+    logging.getLogger().setLevel(logging.CRITICAL)
+
+    rng = random.Random(7)
+    start_date = datetime(2030, 1, 7, tzinfo=pytz.UTC)
+    end_date = start_date + timedelta(days=args.days)
+
+    print(f"{args.days} days, {args.events_per_day} events per calendar per day")
+    print(f"{'calendars':>9} {'events':>7} {'free':>6} {'intervals ms':>13} {'bitmap cold ms':>15} "
+          f"{'bitmap warm ms':>15} {'speedup':>8}")
+    failed = False
+    with app.app_context():
+        for count in args.calendars:
+            user = User(username=f'bench-{count}', email=f'bench-{count}@example.com', password_hash='x')
+            db.session.add(user)
+            db.session.flush()
+            calendars = [Calendar(user_id=user.id, name=f'Calendar {i}', ics_url='http://127.0.0.1/unused.ics',
+                                  last_synced=datetime.utcnow()) for i in range(count)]
+            link = SharedLink(user_id=user.id, link_id=f'bench-{count}', name='Bench', calendars=calendars)
+            db.session.add(link)
+            db.session.flush()
+
+            rows = []
+            for calendar in calendars:
+                for day in range(args.days):
+                    for _ in range(args.events_per_day):
+                        start = start_date.replace(tzinfo=None) + timedelta(days=day, minutes=rng.randrange(0, 24 * 60, 5))
+                        rows.append({'calendar_id': calendar.id, 'uid': f'{calendar.id}-{len(rows)}',
+                                     'subject': 'Busy', 'start': start,
+                                     'end': start + timedelta(minutes=rng.choice([15, 30, 45, 60])),
+                                     'show_as': rng.choice(['busy', 'busy', 'busy', 'free'])})
+            db.session.execute(insert(CalendarEvent), rows)
+            db.session.commit()
+
+            intervals, interval_time = timed(get_free_slots, calendars, start_date, end_date, shared_link=link)
+            calendar_bitmaps.clear()
+            cold, cold_time = timed(get_bitmap_free_slots, calendars, start_date, end_date, link)
+            warm, warm_time = timed(get_bitmap_free_slots, calendars, start_date, end_date, link)
+
+            if intervals != cold or intervals != warm:
+                print(f"  engines disagree with {count} calendars")
+                failed = True
+            print(f"{count:>9} {len(rows):>7} {len(intervals):>6} {interval_time * 1000:>13.1f} "
+                  f"{cold_time * 1000:>15.1f} {warm_time * 1000:>15.1f} {interval_time / warm_time:>7.1f}x")
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Compare booking analytics backends: ORM materialization, SQL GROUP BY and rollups
+
+Fills a database with synthetic bookings, then times each backend over a
+few ranges and reports how many rows each one pulls out of the database.
+Results of the SQL and rollup backends are checked against the ORM one.
+Uses a throwaway SQLite database unless --database-url points elsewhere
+(for example a scratch PostgreSQL database).
+
+Usage:
+    python benchmarks/bench_booking_analytics.py [--bookings 50000] [--links 5] [--database-url URL]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def orm_booking_analytics(shared_links, start_date, end_date):
+    """The previous implementation: load every booking in the range and count in Python"""
+    from booking_stats import BookingTally
+    from models import Booking
+
+    bookings = Booking.query.filter(
+        Booking.shared_link_id.in_([link.id for link in shared_links]),
+        Booking.start_time >= start_date,
+        Booking.start_time <= end_date
+    ).all()
+    tally = BookingTally({link.id: link.name for link in shared_links})
+    for booking in bookings:
+        duration = (booking.end_time - booking.start_time).total_seconds()
+        tally.add(booking.shared_link_id, booking.start_time.date(), booking.start_time.hour, 1, duration)
+        tally.customers[booking.customer_email] += 1
+    return tally.result(start_date, end_date), len(bookings)
+
+def without_customer_order(result):
+    """Top customers with equal counts may come back in any order"""
+    result = dict(result)
+    result['top_customers'] = sorted(customer['count'] for customer in result['top_customers'])
+    return result
+
+def timed(func, *args, repeat=5):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--bookings', type=int, default=50000)
+    parser.add_argument('--links', type=int, default=5)
+    parser.add_argument('--customers', type=int, default=2000)
+    parser.add_argument('--database-url', help='database to fill (defaults to a temporary SQLite file)')
+    args = parser.parse_args()
+
+    # Keep the database and session files out of the project tree
+    workdir = tempfile.mkdtemp(prefix='analytics_bench_')
+    os.environ['DATABASE_URL'] = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.setdefault('SESSION_SECRET', 'bench')
+    os.chdir(workdir)
+
+    import logging
+    from sqlalchemy import func, insert, select
+    from app import app, db
+    from models import Booking, SharedLink, User
+    from booking_stats import (
+        get_rollup_booking_analytics, get_sql_booking_analytics, hourly_totals_query, rebuild_booking_rollups
+    )
+    logging.getLogger().setLevel(logging.WARNING)
+
+    rng = random.Random(0)
+    now = datetime(2025, 6, 30, 17, 23)
+    with app.app_context():
+        user = User(username=f'bench{rng.random()}', email=f'bench{rng.random()}@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        links = []
+        for i in range(args.links):
+            link = SharedLink(user_id=user.id, link_id=f'bench-{user.id}-{i}', name=f"Link {i}", calendar_ids='')
+            db.session.add(link)
+            links.append(link)
+        db.session.flush()
+
+        # Bookings fall in working hours on weekdays, like the slots customers are offered
+        working_days = [
+            day for day in (now.replace(hour=0, minute=0) - timedelta(days=offset) for offset in range(365))
+            if day.weekday() < 5
+        ]
+        rows = []
+        for _ in range(args.bookings):
+            start = rng.choice(working_days) + timedelta(minutes=rng.randrange(9 * 60, 17 * 60, 15))
+            rows.append({
+                'shared_link_id': rng.choice(links).id,
+                'customer_name': 'Customer',
+                'customer_email': f"customer{int(rng.paretovariate(1.2)) % args.customers}@example.com",
+                'start_time': start,
+                'end_time': start + timedelta(minutes=rng.choice([15, 30, 45, 60])),
+                'subject': 'Meeting',
+                'status': 'confirmed'
+            })
+        db.session.execute(insert(Booking), rows)
+        db.session.commit()
+        rebuild_booking_rollups()
+
+        print(f"{args.bookings} bookings over {args.links} links, {db.engine.dialect.name}")
+        print(f"{'range':>9} {'backend':>8} {'rows':>8} {'ms':>9} {'speedup':>8}")
+        for days in (7, 30, 365):
+            start = now - timedelta(days=days)
+            (expected, orm_rows), orm_time = timed(orm_booking_analytics, links, start, now)
+            link_ids = [link.id for link in links]
+            sql_rows = db.session.execute(
+                select(func.count()).select_from(hourly_totals_query(link_ids, start, now).subquery())
+            ).scalar() + len(expected['top_customers'])
+
+            sql_result, sql_time = timed(get_sql_booking_analytics, user.id, links, start, now)
+            rollup_result, rollup_time = timed(get_rollup_booking_analytics, user.id, links, start, now)
+            for name, result in (('sql', sql_result), ('rollup', rollup_result)):
+                if without_customer_order(result) != without_customer_order(expected):
+                    sys.exit(f"{name} backend disagrees with the ORM backend for the last {days} days")
+
+            label = f"{days}d"
+            print(f"{label:>9} {'orm':>8} {orm_rows:>8} {orm_time * 1000:>9.1f} {'':>8}")
+            print(f"{label:>9} {'sql':>8} {sql_rows:>8} {sql_time * 1000:>9.1f} {orm_time / sql_time:>7.1f}x")
+            print(f"{label:>9} {'rollup':>8} {'-':>8} {rollup_time * 1000:>9.1f} {orm_time / rollup_time:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Load-test concurrent bookings against one shared link
+
+Starts a few hundred threads that all book at the same moment, each
+picking one of a small set of slots (some of them partially overlapping),
+so most requests race for a slot somebody else is taking. Afterwards the
+confirmed bookings are checked for overlaps and the script exits with
+status 1 on any double-booking, any unexpected error, or when the slowest
+request exceeds --max-latency. A second link sharing the calendar also
+books, since bookings of either link must exclude each other. Uses a
+throwaway SQLite database unless --database-url points elsewhere (for
+example a scratch PostgreSQL database).
+
+Usage:
+    python benchmarks/bench_booking_concurrency.py [--requests 300] [--slots 12] [--database-url URL]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=300, help='simultaneous booking attempts')
+    parser.add_argument('--slots', type=int, default=12, help='distinct 30 minute slots to fight over')
+    parser.add_argument('--max-latency', type=float, default=10.0, help='fail if any request takes longer (s)')
+    parser.add_argument('--database-url', help='database to use (defaults to a temporary SQLite file)')
+    args = parser.parse_args()
+
+    # Keep the database and session files out of the project tree
+    workdir = tempfile.mkdtemp(prefix='booking_concurrency_bench_')
+    os.environ['DATABASE_URL'] = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.setdefault('SESSION_SECRET', 'bench')
+    os.chdir(workdir)
+
+    import logging
+    from sqlalchemy import select
+    from app import app, db
+    from availability_rules import AvailabilityRules
+    from models import Booking, Calendar, SharedLink, User
+    from calendar_sync import create_booking
+    logging.getLogger().setLevel(logging.CRITICAL)
+
+    rng = random.Random(0)
+    with app.app_context():
+        tag = f"{rng.random():.8f}"
+        user = User(username=f'bench-{tag}', email=f'bench-{tag}@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        # Already synced and empty, so no feed is fetched
+        calendar = Calendar(user_id=user.id, name='Bench', ics_url='http://127.0.0.1/unused.ics',
+                            last_synced=datetime.now())
+        # Slots start every 15 minutes but last 30, so neighbours overlap too
+        rules = AvailabilityRules.from_dict({'slot_duration': 30, 'slot_step': 15}).to_json()
+        links = [
+            SharedLink(user_id=user.id, link_id=f'bench-{tag}-{i}', name=f'Link {i}', calendars=[calendar],
+                       availability_rules=rules)
+            for i in range(2)
+        ]
+        db.session.add_all([calendar] + links)
+        db.session.commit()
+        link_ids = [link.id for link in links]
+        db.session.remove()
+
+    first_slot = datetime(2030, 1, 7, 9)
+    starts = [first_slot + timedelta(minutes=15 * i) for i in range(args.slots)]
+    attempts = [(rng.choice(link_ids), rng.choice(starts)) for _ in range(args.requests)]
+
+    barrier = threading.Barrier(args.requests)
+    outcomes = [None] * args.requests
+    latencies = [0.0] * args.requests
+
+    def book(index):
+        link_id, start = attempts[index]
+        with app.app_context():
+            barrier.wait()
+            started = time.perf_counter()
+            booking, error = create_booking(link_id, 'Customer', f'customer{index}@example.com',
+                                            start, start + timedelta(minutes=30), 'Meeting', '')
+            latencies[index] = time.perf_counter() - started
+            outcomes[index] = 'booked' if booking else error
+            db.session.remove()
+
+    threads = [threading.Thread(target=book, args=(index,)) for index in range(args.requests)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        bookings = db.session.execute(
+            select(Booking.start_time, Booking.end_time)
+            .where(Booking.shared_link_id.in_(link_ids), Booking.status == 'confirmed')
+            .order_by(Booking.start_time)
+        ).all()
+        dialect = db.engine.dialect.name
+    double_bookings = sum(1 for previous, current in zip(bookings, bookings[1:]) if current[0] < previous[1])
+
+    booked = outcomes.count('booked')
+    conflicts = outcomes.count("The selected time is no longer available")
+    errors = [outcome for outcome in outcomes if outcome not in ('booked', "The selected time is no longer available")]
+    print(f"{args.requests} concurrent requests for {args.slots} overlapping slots on 2 links, "
+          f"{dialect}, {elapsed:.2f}s total")
+    print(f"booked {booked}, rejected as taken {conflicts}, errors {len(errors)}, double bookings {double_bookings}")
+    print(f"latency ms: p50 {percentile(latencies, 0.5) * 1000:.1f}, p95 {percentile(latencies, 0.95) * 1000:.1f}, "
+          f"max {max(latencies) * 1000:.1f}")
+    for error in sorted(set(errors))[:5]:
+        print(f"  error: {error}")
+
+    if double_bookings or errors or max(latencies) > args.max_latency:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
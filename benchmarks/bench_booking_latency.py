@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Measure /book latency for links spanning more and more calendars
+
+Points CALENDAR_WRITE_URL at the fake provider from bench_event_fanout.py
+with a fixed latency per write, posts bookings to /book for links with
+1, 4 and 16 calendars, and reports p50/p99 request latency. Calendar
+writes run from the job queue, so the request latency should not grow
+with the calendar count. The queue is then drained with the worker and
+the script exits with status 1 unless every booking's event reached
+every calendar, and every calendar still has one event per booking after
+the booking_events handler is run again for each booking, as a retried
+job would.
+
+Usage:
+    python benchmarks/bench_booking_latency.py [--bookings 100] [--latency 0.1] [--calendars 1 4 16]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--bookings', type=int, default=100, help='bookings per link')
+    parser.add_argument('--latency', type=float, default=0.1, help='seconds each provider write takes')
+    parser.add_argument('--calendars', type=int, nargs='+', default=[1, 4, 16])
+    args = parser.parse_args()
+
+    # The fake provider comes from bench_event_fanout, which imports config;
+    # reserve its port first so CALENDAR_WRITE_URL is set before that import
+    import socket
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+
+    # Keep the database and session files out of the project tree
+    workdir = tempfile.mkdtemp(prefix='booking_latency_bench_')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ['CALENDAR_WRITE_URL'] = f"http://127.0.0.1:{port}"
+    os.environ['JOB_INLINE_WORKER'] = '0'
+    os.environ.setdefault('SESSION_SECRET', 'bench')
+    os.chdir(workdir)
+
+    from bench_event_fanout import ProviderServer
+    server = ProviderServer(('127.0.0.1', port))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    import logging
+    from sqlalchemy import select
+    from app import app, db
+    from availability_rules import WEEKDAYS, AvailabilityRules
+    from calendar_sync import write_booking_events
+    from models import Booking, Calendar, SharedLink, User
+    from job_queue import get_job_stats, process_jobs
+    logging.getLogger().setLevel(logging.CRITICAL)
+
+    client = app.test_client()
+    first_slot = datetime(2030, 1, 7, 9)
+    # Consecutive 30-minute bookings run past office hours, so the links are open around the clock
+    always_open = AvailabilityRules.from_dict({'weekly_hours': {day: [['00:00', '24:00']] for day in WEEKDAYS}})
+    print(f"provider latency {args.latency * 1000:.0f}ms per write, {args.bookings} bookings per link")
+    print(f"{'calendars':>9} {'book p50 ms':>12} {'book p99 ms':>12} {'drain s':>8} {'events':>8}")
+    failed = False
+    for count in args.calendars:
+        with app.app_context():
+            user = User(username=f'bench-{count}', email=f'bench-{count}@example.com', password_hash='x')
+            db.session.add(user)
+            db.session.flush()
+            # Already synced and empty, so no feed is fetched
+            calendars = [
+                Calendar(user_id=user.id, name=f'Calendar {i}', ics_url='http://127.0.0.1/unused.ics',
+                         last_synced=datetime.now())
+                for i in range(count)
+            ]
+            link = SharedLink(user_id=user.id, link_id=f'bench-{count}', name='Bench', calendars=calendars,
+                              availability_rules=always_open.to_json())
+            db.session.add(link)
+            db.session.commit()
+            link_id = link.link_id
+
+        server.events.clear()
+        server.latency = {}
+        with app.app_context():
+            server.latency = {calendar.id: args.latency
+                              for calendar in SharedLink.query.filter_by(link_id=link_id).first().calendars}
+
+        latencies = []
+        for number in range(args.bookings):
+            start = first_slot + timedelta(days=count, minutes=30 * number)
+            started = time.perf_counter()
+            response = client.post('/book', data={
+                'link_id': link_id, 'start_time': start.isoformat(),
+                'end_time': (start + timedelta(minutes=30)).isoformat(),
+                'customer_name': 'Customer', 'customer_email': f'customer{number}@example.com',
+                'subject': 'Meeting'
+            })
+            latencies.append(time.perf_counter() - started)
+            if '/success/' not in response.headers.get('Location', ''):
+                print(f"  booking {number} was not accepted")
+                failed = True
+
+        started = time.perf_counter()
+        with app.app_context():
+            while process_jobs():
+                pass
+            stats = get_job_stats()
+        drain = time.perf_counter() - started
+
+        # Run each booking's events job again, as after a stale lock or a failed completion commit
+        written = len(server.events)
+        with app.app_context():
+            link = SharedLink.query.filter_by(link_id=link_id).first()
+            for booking_id in db.session.execute(select(Booking.id).filter_by(shared_link_id=link.id)).scalars():
+                write_booking_events({'booking_id': booking_id})
+        if len(server.events) != written:
+            print(f"  rerunning the booking events jobs left {len(server.events)} events, not {written}")
+            failed = True
+
+        events = len(server.events)
+        expected = args.bookings * count
+        failed = failed or events != expected or stats['pending'] or stats['failed']
+        print(f"{count:>9} {percentile(latencies, 0.5) * 1000:>12.1f} {percentile(latencies, 0.99) * 1000:>12.1f} "
+              f"{drain:>8.2f} {events:>8}" + ('' if events == expected else f" (expected {expected})"))
+
+    server.shutdown()
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
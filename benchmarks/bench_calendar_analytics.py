@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Benchmark the NumPy calendar analytics against the per-event implementation
+
+Builds throwaway SQLite databases with synthetic multi-calendar, multi-year
+event stores (single events plus weekly and daily series), runs both
+implementations over several windows and exits with status 1 if their
+output dicts differ anywhere.
+
+Usage:
+    python benchmarks/bench_calendar_analytics.py [--calendars 3 8] [--years 1 3] [--events-per-day 6]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def legacy_calendar_analytics(calendars, start_date, end_date):
+    """The previous implementation: walk every event dict, then every free slot"""
+    from availability import is_busy_event, parse_event_time
+    from calendar_sync import get_calendar_events, get_free_slots
+
+    calendar_names = {calendar.id: calendar.name for calendar in calendars}
+    events_by_calendar = defaultdict(int)
+    events_by_day = defaultdict(int)
+    events_by_hour = defaultdict(int)
+    total_busy_minutes = 0
+    free_slots_count = 0
+
+    for calendar in calendars:
+        events = get_calendar_events(calendar, start_date, end_date)
+        if not events:
+            continue
+        events_by_calendar[calendar_names[calendar.id]] = len(events)
+        for event in events:
+            if is_busy_event(event):
+                event_start = parse_event_time(event['start'])
+                event_end = parse_event_time(event['end'])
+                events_by_day[event_start.strftime('%Y-%m-%d')] += 1
+                events_by_hour[event_start.hour] += 1
+                total_busy_minutes += (event_end - event_start).total_seconds() / 60
+
+    free_slots = get_free_slots(calendars, start_date, end_date)
+    free_slots_by_weekday = defaultdict(int)
+    for slot in free_slots:
+        free_slots_by_weekday[slot['start'].strftime('%A')] += 1
+        free_slots_count += 1
+
+    working_days = 0
+    current_date = start_date
+    while current_date <= end_date:
+        if current_date.weekday() < 5:
+            working_days += 1
+        current_date += timedelta(days=1)
+    total_possible_minutes = working_days * 8 * 60
+
+    busy_percentage = (total_busy_minutes / total_possible_minutes * 100) if total_possible_minutes > 0 else 0
+    busy_percentage = min(100, busy_percentage)
+    free_percentage = 100 - busy_percentage
+
+    weekday_order = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+    return {
+        "busy_vs_free": {"busy": round(busy_percentage, 1), "free": round(free_percentage, 1)},
+        "events_by_calendar": dict(events_by_calendar),
+        "busiest_days": dict(sorted(events_by_day.items())),
+        "busiest_hours": {f"{hour}:00": count for hour, count in sorted(events_by_hour.items())},
+        "free_slot_distribution": {day: free_slots_by_weekday.get(day, 0) for day in weekday_order},
+        "free_slots_count": free_slots_count,
+        "start_date": start_date,
+        "end_date": end_date
+    }
+
+def fill_calendars(db, user, calendar_count, first_day, days, events_per_day, rng):
+    """Create calendars with random single events and a few recurring series"""
+    from sqlalchemy import insert
+    from models import Calendar, CalendarEvent
+
+    calendars = []
+    for index in range(calendar_count):
+        calendar = Calendar(user_id=user.id, name=f"Calendar {index}", ics_url='http://127.0.0.1/unused.ics',
+                            last_synced=datetime.now())
+        db.session.add(calendar)
+        calendars.append(calendar)
+    db.session.flush()
+
+    for calendar in calendars:
+        rows = []
+        for number in range(days * events_per_day // calendar_count):
+            start = first_day + timedelta(minutes=rng.randrange(0, days * 24 * 60, 5))
+            end = start + timedelta(minutes=rng.choice([0, 15, 30, 45, 60, 90, 240]))
+            rows.append(event_row(calendar.id, f"single-{number}", start, end,
+                                  rng.choice(['busy', 'busy', 'busy', 'tentative', 'free'])))
+        for number in range(4):
+            start = first_day + timedelta(days=rng.randrange(0, 14), hours=rng.randrange(8, 17))
+            row = event_row(calendar.id, f"series-{number}", start, start + timedelta(minutes=30), 'busy')
+            row.update(is_recurring=True, recurrence='FREQ=WEEKLY' if number % 2 else 'FREQ=DAILY;INTERVAL=3',
+                       timezone='Europe/Berlin')
+            rows.append(row)
+        db.session.execute(insert(CalendarEvent), rows)
+    db.session.commit()
+    return calendars
+
+def event_row(calendar_id, uid, start, end, show_as):
+    return {
+        'calendar_id': calendar_id, 'uid': uid, 'recurrence_id': None, 'sequence': 0, 'last_modified': None,
+        'subject': uid, 'start': start, 'end': end, 'is_all_day': False, 'status': 'CONFIRMED',
+        'show_as': show_as, 'description': '', 'location': '', 'organizer': '', 'recurrence': None,
+        'rdates': None, 'exdates': None, 'timezone': None, 'is_recurring': False, 'series_end': None
+    }
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--calendars', type=int, nargs='+', default=[3, 8])
+    parser.add_argument('--years', type=int, nargs='+', default=[1, 3])
+    parser.add_argument('--events-per-day', type=int, default=6)
+    args = parser.parse_args()
+
+    # Keep the database and session files out of the project tree
+    workdir = tempfile.mkdtemp(prefix='calendar_analytics_bench_')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.setdefault('SESSION_SECRET', 'bench')
+    os.chdir(workdir)
+
+    import logging
+    from app import app, db
+    from models import User
+    from calendar_sync import get_calendar_analytics
+    logging.getLogger().setLevel(logging.WARNING)
+
+    rng = random.Random(0)
+    first_day = datetime(2022, 1, 1)
+    mismatches = 0
+    print(f"{'calendars':>9} {'years':>5} {'window':>18} {'events':>8} {'legacy s':>9} {'numpy s':>8} {'speedup':>8}")
+    with app.app_context():
+        for calendar_count in args.calendars:
+            for years in args.years:
+                days = 365 * years
+                user = User(username=f'bench-{calendar_count}-{years}', email=f'{calendar_count}-{years}@bench',
+                            password_hash='x')
+                db.session.add(user)
+                db.session.flush()
+                calendars = fill_calendars(db, user, calendar_count, first_day, days, args.events_per_day, rng)
+
+                windows = [
+                    ('30 days', first_day + timedelta(days=days - 30, hours=10, minutes=17), first_day + timedelta(days=days)),
+                    ('whole range', first_day, first_day + timedelta(days=days, hours=8, minutes=45))
+                ]
+                for label, start, end in windows:
+                    expected, legacy_time = timed(legacy_calendar_analytics, calendars, start, end)
+                    result, numpy_time = timed(get_calendar_analytics, user.id, None, start, end)
+                    if result != expected:
+                        mismatches += 1
+                        for key in expected:
+                            if expected[key] != (result or {}).get(key):
+                                print(f"  mismatch in {key}: {expected[key]!r} != {(result or {}).get(key)!r}"[:300])
+                    events = sum(expected['events_by_calendar'].values())
+                    print(f"{calendar_count:>9} {years:>5} {label:>18} {events:>8} {legacy_time:>9.3f} "
+                          f"{numpy_time:>8.3f} {legacy_time / numpy_time:>7.1f}x")
+
+    if mismatches:
+        print(f"{mismatches} window(s) produced different output")
+        sys.exit(1)
+    print("All outputs identical")
+
+if __name__ == "__main__":
+    main()
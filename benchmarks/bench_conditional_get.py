@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Measure revalidation of the public booking pages against full responses
+
+Fills a throwaway SQLite database with a link over several busy
+calendars, then times GET /api/slots and GET /shared/<link_id> without
+any cache, with the availability cache warm, and as revalidations with
+If-None-Match answered by 304. Exits with status 1 if a revalidation is
+not answered with 304, or if the ETag does not change after a booking.
+
+Usage:
+    python benchmarks/bench_conditional_get.py [--days 90] [--calendars 4] [--requests 50]
+"""
+
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def timed_requests(client, url, count, headers=None, before=None):
+    """Mean milliseconds per request, and the last response"""
+    total = 0
+    for _ in range(count):
+        if before:
+            before()
+        started = time.perf_counter()
+        response = client.get(url, headers=headers or {})
+        total += time.perf_counter() - started
+    return total / count * 1000, response
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--days', type=int, default=90, help='length of the /api/slots window')
+    parser.add_argument('--calendars', type=int, default=4)
+    parser.add_argument('--events-per-day', type=int, default=12, help='busy events per calendar per day')
+    parser.add_argument('--requests', type=int, default=50)
+    args = parser.parse_args()
+
+    # Keep the database and session files out of the project tree
+    workdir = tempfile.mkdtemp(prefix='conditional_bench_')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.setdefault('SESSION_SECRET', 'bench')
+    os.chdir(workdir)
+
+    import logging
+    import pytz
+    from sqlalchemy import insert
+    from app import app, db
+    from calendar_sync import create_booking
+    from models import Calendar, CalendarEvent, SharedLink, User
+    from slot_cache import availability_cache, calendar_bitmaps
+    logging.getLogger().setLevel(logging.CRITICAL)
+
+    rng = random.Random(11)
+    start_date = datetime.now(pytz.UTC).replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    end_date = start_date + timedelta(days=args.days)
+
+    with app.app_context():
+        user = User(username='bench', email='bench@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        calendars = [Calendar(user_id=user.id, name=f'Calendar {i}', ics_url='http://127.0.0.1/unused.ics',
+                              last_synced=datetime.utcnow()) for i in range(args.calendars)]
+        link = SharedLink(user_id=user.id, link_id='bench', name='Bench', calendars=calendars)
+        db.session.add(link)
+        db.session.flush()
+        rows = []
+        for calendar in calendars:
+            for day in range(args.days):
+                for _ in range(args.events_per_day):
+                    start = start_date.replace(tzinfo=None) + timedelta(days=day, minutes=rng.randrange(0, 24 * 60, 5))
+                    rows.append({'calendar_id': calendar.id, 'uid': f'{calendar.id}-{len(rows)}',
+                                 'subject': 'Busy', 'start': start,
+                                 'end': start + timedelta(minutes=rng.choice([15, 30, 45, 60])),
+                                 'show_as': 'busy'})
+        db.session.execute(insert(CalendarEvent), rows)
+        db.session.commit()
+        link_id = link.id
+
+    def clear_caches():
+        availability_cache.clear()
+        calendar_bitmaps.clear()
+
+    client = app.test_client()
+    slots_url = (f"/api/slots?link_id=bench&start_date={start_date.isoformat().replace('+', '%2B')}"
+                 f"&end_date={end_date.isoformat().replace('+', '%2B')}")
+    failed = False
+    print(f"{args.calendars} calendars, {len(rows)} events, {args.days}-day /api/slots window")
+    print(f"{'endpoint':>12} {'cold ms':>8} {'warm ms':>8} {'304 ms':>8}")
+    for name, url in (('/api/slots', slots_url), ('/shared', '/shared/bench')):
+        cold_ms, _ = timed_requests(client, url, args.requests, before=clear_caches)
+        warm_ms, response = timed_requests(client, url, args.requests)
+        etag = response.headers.get('ETag')
+        revalidate_ms, revalidated = timed_requests(client, url, args.requests, headers={'If-None-Match': etag})
+        if revalidated.status_code != 304:
+            print(f"  {name} revalidation returned {revalidated.status_code}")
+            failed = True
+        print(f"{name:>12} {cold_ms:>8.2f} {warm_ms:>8.2f} {revalidate_ms:>8.2f}")
+
+    # A booking of the first free slot must change the validators
+    response = client.get(slots_url + '&format=compact')
+    etag = response.headers.get('ETag')
+    payload = json.loads(gzip.decompress(response.data) if response.content_encoding == 'gzip' else response.data)
+    slot_start = datetime.fromtimestamp(payload['starts'][0] * 60, pytz.UTC)
+    with app.app_context():
+        booking, error = create_booking(link_id, 'Bench', 'bench@example.com', slot_start,
+                                        slot_start + timedelta(minutes=payload['duration']), 'Bench', '')
+    if error:
+        print(f"  booking failed: {error}")
+        failed = True
+    elif client.get(slots_url + '&format=compact', headers={'If-None-Match': etag}).status_code == 304:
+        print("  ETag unchanged after a booking")
+        failed = True
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Exercise the booking event fan-out against a local fake calendar provider
+
+The fake provider stores events per calendar and can be told to delay,
+fail or stall writes to particular calendars. The script compares writing
+one booking to many slow calendars one after another with the parallel
+fan-out, checks that writing a booking twice leaves one event per
+calendar, and that a failing and a stalling calendar each make the
+fan-out give up within its timeout and leave no events behind. Exits with
+status 1 if any check fails.
+
+Usage:
+    python benchmarks/bench_event_fanout.py [--calendars 8] [--latency 0.2]
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from calendar_writer import new_event_id, put_event, write_calendar_events
+
+EVENT_PATH = re.compile(r'^/calendars/(\d+)/events/([\w-]+)$')
+
+class ProviderServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address):
+        super().__init__(address, ProviderHandler)
+        self.events = {}  # (calendar ID, event ID) -> event
+        self.events_lock = threading.Lock()
+        self.latency = {}  # calendar ID -> seconds before answering a write
+        self.failing = set()  # calendar IDs whose writes fail with 500
+
+    def handle_error(self, request, client_address):
+        # Clients giving up on stalled writes is expected here
+        pass
+
+class ProviderHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status, body=b''):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_PUT(self):
+        match = EVENT_PATH.match(self.path)
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if not match:
+            return self.reply(404)
+        calendar_id, event_id = int(match.group(1)), match.group(2)
+        if calendar_id in self.server.failing:
+            time.sleep(self.server.latency.get(calendar_id, 0))
+            return self.reply(500)
+        event = dict(json.loads(body), id=event_id)
+        # Store first, then answer late: a client that times out leaves the event behind
+        with self.server.events_lock:
+            self.server.events[(calendar_id, event_id)] = event
+        time.sleep(self.server.latency.get(calendar_id, 0))
+        self.reply(201, json.dumps(event).encode())
+
+    def do_DELETE(self):
+        match = EVENT_PATH.match(self.path)
+        if not match:
+            return self.reply(404)
+        with self.server.events_lock:
+            found = self.server.events.pop((int(match.group(1)), match.group(2)), None)
+        self.reply(204 if found else 404)
+
+EVENT_DATA = {
+    'subject': 'Meeting',
+    'body': {'contentType': 'text', 'content': 'Booking made by Customer'},
+    'start': {'dateTime': '2030-01-07T10:00:00', 'timeZone': 'UTC'},
+    'end': {'dateTime': '2030-01-07T10:30:00', 'timeZone': 'UTC'},
+    'attendees': [{'emailAddress': {'address': 'customer@example.com', 'name': 'Customer'}, 'type': 'required'}]
+}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--calendars', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.2, help='seconds each provider write takes')
+    parser.add_argument('--timeout', type=float, default=1.0, help='fan-out timeout for the failure checks')
+    args = parser.parse_args()
+
+    server = ProviderServer(('127.0.0.1', 0))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    calendar_ids = list(range(1, args.calendars + 1))
+    server.latency = {calendar_id: args.latency for calendar_id in calendar_ids}
+    failures = []
+
+    def check(name, passed, detail):
+        print(f"{name:>22}: {'ok' if passed else 'FAILED'} ({detail})")
+        if not passed:
+            failures.append(name)
+
+    # Sequential writes, as create_booking used to do them
+    started = time.perf_counter()
+    for calendar_id in calendar_ids:
+        put_event(calendar_id, new_event_id(calendar_id), EVENT_DATA, base_url)
+    sequential = time.perf_counter() - started
+
+    started = time.perf_counter()
+    event_ids, error = write_calendar_events(1, calendar_ids, EVENT_DATA, base_url)
+    parallel = time.perf_counter() - started
+    check('parallel fan-out', error is None and len(event_ids) == len(calendar_ids),
+          f"{args.calendars} calendars at {args.latency * 1000:.0f}ms: sequential {sequential:.2f}s, "
+          f"parallel {parallel:.2f}s, {sequential / parallel:.1f}x")
+
+    # Writing the same booking again replaces its events instead of adding more
+    server.events.clear()
+    for _ in range(2):
+        write_calendar_events(1, calendar_ids, EVENT_DATA, base_url)
+    check('repeated write', len(server.events) == len(calendar_ids),
+          f"{len(server.events)} events for {len(calendar_ids)} calendars")
+
+    # One calendar rejects the write: everything written for the booking is removed
+    server.events.clear()
+    server.failing = {calendar_ids[-1]}
+    started = time.perf_counter()
+    event_ids, error = write_calendar_events(1, calendar_ids, EVENT_DATA, base_url, timeout=args.timeout)
+    elapsed = time.perf_counter() - started
+    check('failing calendar', error is not None and not event_ids and not server.events,
+          f"gave up after {elapsed:.2f}s, {len(server.events)} events left")
+
+    # One calendar stalls past the timeout after storing the event: it is deleted too
+    server.events.clear()
+    server.failing = set()
+    server.latency[calendar_ids[0]] = args.timeout * 3
+    started = time.perf_counter()
+    event_ids, error = write_calendar_events(1, calendar_ids, EVENT_DATA, base_url, timeout=args.timeout)
+    elapsed = time.perf_counter() - started
+    check('stalled calendar', error is not None and not event_ids and elapsed < args.timeout * 2,
+          f"gave up after {elapsed:.2f}s with a {args.timeout:.1f}s timeout")
+    # The stalled write finishes later; its compensating delete follows it
+    time.sleep(args.timeout * 3)
+    check('no events left behind', not server.events, f"{len(server.events)} events left")
+
+    server.shutdown()
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Exercise the pooled feed client against a local stand-in ICS server
+
+The server simulates well-behaved, slow, trickling, oversized and gzip
+compressed feeds. Each scenario reports its outcome and timing, and the
+script exits with status 1 if the client does not behave as expected.
+
+Usage:
+    python benchmarks/bench_feed_client.py
+"""
+
+import gzip
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from feed_client import FeedFetchError, fetch_feed
+
+EVENT = (
+    "BEGIN:VEVENT\r\nUID:{i}@bench\r\nDTSTAMP:20250101T000000Z\r\n"
+    "DTSTART:20250106T100000Z\r\nDTEND:20250106T110000Z\r\nSUMMARY:Event {i}\r\nEND:VEVENT\r\n"
+)
+
+def make_feed(events):
+    body = "".join(EVENT.format(i=i) for i in range(events))
+    return f"BEGIN:VCALENDAR\r\nVERSION:2.0\r\n{body}END:VCALENDAR\r\n".encode()
+
+SMALL_FEED = make_feed(50)
+LARGE_FEED = make_feed(20000)
+
+class FeedServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients aborting oversized or slow downloads is expected here
+        pass
+
+class FeedHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    client_ports = set()
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, body, extra_headers=None):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/calendar')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (extra_headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        FeedHandler.client_ports.add(self.client_address[1])
+        if self.path == '/small':
+            self.send_body(SMALL_FEED, {'ETag': '"v1"'})
+        elif self.path == '/etag':
+            if self.headers.get('If-None-Match') == '"v1"':
+                self.send_response(304)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+            else:
+                self.send_body(SMALL_FEED, {'ETag': '"v1"'})
+        elif self.path == '/large':
+            self.send_body(LARGE_FEED)
+        elif self.path == '/gzip':
+            self.send_body(gzip.compress(LARGE_FEED), {'Content-Encoding': 'gzip'})
+        elif self.path == '/stall':
+            # Send headers, then nothing: the read timeout must fire
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(SMALL_FEED)))
+            self.end_headers()
+            self.wfile.flush()
+            time.sleep(5)
+        elif self.path == '/trickle':
+            # Keep sending a byte at a time: only the total timeout stops this
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(SMALL_FEED)))
+            self.end_headers()
+            try:
+                for byte in SMALL_FEED:
+                    self.wfile.write(bytes([byte]))
+                    self.wfile.flush()
+                    time.sleep(0.05)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+        else:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+def run_scenario(name, expect_error, url, **kwargs):
+    started = time.perf_counter()
+    try:
+        response = fetch_feed(url, **kwargs)
+        outcome = f"status {response.status_code}, {len(response.content)} bytes"
+        failed = expect_error
+    except FeedFetchError as e:
+        outcome = f"error: {e}"
+        failed = not expect_error
+    elapsed = time.perf_counter() - started
+    print(f"{'FAIL' if failed else 'ok':<5} {name:<28} {elapsed:>7.3f}s  {outcome}")
+    return not failed
+
+def main():
+    server = FeedServer(('127.0.0.1', 0), FeedHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    results = [
+        run_scenario('small feed', False, f"{base}/small"),
+        run_scenario('conditional 304', False, f"{base}/etag", headers={'If-None-Match': '"v1"'}),
+        run_scenario('large feed within limit', False, f"{base}/large"),
+        run_scenario('gzip feed', False, f"{base}/gzip"),
+        run_scenario('large feed over limit', True, f"{base}/large", max_bytes=100 * 1024),
+        run_scenario('gzip feed over limit', True, f"{base}/gzip", max_bytes=100 * 1024),
+        run_scenario('stalled server', True, f"{base}/stall", read_timeout=0.5),
+        run_scenario('trickling server', True, f"{base}/trickle", total_timeout=1),
+    ]
+
+    # Sequential requests to one host should share a single keep-alive connection
+    FeedHandler.client_ports.clear()
+    started = time.perf_counter()
+    for _ in range(100):
+        fetch_feed(f"{base}/small")
+    elapsed = time.perf_counter() - started
+    reused = len(FeedHandler.client_ports) == 1
+    results.append(reused)
+    print(f"{'ok' if reused else 'FAIL':<5} {'connection reuse':<28} {elapsed:>7.3f}s  "
+          f"100 requests over {len(FeedHandler.client_ports)} connection(s)")
+
+    server.shutdown()
+    if not all(results):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark the sweep-line free slot engine against the nested-loop implementation
+
+Usage:
+    python benchmarks/bench_free_slots.py [--sizes 1000 10000 100000] [--calendars 3]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+import pytz
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from availability import iter_free_slots, iter_time_slots, merge_busy_intervals
+
+def make_events(count, calendars, start_date, days):
+    """Generate random busy events spread over the window and calendars"""
+    rng = random.Random(count)
+    events = [[] for _ in range(calendars)]
+    for i in range(count):
+        start = start_date + timedelta(minutes=rng.randrange(0, days * 24 * 60, 5))
+        end = start + timedelta(minutes=rng.choice([15, 30, 45, 60, 90, 120]))
+        events[i % calendars].append({'start': start, 'end': end, 'show_as': 'busy'})
+    return events
+
+def legacy_free_slots(calendar_events, start_date, end_date, slot_duration):
+    """The original implementation: test every slot against every busy event"""
+    all_events = []
+    for events in calendar_events:
+        all_events.extend(events)
+    all_events.sort(key=lambda x: x['start'])
+
+    free_slots = []
+    for slot in iter_time_slots(start_date, end_date, slot_duration):
+        is_free = True
+        for event in all_events:
+            if slot['start'] < event['end'] and slot['end'] > event['start']:
+                is_free = False
+                break
+        if is_free:
+            free_slots.append(slot)
+    return free_slots
+
+def sweep_free_slots(calendar_events, start_date, end_date, slot_duration):
+    """The interval engine: merge once, then sweep"""
+    all_events = []
+    for events in calendar_events:
+        all_events.extend(events)
+    busy_intervals = merge_busy_intervals(all_events)
+    return list(iter_free_slots(iter_time_slots(start_date, end_date, slot_duration), busy_intervals))
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--calendars', type=int, default=3)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--slot-duration', type=int, default=30)
+    args = parser.parse_args()
+
+    start_date = datetime(2025, 1, 6, tzinfo=pytz.UTC)
+    end_date = start_date + timedelta(days=args.days)
+
+    print(f"{'events':>8} {'slots':>6} {'free':>6} {'legacy (s)':>11} {'sweep (s)':>10} {'speedup':>8}")
+    for size in args.sizes:
+        calendar_events = make_events(size, args.calendars, start_date, args.days)
+        legacy, legacy_time = timed(legacy_free_slots, calendar_events, start_date, end_date, args.slot_duration)
+        sweep, sweep_time = timed(sweep_free_slots, calendar_events, start_date, end_date, args.slot_duration)
+
+        if [slot['start'] for slot in legacy] != [slot['start'] for slot in sweep]:
+            print(f"Mismatch at {size} events")
+            sys.exit(1)
+
+        total_slots = sum(1 for _ in iter_time_slots(start_date, end_date, args.slot_duration))
+        print(f"{size:>8} {total_slots:>6} {len(sweep):>6} {legacy_time:>11.4f} {sweep_time:>10.4f} {legacy_time / sweep_time:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
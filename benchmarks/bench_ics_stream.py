@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Compare the streaming ICS parser with whole-document parsing
+
+For each feed size a synthetic feed is written to a temporary file, then
+each parser runs in a fresh subprocess so its peak RSS can be measured on
+its own. "tree" is the previous approach (Calendar.from_ical on the whole
+body, then walk), "stream" reads the file in chunks through iter_ics_events.
+
+Usage:
+    python benchmarks/bench_ics_stream.py [--sizes 1000 10000 50000]
+"""
+
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+EVENT = (
+    "BEGIN:VEVENT\r\nUID:{i}@bench\r\nDTSTAMP:20250101T000000Z\r\n"
+    "DTSTART;TZID=Europe/Berlin:202501{day:02d}T{hour:02d}0000\r\n"
+    "DTEND;TZID=Europe/Berlin:202501{day:02d}T{hour:02d}3000\r\n"
+    "SUMMARY:Event {i}\r\nLOCATION:Room {room}\r\n"
+    "DESCRIPTION:A reasonably long description for event {i}, folded the way\r\n"
+    "  servers fold long lines at seventy-five octets per line\r\n"
+    "END:VEVENT\r\n"
+)
+
+def write_feed(path, events):
+    with open(path, 'w', newline='') as f:
+        f.write("BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//bench//EN\r\n")
+        for i in range(events):
+            f.write(EVENT.format(i=i, day=1 + i % 28, hour=8 + i % 10, room=i % 40))
+        f.write("END:VCALENDAR\r\n")
+
+def run_parser(mode, path):
+    """Parse a feed with one parser and print events, seconds and peak RSS growth in KB"""
+    from icalendar import Calendar
+    import app  # Initializes the models before calendar_sync imports them
+    from calendar_sync import ics_event, iter_ics_events
+    from ics_stream import iter_file_chunks
+
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    if mode == 'tree':
+        with open(path, 'rb') as f:
+            cal = Calendar.from_ical(f.read())
+        count = len([ics_event(component) for component in cal.walk('VEVENT')])
+    else:
+        count = 0
+        with open(path, 'rb') as f:
+            for _ in iter_ics_events(iter_file_chunks(f)):
+                count += 1
+    elapsed = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(count, elapsed, peak - baseline)
+
+def measure(mode, path):
+    env = dict(os.environ, DATABASE_URL='sqlite://', SESSION_SECRET='bench')
+    output = subprocess.run(
+        [sys.executable, __file__, '--run', mode, path],
+        capture_output=True, text=True, check=True, env=env, cwd=tempfile.gettempdir()
+    ).stdout.split()
+    return int(output[-3]), float(output[-2]), int(output[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--run', nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        # Silence the application's debug logging in the worker process
+        import logging
+        logging.disable(logging.CRITICAL)
+        run_parser(*args.run)
+        return
+
+    print(f"{'events':>8} {'size MB':>8} {'parser':>7} {'MB/s':>8} {'events/s':>10} {'peak RSS +MB':>13}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in args.sizes:
+            path = os.path.join(workdir, f"feed_{size}.ics")
+            write_feed(path, size)
+            megabytes = os.path.getsize(path) / 1024 / 1024
+            for mode in ('tree', 'stream'):
+                count, elapsed, peak_kb = measure(mode, path)
+                if count != size:
+                    sys.exit(f"{mode} parser returned {count} events, expected {size}")
+                print(f"{size:>8} {megabytes:>8.1f} {mode:>7} {megabytes / elapsed:>8.2f} "
+                      f"{count / elapsed:>10.0f} {peak_kb / 1024:>13.1f}")
+
+if __name__ == "__main__":
+    main()
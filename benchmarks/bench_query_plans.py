@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Check that the hot query paths use the composite indexes, and time them
+
+Fills a database with users, calendars, shared links and bookings, drops
+the composite indexes to look like a database from before they existed,
+times the hot queries, runs the migrations and times them again. The
+query plans (EXPLAIN QUERY PLAN on SQLite, EXPLAIN on PostgreSQL) are then
+checked for the expected index names; the script exits with status 1 if
+any query does not use its index. Uses a throwaway SQLite database unless
+--database-url points elsewhere (for example a scratch PostgreSQL database).
+
+Usage:
+    python benchmarks/bench_query_plans.py [--users 200] [--bookings 200000] [--database-url URL]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def hot_queries(user_id, link_ids, start, end):
+    """(label, expected index, statement) for the queries behind routes and analytics"""
+    from sqlalchemy import select
+    from booking_stats import booking_filter
+    from models import Booking, Calendar, SharedLink
+
+    return [
+        ('bookings of links in range', 'ix_booking_link_start',
+         select(Booking).where(*booking_filter(link_ids, start, end))),
+        ('bookings overlapping a slot', 'ix_booking_link_start',
+         select(Booking).where(Booking.shared_link_id == link_ids[0],
+                               Booking.start_time < end, Booking.end_time > start)),
+        ('active calendars of user', 'ix_calendar_user_active',
+         select(Calendar).filter_by(user_id=user_id, active=True)),
+        ('active links of user', 'ix_shared_link_user_active',
+         select(SharedLink).filter_by(user_id=user_id, active=True))
+    ]
+
+def explain(db, statement):
+    """The database's query plan for a statement, as one string"""
+    from sqlalchemy import text
+    sql = str(statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+    prefix = 'EXPLAIN QUERY PLAN' if db.engine.dialect.name == 'sqlite' else 'EXPLAIN'
+    rows = db.session.execute(text(f"{prefix} {sql}")).all()
+    return '\n'.join(' '.join(str(value) for value in row) for row in rows)
+
+def timed(db, statement, repeat=20):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        db.session.execute(statement).all()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def fill(db, users, calendars_per_user, links_per_user, bookings, rng):
+    from sqlalchemy import insert, select
+    from models import Booking, Calendar, SharedLink, User
+
+    tag = f"{rng.random():.8f}"
+    db.session.execute(insert(User), [
+        {'username': f'bench-{tag}-{i}', 'email': f'bench-{tag}-{i}@example.com', 'password_hash': 'x'}
+        for i in range(users)
+    ])
+    user_ids = db.session.execute(select(User.id).where(User.username.like(f'bench-{tag}-%'))).scalars().all()
+    db.session.execute(insert(Calendar), [
+        {'user_id': user_id, 'name': f'Calendar {i}', 'ics_url': 'http://127.0.0.1/unused.ics', 'active': i % 3 > 0}
+        for user_id in user_ids for i in range(calendars_per_user)
+    ])
+    db.session.execute(insert(SharedLink), [
+        {'user_id': user_id, 'link_id': f'bench-{tag}-{user_id}-{i}', 'name': f'Link {i}',
+         'calendar_ids': '', 'active': i % 3 > 0}
+        for user_id in user_ids for i in range(links_per_user)
+    ])
+    link_ids = db.session.execute(
+        select(SharedLink.id).where(SharedLink.user_id.in_(user_ids))
+    ).scalars().all()
+
+    first_day = datetime(2024, 1, 1)
+    rows = []
+    for _ in range(bookings):
+        start = first_day + timedelta(days=rng.randrange(730), minutes=rng.randrange(9 * 60, 17 * 60, 15))
+        rows.append({
+            'shared_link_id': rng.choice(link_ids), 'customer_name': 'Customer',
+            'customer_email': 'customer@example.com', 'start_time': start,
+            'end_time': start + timedelta(minutes=30), 'subject': 'Meeting', 'status': 'confirmed'
+        })
+    for index in range(0, len(rows), 10000):
+        db.session.execute(insert(Booking), rows[index:index + 10000])
+    db.session.commit()
+    return user_ids, link_ids
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--calendars', type=int, default=5, help='calendars per user')
+    parser.add_argument('--links', type=int, default=5, help='shared links per user')
+    parser.add_argument('--bookings', type=int, default=200000)
+    parser.add_argument('--database-url', help='database to fill (defaults to a temporary SQLite file)')
+    args = parser.parse_args()
+
+    # Keep the database and session files out of the project tree
+    workdir = tempfile.mkdtemp(prefix='query_plan_bench_')
+    os.environ['DATABASE_URL'] = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.setdefault('SESSION_SECRET', 'bench')
+    os.chdir(workdir)
+
+    import logging
+    from sqlalchemy import delete, select, text
+    from app import app, db
+    from migrations import MIGRATIONS, add_hot_path_indexes, run_migrations, schema_migrations
+    from models import Booking, Calendar, SharedLink
+    logging.getLogger().setLevel(logging.WARNING)
+
+    composite = {
+        'ix_booking_link_start': Booking, 'ix_calendar_user_active': Calendar,
+        'ix_shared_link_user_active': SharedLink
+    }
+    rng = random.Random(0)
+    failures = 0
+    with app.app_context():
+        user_ids, link_ids = fill(db, args.users, args.calendars, args.links, args.bookings, rng)
+        db.session.execute(text("ANALYZE"))
+        db.session.commit()
+
+        # Look like a database created before the composite indexes: drop them and forget the migration
+        index_version = next(version for version, _, function in MIGRATIONS if function is add_hot_path_indexes)
+        for name, model in composite.items():
+            index = next(index for index in model.__table__.indexes if index.name == name)
+            index.drop(db.engine, checkfirst=True)
+        with db.engine.begin() as connection:
+            connection.execute(delete(schema_migrations).where(schema_migrations.c.version == index_version))
+
+        user_id = rng.choice(user_ids)
+        user_links = db.session.execute(select(SharedLink.id).filter_by(user_id=user_id)).scalars().all()
+        start, end = datetime(2025, 3, 3, 9), datetime(2025, 3, 31, 17)
+        queries = hot_queries(user_id, user_links, start, end)
+
+        before = [timed(db, statement) for _, _, statement in queries]
+        applied = run_migrations()
+        db.session.execute(text("ANALYZE"))
+        db.session.commit()
+        after = [timed(db, statement) for _, _, statement in queries]
+
+        print(f"{args.bookings} bookings, {args.users} users, {db.engine.dialect.name}; applied migrations {applied}")
+        print(f"{'query':>28} {'before ms':>10} {'after ms':>9} {'speedup':>8}  index used")
+        for (label, index_name, statement), old, new in zip(queries, before, after):
+            plan = explain(db, statement)
+            used = index_name in plan
+            failures += not used
+            print(f"{label:>28} {old * 1000:>10.2f} {new * 1000:>9.2f} {old / new:>7.1f}x  "
+                  f"{index_name if used else 'NO'}")
+            if not used:
+                print(f"  plan: {plan}")
+
+    if failures:
+        print(f"{failures} query plan(s) do not use the expected index")
+        sys.exit(1)
+    print("All hot queries use their composite index")
+
+if __name__ == "__main__":
+    main()
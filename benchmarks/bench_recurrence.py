@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark lazy recurrence expansion for feeds with many long-running series
+
+Each series started years ago and most never end. The lazy expansion only
+generates instances for the queried window; the naive baseline walks every
+series from its first instance with dateutil's between().
+
+Usage:
+    python benchmarks/bench_recurrence.py [--series 500] [--years 8]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+import pytz
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recurrence import build_rule_set, get_series_end, iter_instances
+
+RULES = [
+    'FREQ=DAILY',
+    'FREQ=DAILY;BYDAY=MO,TU,WE,TH,FR',
+    'FREQ=WEEKLY',
+    'FREQ=WEEKLY;INTERVAL=2;BYDAY=TU,TH',
+    'FREQ=MONTHLY;BYDAY=1MO',
+    'FREQ=DAILY;COUNT=2000',
+]
+ZONES = ['Europe/Madrid', 'America/New_York', 'Asia/Tokyo', 'UTC']
+
+def make_series(count, years, now):
+    rng = random.Random(count)
+    series = []
+    for i in range(count):
+        zone = ZoneInfo(rng.choice(ZONES))
+        local = datetime(now.year - years, 1, 1, rng.randrange(8, 18), rng.choice([0, 30])) + timedelta(days=rng.randrange(365))
+        start = local.replace(tzinfo=zone).astimezone(pytz.UTC)
+        exdates = [start + timedelta(days=rng.randrange(years * 365)) for _ in range(5)]
+        series.append({
+            'id': f"series-{i}",
+            'start': start,
+            'end': start + timedelta(minutes=rng.choice([15, 30, 60])),
+            'recurrence': rng.choice(RULES),
+            'rdates': [],
+            'exdates': exdates,
+            'timezone': zone.key,
+        })
+        # Computed once at refresh time, like the series_end column
+        series[-1]['series_end'] = get_series_end(series[-1])
+    return series
+
+def lazy(series, window_start, window_end):
+    # Finished series are pruned by the series_end range filter, as in get_calendar_events
+    return [
+        instance['start']
+        for event in series
+        if event['series_end'] is None or event['series_end'] > window_start
+        for instance in iter_instances(event, window_start, window_end)
+    ]
+
+def naive(series, window_start, window_end):
+    starts = []
+    for event in series:
+        duration = event['end'] - event['start']
+        rules = build_rule_set(event)
+        rules.rdate(event['start'].astimezone(ZoneInfo(event['timezone'])))
+        for start in rules.between(window_start - duration, window_end):
+            starts.append(start.astimezone(pytz.UTC))
+    return starts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--series', type=int, default=500)
+    parser.add_argument('--years', type=int, default=8)
+    args = parser.parse_args()
+
+    now = datetime(2025, 3, 24, tzinfo=pytz.UTC)
+    series = make_series(args.series, args.years, now)
+
+    print(f"{args.series} series over {args.years} years")
+    print(f"{'window':>8} {'instances':>10} {'naive (s)':>10} {'lazy (s)':>9} {'speedup':>8}")
+    for days in (7, 30, 90):
+        window_end = now + timedelta(days=days)
+
+        started = time.perf_counter()
+        expected = sorted(naive(series, now, window_end))
+        naive_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        got = sorted(lazy(series, now, window_end))
+        lazy_time = time.perf_counter() - started
+
+        if got != expected:
+            print(f"Mismatch for a {days}-day window: {len(got)} vs {len(expected)} instances")
+            sys.exit(1)
+        print(f"{days:>7}d {len(got):>10} {naive_time:>10.4f} {lazy_time:>9.4f} {naive_time / lazy_time:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Measure refresh engine throughput against a local stand-in ICS server
+
+Creates a throwaway SQLite database with the requested number of calendars,
+serves their feeds with injected latency (and a share of very slow hosts)
+and runs one refresh cycle, then prints the engine metrics.
+
+Usage:
+    python benchmarks/bench_refresh_engine.py [--calendars 500] [--latency 0.2] [--slow 0.02]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+EVENT = (
+    "BEGIN:VEVENT\r\nUID:{i}@bench\r\nDTSTAMP:20250101T000000Z\r\n"
+    "DTSTART:202501{day:02d}T100000Z\r\nDTEND:202501{day:02d}T110000Z\r\nSUMMARY:Event {i}\r\nEND:VEVENT\r\n"
+)
+FEED = (
+    "BEGIN:VCALENDAR\r\nVERSION:2.0\r\n"
+    + "".join(EVENT.format(i=i, day=1 + i % 28) for i in range(200))
+    + "END:VCALENDAR\r\n"
+).encode()
+
+class FeedHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    latency = 0.2
+    slow_latency = 3.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        time.sleep(self.slow_latency if self.path.startswith('/slow') else self.latency)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/calendar')
+        self.send_header('Content-Length', str(len(FEED)))
+        self.end_headers()
+        self.wfile.write(FEED)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--calendars', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.2, help='seconds per normal feed')
+    parser.add_argument('--slow', type=float, default=0.02, help='share of feeds on a slow host')
+    args = parser.parse_args()
+
+    # Use a throwaway database and keep session files out of the project tree
+    workdir = tempfile.mkdtemp(prefix='refresh_bench_')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.setdefault('SESSION_SECRET', 'bench')
+    os.chdir(workdir)
+
+    import logging
+    from app import app, db
+    from models import User, Calendar
+    from refresh_engine import get_refresh_metrics, run_refresh_cycle
+    logging.getLogger().setLevel(logging.WARNING)
+
+    FeedHandler.latency = args.latency
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FeedHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    rng = random.Random(0)
+    with app.app_context():
+        user = User(username='bench', email='bench@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        for i in range(args.calendars):
+            path = 'slow' if rng.random() < args.slow else 'feed'
+            db.session.add(Calendar(user_id=user.id, name=f"Calendar {i}", ics_url=f"{base}/{path}/{i}.ics"))
+        db.session.commit()
+
+    run_refresh_cycle()
+    print(json.dumps(get_refresh_metrics(), indent=2))
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Compare the verbose and compact /api/slots encodings
+
+For windows of growing length, encodes the same free slots as the verbose
+list of slot dicts (through Flask's JSON provider, as before) and as the
+compact epoch-minute format (through orjson), and reports encoding time
+and body size, raw and gzipped. Exits with status 1 if the compact body
+does not decode to the verbose slot starts.
+
+Usage:
+    python benchmarks/bench_slot_encoding.py [--days 7 90 365] [--repeat 20]
+"""
+
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+import pytz
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from availability import iter_free_slots, iter_time_slots, merge_intervals
+from config import SLOTS_GZIP_LEVEL
+from slot_format import compact_slots, encode_slots, verbose_slots
+
+EPOCH = datetime(1970, 1, 1)
+
+def timed(func, repeat):
+    """Best time of repeat runs, and the last result"""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started)
+    return result, best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--days', type=int, nargs='+', default=[7, 90, 365])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--slot-duration', type=int, default=30)
+    args = parser.parse_args()
+
+    # Only the JSON provider is needed, not the application
+    flask_app = Flask(__name__)
+    start_date = datetime(2025, 1, 6, tzinfo=pytz.UTC)
+    rng = random.Random(1)
+    print(f"{'days':>5} {'slots':>6} {'verbose ms':>11} {'compact ms':>11} {'verbose KiB':>12} {'compact KiB':>12} "
+          f"{'gzip verbose':>13} {'gzip compact':>13}")
+    with flask_app.app_context():
+        for days in args.days:
+            end_date = start_date + timedelta(days=days)
+            busy = []
+            for _ in range(days * 3):
+                start = start_date + timedelta(minutes=rng.randrange(0, days * 24 * 60, 15))
+                busy.append((start, start + timedelta(minutes=rng.choice([30, 60, 120]))))
+            slots = list(iter_free_slots(iter_time_slots(start_date, end_date, args.slot_duration),
+                                         merge_intervals(busy)))
+
+            verbose, verbose_time = timed(lambda: encode_slots(verbose_slots(slots), 'verbose'), args.repeat)
+            compact, compact_time = timed(
+                lambda: encode_slots(compact_slots(slots, args.slot_duration), 'compact'), args.repeat)
+
+            decoded = json.loads(compact)['starts']
+            expected = [slot['formatted_start'] for slot in json.loads(verbose)['slots']]
+            if [(EPOCH + timedelta(minutes=minutes)).isoformat() for minutes in decoded] != expected:
+                print(f"Mismatch at {days} days")
+                sys.exit(1)
+            print(f"{days:>5} {len(slots):>6} {verbose_time * 1000:>11.2f} {compact_time * 1000:>11.2f} "
+                  f"{len(verbose) / 1024:>12.1f} {len(compact) / 1024:>12.1f} "
+                  f"{len(gzip.compress(verbose, SLOTS_GZIP_LEVEL)) / 1024:>13.1f} "
+                  f"{len(gzip.compress(compact, SLOTS_GZIP_LEVEL)) / 1024:>13.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Compare eager slot dicts with lazily generated TimeSlots
+
+For windows of growing length, times building every slot as a dict with
+its display strings (the original generate_time_slots) and then filtering
+it, against sweeping the lazy iterators into a list, and against taking
+only the first page of free slots. Peak memory is measured with
+tracemalloc. Exits with status 1 if the lazy slots differ from the eager
+ones.
+
+Usage:
+    python benchmarks/bench_slot_generation.py [--days 7 90 365] [--page 20]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from itertools import islice
+import pytz
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from availability import iter_free_slots, iter_time_slots, merge_intervals
+
+def eager_time_slots(start_date, end_date, slot_duration):
+    """The original generate_time_slots: every slot as a dict with its display strings"""
+    slots = []
+    for slot in iter_time_slots(start_date, end_date, slot_duration):
+        slots.append({
+            'start': slot.start,
+            'end': slot.end,
+            'duration': slot_duration,
+            'formatted_start': slot.start.strftime('%Y-%m-%dT%H:%M:%S'),
+            'formatted_end': slot.end.strftime('%Y-%m-%dT%H:%M:%S'),
+            'display': slot.start.strftime('%A, %B %d, %Y %I:%M %p') + ' - ' + slot.end.strftime('%I:%M %p')
+        })
+    return slots
+
+def eager_free_slots(start_date, end_date, slot_duration, busy):
+    return list(iter_free_slots(eager_time_slots(start_date, end_date, slot_duration), busy))
+
+def lazy_free_slots(start_date, end_date, slot_duration, busy):
+    return list(iter_free_slots(iter_time_slots(start_date, end_date, slot_duration), busy))
+
+def first_page(start_date, end_date, slot_duration, busy, page):
+    return list(islice(iter_free_slots(iter_time_slots(start_date, end_date, slot_duration), busy), page))
+
+def measure(func, *args):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--days', type=int, nargs='+', default=[7, 90, 365])
+    parser.add_argument('--page', type=int, default=20)
+    parser.add_argument('--slot-duration', type=int, default=30)
+    args = parser.parse_args()
+
+    start_date = datetime(2025, 1, 6, tzinfo=pytz.UTC)
+    rng = random.Random(1)
+    print(f"{'days':>5} {'free':>6} {'eager ms':>9} {'eager KiB':>10} {'lazy ms':>8} {'lazy KiB':>9} "
+          f"{'page ms':>8} {'page KiB':>9}")
+    for days in args.days:
+        end_date = start_date + timedelta(days=days)
+        # About a third of working time busy
+        busy = []
+        for _ in range(days * 3):
+            start = start_date + timedelta(minutes=rng.randrange(0, days * 24 * 60, 15))
+            busy.append((start, start + timedelta(minutes=rng.choice([30, 60, 120]))))
+        busy = merge_intervals(busy)
+
+        eager, eager_time, eager_peak = measure(eager_free_slots, start_date, end_date, args.slot_duration, busy)
+        lazy, lazy_time, lazy_peak = measure(lazy_free_slots, start_date, end_date, args.slot_duration, busy)
+        page, page_time, page_peak = measure(first_page, start_date, end_date, args.slot_duration, busy, args.page)
+
+        if [slot['display'] for slot in eager] != [slot.display for slot in lazy] or \
+                [slot.start for slot in page] != [slot.start for slot in lazy[:args.page]]:
+            print(f"Mismatch at {days} days")
+            sys.exit(1)
+        print(f"{days:>5} {len(lazy):>6} {eager_time * 1000:>9.2f} {eager_peak / 1024:>10.0f} "
+              f"{lazy_time * 1000:>8.2f} {lazy_peak / 1024:>9.0f} {page_time * 1000:>8.3f} {page_peak / 1024:>9.1f}")
+
+if __name__ == "__main__":
+    main()
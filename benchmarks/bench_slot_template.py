@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Compare compiled availability templates with the per-slot generator
+
+Times iter_time_slots, which builds and checks datetimes slot by slot,
+against SlotTemplate.iter_slots with the default rules and with rules in
+a DST-observing time zone, for windows of growing length. Exits with
+status 1 if the default template yields different slots from the
+generator.
+
+Usage:
+    python benchmarks/bench_slot_template.py [--days 7 90 365] [--repeat 5]
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+import pytz
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from availability import iter_time_slots
+from availability_rules import AvailabilityRules
+
+LOCAL_RULES = {
+    'timezone': 'Europe/Berlin',
+    'weekly_hours': {day: [['08:30', '12:00'], ['13:00', '17:30']]
+                     for day in ['monday', 'tuesday', 'wednesday', 'thursday', 'friday']},
+    'slot_duration': 45,
+    'slot_step': 15,
+    'buffer_before': 10
+}
+
+def best_of(repeat, func, *args):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = list(func(*args))
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--days', type=int, nargs='+', default=[7, 90, 365])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    default_template = AvailabilityRules().compile()
+    local_template = AvailabilityRules.from_dict(LOCAL_RULES).compile()
+    start_date = datetime(2025, 1, 6, tzinfo=pytz.UTC)
+
+    print(f"{'days':>5} {'slots':>6} {'generator ms':>13} {'template ms':>12} {'speedup':>8} "
+          f"{'Berlin slots':>13} {'Berlin ms':>10}")
+    for days in args.days:
+        end_date = start_date + timedelta(days=days)
+        legacy, legacy_time = best_of(args.repeat, iter_time_slots, start_date, end_date, 30)
+        compiled, compiled_time = best_of(args.repeat, default_template.iter_slots, start_date, end_date)
+        local, local_time = best_of(args.repeat, local_template.iter_slots, start_date, end_date)
+        if [slot.start for slot in legacy] != [slot.start for slot in compiled]:
+            print(f"Mismatch at {days} days")
+            sys.exit(1)
+        print(f"{days:>5} {len(compiled):>6} {legacy_time * 1000:>13.2f} {compiled_time * 1000:>12.2f} "
+              f"{legacy_time / compiled_time:>7.1f}x {len(local):>13} {local_time * 1000:>10.2f}")
+
+if __name__ == "__main__":
+    main()
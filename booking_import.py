@@ -0,0 +1,266 @@
+"""
+Bulk booking import
+
+Loads thousands of bookings (for example history migrated from another
+booking tool) into one shared link. All rows are validated in one pass
+against a single read of the link's busy time, accepted rows are inserted
+in chunked transactions, and every input row gets an outcome. Used by the
+/api/links/<shared_link_id>/bookings/import endpoint and the
+`flask import-bookings` command, which both take the link's numeric ID.
+
+Imported bookings do not go through the booking listeners: no events are
+created in the calendars, only the rollups and availability cache are
+updated.
+"""
+
+import csv
+import io
+import json
+import logging
+from bisect import bisect_right
+from datetime import datetime
+import click
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import joinedload
+from app import db
+from availability import merge_busy_intervals, merge_intervals, to_utc
+from booking_stats import record_bookings
+from calendar_sync import (
+    get_booked_intervals, get_calendar_events, lock_booking_calendars, overlapping_bookings_filter, to_utc_naive
+)
+from config import BOOKING_IMPORT_CHUNK_SIZE
+from models import Booking, SharedLink
+from slot_cache import invalidate_booked_time
+
+BOOKING_FIELDS = ['customer_name', 'customer_email', 'start_time', 'end_time', 'subject', 'description', 'status']
+REQUIRED_FIELDS = ['customer_name', 'customer_email', 'start_time', 'end_time', 'subject']
+# Column lengths of the Booking model
+FIELD_LENGTHS = {'customer_name': 128, 'customer_email': 128, 'subject': 256, 'status': 20}
+
+UNAVAILABLE = "The selected time is not available"
+OVERLAPS_IMPORT = "Overlaps an earlier booking in the import"
+
+class BusyTimes:
+    """Merged UTC busy intervals that can be probed for overlaps"""
+
+    def __init__(self, intervals):
+        merged = merge_intervals(intervals)
+        self.starts = [start for start, _ in merged]
+        self.ends = [end for _, end in merged]
+
+    def overlaps(self, start, end):
+        # The first interval ending after start is the only one that can overlap
+        index = bisect_right(self.ends, start)
+        return index < len(self.starts) and self.starts[index] < end
+
+def parse_booking_file(content, file_format):
+    """Read booking rows from CSV (with a header line) or JSON (a list, or an object with "bookings")"""
+    if file_format == 'csv':
+        reader = csv.DictReader(io.StringIO(content))
+        return [{(key or '').strip(): value for key, value in row.items()} for row in reader]
+    if file_format == 'json':
+        data = json.loads(content)
+        if isinstance(data, dict):
+            data = data.get('bookings')
+        if not isinstance(data, list):
+            raise ValueError("Expected a list of bookings")
+        return data
+    raise ValueError(f"Unsupported format: {file_format}")
+
+def clean_booking_row(row):
+    """Check one input row and convert it to Booking column values; returns (values, error)"""
+    if not isinstance(row, dict):
+        return None, "Row is not an object"
+    values = {field: str(row.get(field) or '').strip() for field in BOOKING_FIELDS}
+    missing = [field for field in REQUIRED_FIELDS if not values[field]]
+    if missing:
+        return None, f"Missing {', '.join(missing)}"
+    too_long = [field for field, length in FIELD_LENGTHS.items() if len(values[field]) > length]
+    if too_long:
+        return None, f"Too long: {', '.join(too_long)}"
+    try:
+        values['start_time'] = to_utc(datetime.fromisoformat(values['start_time']))
+        values['end_time'] = to_utc(datetime.fromisoformat(values['end_time']))
+    except ValueError:
+        return None, "Invalid start_time or end_time"
+    if values['end_time'] <= values['start_time']:
+        return None, "The booking must end after it starts"
+    values['status'] = values['status'].lower() or 'confirmed'
+    return values, None
+
+def get_busy_times(shared_link, start, end, check_calendars):
+    """Everything that blocks the link between start and end: bookings, and optionally calendar events"""
+    calendars = shared_link.calendars
+    busy = get_booked_intervals(shared_link.id, [calendar.id for calendar in calendars], start, end)
+    if check_calendars:
+        events = []
+        for calendar in calendars:
+            events.extend(get_calendar_events(calendar, start, end) or [])
+        busy.extend(merge_busy_intervals(events))
+    return BusyTimes(busy)
+
+def validate_bookings(shared_link, rows, check_calendars=True):
+    """
+    Check all rows in one pass
+
+    Busy time is read once for the span of the whole import. Confirmed rows
+    are then swept in start order, rejecting those that overlap busy time
+    or a row accepted before them. Returns (errors, accepted): errors maps
+    row indexes to messages, accepted lists (row index, values).
+    """
+    errors = {}
+    accepted = []
+    confirmed = []
+    for index, row in enumerate(rows):
+        values, error = clean_booking_row(row)
+        if error:
+            errors[index] = error
+        elif values['status'] == 'confirmed':
+            confirmed.append((index, values))
+        else:
+            # Cancelled and other historical rows do not take up time
+            accepted.append((index, values))
+
+    if confirmed:
+        confirmed.sort(key=lambda item: item[1]['start_time'])
+        span_end = max(values['end_time'] for _, values in confirmed)
+        busy = get_busy_times(shared_link, confirmed[0][1]['start_time'], span_end, check_calendars)
+        reach = None  # End of the latest-ending accepted row, which all start before this one
+        for index, values in confirmed:
+            if busy.overlaps(values['start_time'], values['end_time']):
+                errors[index] = UNAVAILABLE
+            elif reach is not None and values['start_time'] < reach:
+                errors[index] = OVERLAPS_IMPORT
+            else:
+                accepted.append((index, values))
+                reach = values['end_time'] if reach is None else max(reach, values['end_time'])
+
+    return errors, accepted
+
+def insert_booking_chunk(shared_link, chunk):
+    """
+    Insert one chunk of accepted rows in a transaction; returns {row index: booking ID or error}
+
+    Like create_booking, the insert runs under lock_booking_calendars, and
+    rows that overlap a booking committed by someone else since validation
+    are taken out again before the commit.
+    """
+    calendar_ids = [calendar.id for calendar in shared_link.calendars]
+    lock_booking_calendars(shared_link, shared_link.calendars)
+    booking_ids = db.session.execute(
+        insert(Booking).returning(Booking.id, sort_by_parameter_order=True),
+        [
+            {**values, 'shared_link_id': shared_link.id,
+             'start_time': to_utc_naive(values['start_time']), 'end_time': to_utc_naive(values['end_time'])}
+            for _, values in chunk
+        ]
+    ).scalars().all()
+
+    confirmed = [values for _, values in chunk if values['status'] == 'confirmed']
+    results = {}
+    taken = []
+    if confirmed:
+        newer = db.session.execute(
+            select(Booking.start_time, Booking.end_time).where(
+                *overlapping_bookings_filter(shared_link.id, calendar_ids,
+                                             min(values['start_time'] for values in confirmed),
+                                             max(values['end_time'] for values in confirmed)),
+                Booking.id.notin_(booking_ids)
+            )
+        )
+        busy = BusyTimes([(to_utc(start), to_utc(end)) for start, end in newer])
+        for (index, values), booking_id in zip(chunk, booking_ids):
+            if values['status'] == 'confirmed' and busy.overlaps(values['start_time'], values['end_time']):
+                results[index] = UNAVAILABLE
+                taken.append(booking_id)
+    if taken:
+        db.session.execute(delete(Booking).where(Booking.id.in_(taken)))
+
+    kept = []
+    for (index, values), booking_id in zip(chunk, booking_ids):
+        if index not in results:
+            results[index] = booking_id
+            kept.append(values)
+    # Count the bookings in the analytics rollups as part of the same transaction
+    record_bookings(kept, shared_link)
+    db.session.commit()
+
+    booked = [(values['start_time'], values['end_time']) for values in kept if values['status'] == 'confirmed']
+    if booked:
+        invalidate_booked_time(shared_link, booked)
+    return results
+
+def import_bookings(shared_link, rows, check_calendars=True, chunk_size=BOOKING_IMPORT_CHUNK_SIZE):
+    """
+    Validate and insert booking rows for a shared link
+
+    Set check_calendars to False for history that the calendar feeds
+    already list, which would otherwise clash with itself. Returns one
+    {"row", "status", "booking_id", "error"} dict per input row, rows
+    numbered from 1; status is "created" or "rejected".
+    """
+    errors, accepted = validate_bookings(shared_link, rows, check_calendars)
+
+    # Insert in input order so booking IDs follow the file
+    accepted.sort(key=lambda item: item[0])
+    created = {}
+    for offset in range(0, len(accepted), chunk_size):
+        chunk = accepted[offset:offset + chunk_size]
+        try:
+            for index, result in insert_booking_chunk(shared_link, chunk).items():
+                if isinstance(result, str):
+                    errors[index] = result
+                else:
+                    created[index] = result
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error importing bookings for shared link {shared_link.id}: {e}")
+            for index, _ in chunk:
+                errors[index] = "Failed to save the booking"
+
+    logging.info(f"Imported {len(created)} of {len(rows)} bookings into shared link {shared_link.id}")
+    return [
+        {
+            'row': index + 1,
+            'status': 'created' if index in created else 'rejected',
+            'booking_id': created.get(index),
+            'error': errors.get(index)
+        }
+        for index in range(len(rows))
+    ]
+
+def summarize_import(results):
+    """Counts of created and rejected rows"""
+    created = sum(1 for result in results if result['status'] == 'created')
+    return {'created': created, 'rejected': len(results) - created}
+
+def init_cli(app):
+    """Register the import-bookings command"""
+
+    @app.cli.command('import-bookings')
+    @click.argument('shared_link_id', type=int)
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', 'file_format', type=click.Choice(['csv', 'json']),
+                  help='input format (defaults to the file extension)')
+    @click.option('--skip-calendar-check', is_flag=True,
+                  help='only check against other bookings, not calendar events')
+    @click.option('--chunk-size', type=int, default=BOOKING_IMPORT_CHUNK_SIZE, show_default=True)
+    def import_bookings_command(shared_link_id, path, file_format, skip_calendar_check, chunk_size):
+        """Import bookings from a CSV or JSON file into the shared link with ID SHARED_LINK_ID"""
+        shared_link = SharedLink.query.options(joinedload(SharedLink.calendars)).filter_by(id=shared_link_id).first()
+        if not shared_link:
+            raise click.ClickException(f"Shared link {shared_link_id} not found")
+
+        file_format = file_format or ('json' if path.lower().endswith('.json') else 'csv')
+        with open(path, encoding='utf-8-sig', newline='') as file:
+            try:
+                rows = parse_booking_file(file.read(), file_format)
+            except ValueError as e:
+                raise click.ClickException(f"Could not read {path}: {e}")
+
+        results = import_bookings(shared_link, rows, check_calendars=not skip_calendar_check, chunk_size=chunk_size)
+        for result in results:
+            if result['status'] == 'rejected':
+                click.echo(f"row {result['row']}: {result['error']}")
+        summary = summarize_import(results)
+        click.echo(f"{summary['created']} created, {summary['rejected']} rejected")
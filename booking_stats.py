@@ -0,0 +1,327 @@
+import logging
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta
+from sqlalchemy import Integer, and_, cast, delete, func, insert, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from app import db
+from availability import WEEKDAY_ORDER
+from job_queue import job_handler
+from models import Booking, BookingCustomerRollup, BookingHourlyRollup, Job, SharedLink
+
+class BookingTally:
+    """Accumulates booking counts into the metrics dict get_booking_analytics returns"""
+
+    def __init__(self, link_names):
+        self.link_names = link_names
+        self.total_bookings = 0
+        self.total_duration = 0.0  # in seconds
+        self.by_link = defaultdict(int)
+        self.by_day = defaultdict(int)
+        self.by_hour = defaultdict(int)
+        self.by_weekday = defaultdict(int)
+        self.customers = Counter()
+
+    def add(self, shared_link_id, day, hour, count=1, duration_seconds=0):
+        """Count bookings of one link that start on day (a date) in the given hour"""
+        self.total_bookings += count
+        self.total_duration += duration_seconds
+        self.by_link[self.link_names.get(shared_link_id, f"Link {shared_link_id}")] += count
+        self.by_day[day.strftime('%Y-%m-%d')] += count
+        self.by_hour[hour] += count
+        self.by_weekday[day.strftime('%A')] += count
+
+    def result(self, start_date, end_date):
+        average_duration = self.total_duration / self.total_bookings if self.total_bookings > 0 else 0
+        return {
+            "total_bookings": self.total_bookings,
+            "bookings_by_link": dict(self.by_link),
+            "bookings_by_day": dict(sorted(self.by_day.items())),
+            "bookings_by_hour": {f"{hour}:00": count for hour, count in sorted(self.by_hour.items())},
+            "bookings_by_weekday": {day: self.by_weekday.get(day, 0) for day in WEEKDAY_ORDER},
+            "top_customers": [
+                {"email": email, "count": count}
+                for email, count in self.customers.most_common(5)
+            ],
+            "average_duration": round(average_duration / 60, 1),
+            "start_date": start_date,
+            "end_date": end_date
+        }
+
+def hour_bucket(value):
+    """The naive start of the hour a booking time falls in"""
+    return value.replace(minute=0, second=0, microsecond=0, tzinfo=None)
+
+def upsert_increment(model, keys, increments):
+    """Insert a rollup row, or add the increments to the existing row with the same keys"""
+    dialect = postgresql if db.session.get_bind().dialect.name == 'postgresql' else sqlite
+    statement = dialect.insert(model).values(**keys, **increments)
+    statement = statement.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={name: getattr(model, name) + statement.excluded[name] for name in increments}
+    )
+    db.session.execute(statement)
+
+def upsert_increments(model, key_names, increment_names, rows):
+    """upsert_increment for many rows (dicts of keys and increments) in one executemany"""
+    dialect = postgresql if db.session.get_bind().dialect.name == 'postgresql' else sqlite
+    statement = dialect.insert(model)
+    statement = statement.on_conflict_do_update(
+        index_elements=key_names,
+        set_={name: getattr(model, name) + statement.excluded[name] for name in increment_names}
+    )
+    db.session.execute(statement, rows)
+
+def record_booking(booking, shared_link):
+    """
+    Add a booking to the rollup tables
+
+    Runs inside the transaction of the booking_rollups job, so the rollups
+    are counted once when that job commits.
+    """
+    start_time = booking.start_time.replace(tzinfo=None)
+    duration = (booking.end_time - booking.start_time).total_seconds()
+    upsert_increment(
+        BookingHourlyRollup,
+        {'user_id': shared_link.user_id, 'shared_link_id': shared_link.id, 'bucket': hour_bucket(start_time)},
+        {'booking_count': 1, 'total_duration': int(round(duration))}
+    )
+    upsert_increment(
+        BookingCustomerRollup,
+        {'user_id': shared_link.user_id, 'shared_link_id': shared_link.id,
+         'day': start_time.date(), 'customer_email': booking.customer_email},
+        {'booking_count': 1}
+    )
+
+@job_handler('booking_rollups')
+def add_booking_to_rollups(payload):
+    """Count a new booking in the rollups (queued by create_booking)"""
+    booking = db.session.get(Booking, payload['booking_id'])
+    if booking:
+        record_booking(booking, booking.shared_link)
+
+def record_bookings(bookings, shared_link):
+    """
+    Add many bookings of one link to the rollup tables
+
+    bookings are dicts with start_time, end_time and customer_email. Counts
+    are summed per rollup row first, then all rows are upserted in one
+    executemany per table.
+    """
+    hourly = defaultdict(lambda: [0, 0])
+    customers = Counter()
+    for booking in bookings:
+        start_time = booking['start_time'].replace(tzinfo=None)
+        totals = hourly[hour_bucket(start_time)]
+        totals[0] += 1
+        totals[1] += int(round((booking['end_time'] - booking['start_time']).total_seconds()))
+        customers[(start_time.date(), booking['customer_email'])] += 1
+
+    keys = {'user_id': shared_link.user_id, 'shared_link_id': shared_link.id}
+    if hourly:
+        upsert_increments(BookingHourlyRollup, ['user_id', 'shared_link_id', 'bucket'],
+                          ['booking_count', 'total_duration'], [
+            {**keys, 'bucket': bucket, 'booking_count': count, 'total_duration': duration}
+            for bucket, (count, duration) in hourly.items()
+        ])
+    if customers:
+        upsert_increments(BookingCustomerRollup, ['user_id', 'shared_link_id', 'day', 'customer_email'],
+                          ['booking_count'], [
+            {**keys, 'day': day, 'customer_email': email, 'booking_count': count}
+            for (day, email), count in customers.items()
+        ])
+
+def rebuild_booking_rollups():
+    """Recompute the rollup tables from the Booking table"""
+    db.session.execute(delete(BookingHourlyRollup))
+    db.session.execute(delete(BookingCustomerRollup))
+    # The rebuild counts every booking, including those still waiting for their job
+    db.session.execute(delete(Job).where(Job.kind == 'booking_rollups', Job.status == 'pending'))
+
+    hourly = defaultdict(lambda: [0, 0])
+    customers = Counter()
+    query = select(Booking, SharedLink.user_id).join(SharedLink, Booking.shared_link_id == SharedLink.id)
+    for booking, user_id in db.session.execute(query.execution_options(yield_per=1000)):
+        start_time = booking.start_time.replace(tzinfo=None)
+        totals = hourly[(user_id, booking.shared_link_id, hour_bucket(start_time))]
+        totals[0] += 1
+        totals[1] += int(round((booking.end_time - booking.start_time).total_seconds()))
+        customers[(user_id, booking.shared_link_id, start_time.date(), booking.customer_email)] += 1
+
+    if hourly:
+        db.session.execute(insert(BookingHourlyRollup), [
+            {'user_id': user_id, 'shared_link_id': link_id, 'bucket': bucket,
+             'booking_count': count, 'total_duration': duration}
+            for (user_id, link_id, bucket), (count, duration) in hourly.items()
+        ])
+    if customers:
+        db.session.execute(insert(BookingCustomerRollup), [
+            {'user_id': user_id, 'shared_link_id': link_id, 'day': day,
+             'customer_email': email, 'booking_count': count}
+            for (user_id, link_id, day, email), count in customers.items()
+        ])
+    db.session.commit()
+    logging.info(f"Rebuilt booking rollups: {len(hourly)} hourly and {len(customers)} customer rows")
+
+def backfill_booking_rollups():
+    """Build the rollups once for databases that have bookings from before they existed"""
+    has_rollups = db.session.execute(select(BookingHourlyRollup.id).limit(1)).first()
+    has_bookings = db.session.execute(select(Booking.id).limit(1)).first()
+    if has_bookings and not has_rollups:
+        rebuild_booking_rollups()
+
+def booking_filter(link_ids, start_date, end_date):
+    """Bookings of the given links that start within [start_date, end_date]"""
+    return (
+        Booking.shared_link_id.in_(link_ids),
+        Booking.start_time >= start_date,
+        Booking.start_time <= end_date
+    )
+
+def ceil_hour(value):
+    floor = hour_bucket(value)
+    return floor if floor == value else floor + timedelta(hours=1)
+
+def ceil_day(value):
+    floor = datetime.combine(value.date(), datetime.min.time())
+    return floor if floor == value else floor + timedelta(days=1)
+
+def get_rollup_booking_analytics(user_id, shared_links, start_date, end_date):
+    """
+    Booking analytics read from the rollup tables
+
+    Whole hours (and, for customers, whole days) inside the range are read
+    from the rollups. The partial days at either edge are counted from the
+    bookings themselves, so arbitrary ranges match a full scan.
+    """
+    period = (start_date, end_date)
+    start_date = start_date.replace(tzinfo=None)
+    end_date = end_date.replace(tzinfo=None)
+    link_ids = [link.id for link in shared_links]
+    tally = BookingTally({link.id: link.name for link in shared_links})
+
+    def count_bookings(bookings):
+        for link_id, start_time, end_time, _ in bookings:
+            tally.add(link_id, start_time.date(), start_time.hour, 1, (end_time - start_time).total_seconds())
+
+    booking_columns = select(Booking.shared_link_id, Booking.start_time, Booking.end_time, Booking.customer_email)
+    head, tail = ceil_hour(start_date), hour_bucket(end_date)
+    day_head, day_tail = ceil_day(start_date), datetime.combine(end_date.date(), datetime.min.time())
+    if day_head >= day_tail:
+        # A range within a day or two is cheaper to count from the bookings directly
+        bookings = db.session.execute(booking_columns.where(*booking_filter(link_ids, start_date, end_date))).all()
+        count_bookings(bookings)
+        tally.customers.update(email for _, _, _, email in bookings)
+        return tally.result(*period)
+
+    # Bookings on the partial first and last days; they include the partial hours
+    edges = db.session.execute(booking_columns.where(
+        Booking.shared_link_id.in_(link_ids),
+        or_(
+            and_(Booking.start_time >= start_date, Booking.start_time < day_head),
+            and_(Booking.start_time >= day_tail, Booking.start_time <= end_date)
+        )
+    )).all()
+
+    # Whole hours come from the hourly rollup, the partial ones from the edge bookings
+    rows = db.session.execute(
+        select(BookingHourlyRollup.shared_link_id, BookingHourlyRollup.bucket,
+               BookingHourlyRollup.booking_count, BookingHourlyRollup.total_duration)
+        .where(BookingHourlyRollup.user_id == user_id,
+               BookingHourlyRollup.shared_link_id.in_(link_ids),
+               BookingHourlyRollup.bucket >= head,
+               BookingHourlyRollup.bucket < tail)
+    )
+    for link_id, bucket, count, duration in rows:
+        tally.add(link_id, bucket.date(), bucket.hour, count, duration)
+    count_bookings(booking for booking in edges if booking[1] < head or booking[1] >= tail)
+
+    # Customers: whole days from the customer rollup, edge days from the bookings
+    edge_customers = Counter(email for _, _, _, email in edges)
+    total = func.sum(BookingCustomerRollup.booking_count)
+    rollup_filter = (
+        BookingCustomerRollup.user_id == user_id,
+        BookingCustomerRollup.shared_link_id.in_(link_ids),
+        BookingCustomerRollup.day >= day_head.date(),
+        BookingCustomerRollup.day < day_tail.date()
+    )
+    # Only customers in the rollup's top five (plus one per edge customer,
+    # who may overtake them) or in the edges can reach the final top five
+    candidates = db.session.execute(
+        select(BookingCustomerRollup.customer_email, total)
+        .where(*rollup_filter)
+        .group_by(BookingCustomerRollup.customer_email)
+        .order_by(total.desc(), BookingCustomerRollup.customer_email)
+        .limit(5 + len(edge_customers))
+    ).all()
+    if edge_customers:
+        candidates += db.session.execute(
+            select(BookingCustomerRollup.customer_email, total)
+            .where(*rollup_filter, BookingCustomerRollup.customer_email.in_(list(edge_customers)))
+            .group_by(BookingCustomerRollup.customer_email)
+        ).all()
+    tally.customers.update({email: count for email, count in candidates})
+    tally.customers.update(edge_customers)
+
+    return tally.result(*period)
+
+def sql_day_and_hour(column):
+    """
+    SQL expressions for the day and hour of a datetime column
+
+    PostgreSQL only matches GROUP BY expressions without bound parameters,
+    so its expressions avoid format strings.
+    """
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return func.date(column), cast(func.extract('hour', column), Integer)
+    return func.date(column), cast(func.strftime('%H', column), Integer)
+
+def sql_duration_seconds(start_column, end_column):
+    """SQL expression for the whole seconds between two datetime columns"""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return func.extract('epoch', end_column - start_column)
+    return cast(func.strftime('%s', end_column), Integer) - cast(func.strftime('%s', start_column), Integer)
+
+def hourly_totals_query(link_ids, start_date, end_date):
+    """Booking count and total duration per link, day and hour"""
+    day, hour = sql_day_and_hour(Booking.start_time)
+    return (
+        select(Booking.shared_link_id, day, hour, func.count(),
+               func.sum(sql_duration_seconds(Booking.start_time, Booking.end_time)))
+        .where(*booking_filter(link_ids, start_date, end_date))
+        .group_by(Booking.shared_link_id, day, hour)
+    )
+
+def top_customers_query(link_ids, start_date, end_date, limit=5):
+    """The customers with the most bookings"""
+    total = func.count()
+    return (
+        select(Booking.customer_email, total)
+        .where(*booking_filter(link_ids, start_date, end_date))
+        .group_by(Booking.customer_email)
+        .order_by(total.desc(), Booking.customer_email)
+        .limit(limit)
+    )
+
+def get_sql_booking_analytics(user_id, shared_links, start_date, end_date):
+    """
+    Booking analytics aggregated by the database with GROUP BY queries
+
+    Only one row per link, day and hour, plus the top customers, leaves the
+    database, instead of every booking in the range. Works on SQLite and
+    PostgreSQL without the rollup tables.
+    """
+    link_ids = [link.id for link in shared_links]
+    tally = BookingTally({link.id: link.name for link in shared_links})
+    naive_start = start_date.replace(tzinfo=None)
+    naive_end = end_date.replace(tzinfo=None)
+
+    for link_id, day, hour, count, duration in db.session.execute(
+            hourly_totals_query(link_ids, naive_start, naive_end)):
+        # SQLite returns the day as YYYY-MM-DD text, PostgreSQL as a date
+        day = day if isinstance(day, date) else date.fromisoformat(day)
+        tally.add(link_id, day, hour, count, float(duration or 0))
+
+    for email, count in db.session.execute(top_customers_query(link_ids, naive_start, naive_end)):
+        tally.customers[email] = count
+
+    return tally.result(start_date, end_date)
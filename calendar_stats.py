@@ -0,0 +1,162 @@
+import numpy as np
+from availability import BUSY_STATUSES, WEEKDAY_ORDER, to_utc
+
+# Working hours used for free slots and busy percentages, as in iter_time_slots
+WORKING_START = np.timedelta64(9, 'h')
+WORKING_END = np.timedelta64(17, 'h')
+ONE_DAY = np.timedelta64(1, 'D')
+
+class EventColumns:
+    """The events of one calendar as parallel NumPy arrays (naive UTC datetime64[us])"""
+
+    def __init__(self, starts, ends, show_as):
+        self.starts = np.array(starts, dtype='datetime64[us]')
+        self.ends = np.array(ends, dtype='datetime64[us]')
+        self.show_as = np.array(show_as, dtype=object)
+
+    def __len__(self):
+        return len(self.starts)
+
+    @property
+    def busy(self):
+        return np.isin(self.show_as, BUSY_STATUSES)
+
+def naive_utc64(value):
+    """A datetime as naive UTC datetime64[us]; naive values are taken as UTC"""
+    return np.datetime64(to_utc(value).replace(tzinfo=None), 'us')
+
+def merge_interval_arrays(starts, ends):
+    """Vectorized merge_intervals: sort and coalesce overlapping or touching ranges"""
+    if not len(starts):
+        return starts, ends
+    order = np.argsort(starts, kind='stable')
+    starts, ends = starts[order], ends[order]
+    reach = np.maximum.accumulate(ends)
+    # A range opens a new group when it starts after everything before it ended
+    opens = np.ones(len(starts), dtype=bool)
+    opens[1:] = starts[1:] > reach[:-1]
+    first = np.flatnonzero(opens)
+    last = np.append(first[1:], len(starts)) - 1
+    return starts[first], reach[last]
+
+def working_slot_starts(start_date, end_date, slot_duration=30):
+    """
+    Vectorized iter_time_slots: the slot starts it would produce, as datetime64[us]
+
+    Mirrors its walk exactly: the first day starts at start_date (or 9:00),
+    later days start at 9:00 once their midnight is before end_date, the
+    first slot of each day is taken without checking end_date, later ones
+    must start before it, every slot must end by 17:00, and weekend slots
+    are dropped.
+    """
+    start = naive_utc64(start_date)
+    end = naive_utc64(end_date)
+    step = np.timedelta64(slot_duration, 'm')
+    if start >= end:
+        return np.array([], dtype='datetime64[us]')
+
+    first_day = start.astype('datetime64[D]').astype('datetime64[us]')
+    slots = []
+
+    # The first day begins wherever the window does
+    if start - first_day < WORKING_END:
+        first = max(start, first_day + WORKING_START)
+        count = int((first_day + WORKING_END - first) // step)
+        day_slots = first + np.arange(count) * step
+        slots.append(day_slots[(np.arange(count) == 0) | (day_slots < end)])
+
+    # Later days are reached while their midnight is before the end of the window
+    last_day = (end - np.timedelta64(1, 'us')).astype('datetime64[D]').astype('datetime64[us]')
+    if last_day > first_day:
+        days = np.arange(first_day + ONE_DAY, last_day + ONE_DAY, ONE_DAY)
+        per_day = int((WORKING_END - WORKING_START) // step)
+        offsets = np.arange(per_day) * step
+        grid = days[:, None] + WORKING_START + offsets[None, :]
+        keep = (offsets == np.timedelta64(0, 'm'))[None, :] | (grid < end)
+        slots.append(grid[keep])
+
+    if not slots:
+        return np.array([], dtype='datetime64[us]')
+    starts = np.concatenate(slots)
+    return starts[weekdays(starts) < 5]
+
+def weekdays(values):
+    """Weekday numbers (Monday is 0) of datetime64 values"""
+    days = values.astype('datetime64[D]').astype(np.int64)
+    # 1970-01-01 was a Thursday
+    return (days + 3) % 7
+
+def free_slot_mask(slot_starts, slot_duration, busy_starts, busy_ends):
+    """Which slots overlap none of the merged, sorted busy intervals"""
+    if not len(busy_starts):
+        return np.ones(len(slot_starts), dtype=bool)
+    slot_ends = slot_starts + np.timedelta64(slot_duration, 'm')
+    # The first busy interval that ends after the slot begins is the only one that can overlap it
+    index = np.searchsorted(busy_ends, slot_starts, side='right')
+    nearest = np.minimum(index, len(busy_starts) - 1)
+    return (index == len(busy_starts)) | (busy_starts[nearest] >= slot_ends)
+
+def count_working_days(start_date, end_date):
+    """Weekdays among start_date, start_date + 1 day, ... up to end_date"""
+    if start_date > end_date:
+        return 0
+    days = (end_date - start_date).days + 1
+    first = np.datetime64(start_date.date(), 'D')
+    return int(np.busday_count(first, first + days))
+
+def compute_calendar_analytics(columns_by_calendar, calendar_names, start_date, end_date, slot_duration=30):
+    """
+    Calendar analytics over columnar event data
+
+    columns_by_calendar maps calendar IDs to EventColumns (or None when the
+    calendar could not be loaded). Returns the same dict as the per-event
+    implementation it replaces.
+    """
+    events_by_calendar = {}
+    busy_starts = []
+    busy_ends = []
+    for calendar_id, columns in columns_by_calendar.items():
+        if not columns:
+            continue
+        events_by_calendar[calendar_names[calendar_id]] = len(columns)
+        busy = columns.busy
+        busy_starts.append(columns.starts[busy])
+        busy_ends.append(columns.ends[busy])
+
+    starts = np.concatenate(busy_starts) if busy_starts else np.array([], dtype='datetime64[us]')
+    ends = np.concatenate(busy_ends) if busy_ends else np.array([], dtype='datetime64[us]')
+
+    # Busy events by day and hour of their start
+    days, day_counts = np.unique(starts.astype('datetime64[D]'), return_counts=True)
+    hours = ((starts - starts.astype('datetime64[D]')) // np.timedelta64(1, 'h')).astype(np.int64)
+    hour_counts = np.bincount(hours, minlength=24)
+    total_busy_minutes = float((ends - starts).astype(np.int64).sum()) / 60e6
+
+    # Free slots: drop those that overlap any busy event with a positive length
+    positive = ends > starts
+    merged_starts, merged_ends = merge_interval_arrays(starts[positive], ends[positive])
+    slot_starts = working_slot_starts(start_date, end_date, slot_duration)
+    free_starts = slot_starts[free_slot_mask(slot_starts, slot_duration, merged_starts, merged_ends)]
+    free_by_weekday = np.bincount(weekdays(free_starts), minlength=7)
+
+    # 8 working hours per day
+    total_possible_minutes = count_working_days(start_date, end_date) * 8 * 60
+
+    # Calculate busy vs free ratio
+    busy_percentage = (total_busy_minutes / total_possible_minutes * 100) if total_possible_minutes > 0 else 0
+    busy_percentage = min(100, busy_percentage)  # Cap at 100%
+    free_percentage = 100 - busy_percentage
+
+    return {
+        "busy_vs_free": {
+            "busy": round(busy_percentage, 1),
+            "free": round(free_percentage, 1)
+        },
+        "events_by_calendar": events_by_calendar,
+        "busiest_days": {str(day): int(count) for day, count in zip(days, day_counts)},
+        "busiest_hours": {f"{hour}:00": int(count) for hour, count in enumerate(hour_counts) if count},
+        "free_slot_distribution": {day: int(free_by_weekday[index]) for index, day in enumerate(WEEKDAY_ORDER)},
+        "free_slots_count": len(free_starts),
+        "start_date": start_date,
+        "end_date": end_date
+    }
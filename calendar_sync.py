@@ -1,303 +1,746 @@
 import logging
-import requests
-import json
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import pytz
-from collections import Counter, defaultdict
+from collections import defaultdict
+from booking_stats import get_rollup_booking_analytics, get_sql_booking_analytics
+from calendar_stats import EventColumns, compute_calendar_analytics
 from apscheduler.schedulers.background import BackgroundScheduler
-from icalendar import Calendar as ICalendar
-from models import Calendar, Booking, SharedLink
+from sqlalchemy import delete, func, insert, or_, select, text, update
+from sqlalchemy.orm import joinedload
+from models import Calendar, CalendarEvent, Booking, SharedLink, EVENT_COLUMNS, shared_link_calendar
+from feed_client import fetch_feed
+from calendar_writer import CalendarWriteError, new_event_id, put_event, write_calendar_events
+from job_queue import enqueue_job, job_handler
+from ics_stream import check_envelope, iter_vevents
+from recurrence import format_dates, get_series_end, iter_instances
+from availability import iter_free_slots, iter_time_slots, merge_busy_intervals, merge_intervals, to_utc
+from availability_rules import get_slot_template
 from app import db
+from config import BOOKING_ANALYTICS_BACKEND, JOB_INLINE_WORKER, JOB_POLL_SECONDS, REFRESH_TICK_SECONDS
 
 # Create a background scheduler for refreshing ICS feeds
 scheduler = BackgroundScheduler(daemon=True)
 
+# Stand-in end for recurring series that never finish
+FAR_FUTURE = datetime(9999, 1, 1, tzinfo=pytz.UTC)
+
+# Namespace of the PostgreSQL advisory locks that serialize refreshes of a calendar
+REFRESH_LOCK_NAMESPACE = 7281905
+
+# Rows written per statement while a feed is streamed into the event store
+STORE_CHUNK_SIZE = 500
+
 def get_calendar_events(calendar, start_date, end_date):
-    """Fetch events from a calendar using its ICS feed"""
-    # First check if we have cached events
-    if calendar.cached_events:
+    """Fetch the events of a calendar that overlap the given window"""
+    if not ensure_calendar_synced(calendar):
+        return None
+    
+    query = CalendarEvent.query.filter_by(calendar_id=calendar.id)
+    
+    # Without a window, recurring series cannot be expanded: return the stored rows
+    if not start_date or not end_date:
+        return [event.to_dict() for event in query.order_by(CalendarEvent.start).all()]
+    
+    window_start = to_utc(start_date)
+    window_end = to_utc(end_date)
+    
+    # Only read the single events that overlap the requested window
+    events = [
+        event.to_dict()
+        for event in query.filter(
+            CalendarEvent.is_recurring == False,
+            CalendarEvent.end > to_utc_naive(window_start),
+            CalendarEvent.start < to_utc_naive(window_end)
+        )
+    ]
+    
+    events.extend(iter_recurring_instances(calendar, window_start, window_end))
+    events.sort(key=lambda event: event['start'])
+    return events
+
+def get_calendar_event_columns(calendar, start_date, end_date):
+    """
+    Load the events of a calendar that overlap a window as EventColumns
+    
+    Covers the same events as get_calendar_events, but single events are
+    read as bare columns instead of being turned into dicts.
+    """
+    if not ensure_calendar_synced(calendar):
+        return None
+    
+    window_start = to_utc(start_date)
+    window_end = to_utc(end_date)
+    rows = db.session.execute(
+        select(CalendarEvent.start, CalendarEvent.end, CalendarEvent.show_as).where(
+            CalendarEvent.calendar_id == calendar.id,
+            CalendarEvent.is_recurring == False,
+            CalendarEvent.end > to_utc_naive(window_start),
+            CalendarEvent.start < to_utc_naive(window_end)
+        )
+    ).all()
+    starts = [row[0] for row in rows]
+    ends = [row[1] for row in rows]
+    show_as = [row[2] for row in rows]
+    
+    for instance in iter_recurring_instances(calendar, window_start, window_end):
+        starts.append(to_utc_naive(instance['start']))
+        ends.append(to_utc_naive(instance['end']))
+        show_as.append(instance['show_as'])
+    return EventColumns(starts, ends, show_as)
+
+def ensure_calendar_synced(calendar):
+    """
+    Make sure a calendar's events are in the event store
+    
+    Calendars that were never synced, or still carry the legacy JSON cache,
+    are refreshed from their ICS feed first. Returns False if that fails.
+    """
+    if not calendar.last_synced or calendar.cached_events:
+        return refresh_calendar_events(calendar) is not None
+    return True
+
+def iter_recurring_instances(calendar, window_start, window_end):
+    """Lazily expand the recurring series of a calendar that may have instances in a UTC window"""
+    series = [
+        event.to_dict()
+        for event in CalendarEvent.query.filter(
+            CalendarEvent.calendar_id == calendar.id,
+            CalendarEvent.is_recurring == True,
+            CalendarEvent.start < to_utc_naive(window_end),
+            or_(CalendarEvent.series_end.is_(None), CalendarEvent.series_end > to_utc_naive(window_start))
+        )
+    ]
+    if not series:
+        return
+    
+    # Instances replaced by a RECURRENCE-ID override are skipped; the override row stands in
+    longest = max(event['end'] - event['start'] for event in series)
+    overrides = defaultdict(set)
+    for uid, recurrence_id in db.session.execute(
+        select(CalendarEvent.uid, CalendarEvent.recurrence_id).where(
+            CalendarEvent.calendar_id == calendar.id,
+            CalendarEvent.recurrence_id > to_utc_naive(window_start - longest),
+            CalendarEvent.recurrence_id < to_utc_naive(window_end)
+        )
+    ):
+        overrides[uid].add(recurrence_id.replace(tzinfo=pytz.UTC))
+    
+    for event in series:
+        yield from iter_instances(event, window_start, window_end, overrides.get(event['id'], frozenset()))
+
+def to_utc_naive(value):
+    """Convert a datetime to the naive UTC form used by the event store"""
+    return to_utc(value).replace(tzinfo=None)
+
+class EventChangeSet:
+    """The inserts, updates and deletes a refresh applied to one calendar"""
+    
+    def __init__(self, calendar_id):
+        self.calendar_id = calendar_id
+        self.inserted = []  # (uid, recurrence_id) keys that are new
+        self.updated = []  # (uid, recurrence_id) keys whose stored row changed
+        self.deleted = []  # (uid, recurrence_id) keys that left the feed, or surplus copies of a key
+        self.intervals = []  # (start, end) UTC ranges whose availability may have changed
+    
+    def __bool__(self):
+        return bool(self.inserted or self.updated or self.deleted)
+    
+    def __repr__(self):
+        return (f'<EventChangeSet calendar={self.calendar_id} inserted={len(self.inserted)} '
+                f'updated={len(self.updated)} deleted={len(self.deleted)}>')
+
+# Callbacks notified with an EventChangeSet after a refresh commits changes
+event_change_listeners = []
+
+def on_events_changed(callback):
+    """Register a callback for committed event changes (usable as a decorator)"""
+    event_change_listeners.append(callback)
+    return callback
+
+def notify_event_changes(changes):
+    """Pass a committed change set to every registered listener"""
+    if not changes:
+        return
+    for listener in event_change_listeners:
         try:
-            cached_data = json.loads(calendar.cached_events)
-            return cached_data
+            listener(changes)
         except Exception as e:
-            logging.error(f"Error parsing cached events for calendar {calendar.id}: {e}")
+            logging.error(f"Error notifying event change listener {listener}: {e}")
+
+# Callbacks notified with a Booking after it is committed
+booking_listeners = []
+
+def on_booking_committed(callback):
+    """Register a callback for committed bookings (usable as a decorator)"""
+    booking_listeners.append(callback)
+    return callback
+
+def notify_booking_committed(booking):
+    """Pass a committed booking to every registered listener"""
+    for listener in booking_listeners:
+        try:
+            listener(booking)
+        except Exception as e:
+            logging.error(f"Error notifying booking listener {listener}: {e}")
+
+def get_shared_link_ids_for_calendars(calendar_ids):
+    """Return the IDs of active shared links that include any of the given calendars"""
+    calendar_ids = list(calendar_ids)
+    if not calendar_ids:
+        return []
+    # Served by the calendar_id index of the association table
+    return list(db.session.execute(
+        select(shared_link_calendar.c.shared_link_id)
+        .join(SharedLink, SharedLink.id == shared_link_calendar.c.shared_link_id)
+        .where(shared_link_calendar.c.calendar_id.in_(calendar_ids), SharedLink.active == True)
+        .distinct()
+    ).scalars())
+
+def ical_time(value):
+    """Convert an ICS date or datetime into a UTC datetime"""
+    if not isinstance(value, datetime):
+        value = datetime.combine(value, datetime.min.time(), tzinfo=pytz.UTC)
+    return to_utc(value)
+
+def ical_dates(component, name):
+    """Collect the values of a multi-valued date property such as RDATE or EXDATE"""
+    values = component.get(name)
+    if values is None:
+        return []
+    if not isinstance(values, list):
+        values = [values]
     
-    # If no cache or error parsing it, fetch from ICS
-    return refresh_calendar_events(calendar)
+    dates = []
+    for value in values:
+        for item in value.dts:
+            dt = item.dt
+            # RDATE may hold PERIOD values; only their start matters here
+            if isinstance(dt, tuple):
+                dt = dt[0]
+            dates.append(ical_time(dt))
+    return dates
 
-def refresh_calendar_events(calendar):
-    """Refresh events from an ICS feed and update the cache"""
+def ics_event(component):
+    """Convert a parsed VEVENT component into an event dict"""
+    # Extract start and end times
+    start_dt = component.get('dtstart').dt
+    if component.get('dtend'):
+        end_dt = component.get('dtend').dt
+    elif component.get('duration'):
+        end_dt = start_dt + component.get('duration').dt
+    else:
+        end_dt = start_dt
+    
+    # Check if they are date objects (all-day events) or datetime objects
+    is_all_day = isinstance(start_dt, date) and not isinstance(start_dt, datetime)
+    
+    # All-day events without an end last one day
+    if is_all_day and end_dt == start_dt:
+        end_dt = start_dt + timedelta(days=1)
+    
+    rrule = component.get('rrule')
+    rdates = ical_dates(component, 'rdate')
+    recurrence_id = component.get('recurrence-id')
+    last_modified = component.get('last-modified')
+    status = str(component.get('status', 'CONFIRMED'))
+    zone = start_dt.tzinfo if isinstance(start_dt, datetime) else None
+    
+    event = {
+        'id': str(component.get('uid', '')),
+        'subject': str(component.get('summary', 'No Title')),
+        'start': ical_time(start_dt),
+        'end': ical_time(end_dt),
+        'is_all_day': is_all_day,
+        'status': status,
+        'description': str(component.get('description', '')),
+        'location': str(component.get('location', '')),
+        'organizer': str(component.get('organizer', '')),
+        'recurrence': rrule.to_ical().decode() if rrule else None,
+        'rdates': rdates,
+        'exdates': ical_dates(component, 'exdate'),
+        'timezone': getattr(zone, 'key', None) or getattr(zone, 'zone', None),
+        'is_recurring': bool(rrule or rdates) and not recurrence_id,
+        'recurrence_id': ical_time(recurrence_id.dt) if recurrence_id else None,
+        'sequence': int(component.get('sequence', 0)),
+        'last_modified': ical_time(last_modified.dt) if last_modified else None
+    }
+    
+    # Add busy/free status (cancelled and TRANSP:TRANSPARENT events are free, others busy)
+    transparent = str(component.get('transp', '')) == 'TRANSPARENT'
+    event['show_as'] = 'free' if transparent or status == 'CANCELLED' else 'busy'
+    
     try:
-        # Make the request to the ICS URL
-        response = requests.get(calendar.ics_url)
+        event['series_end'] = get_series_end(event) if event['is_recurring'] else None
+    except (ValueError, TypeError) as e:
+        logging.warning(f"Invalid recurrence for event {event['id']}: {e}")
+        event['is_recurring'] = False
+        event['series_end'] = None
+    
+    return event
+
+def iter_ics_events(chunks):
+    """
+    Parse an ICS feed, given as an iterable of byte chunks, into event dicts lazily
+    
+    Events are parsed one VEVENT at a time, so memory use does not depend on
+    the size of the feed. Events that cannot be converted are logged and skipped.
+    """
+    for component in iter_vevents(chunks):
+        try:
+            yield ics_event(component)
+        except Exception as e:
+            logging.warning(f"Skipping invalid event {component.get('uid', '')} in ICS feed: {e}")
+
+def parse_ics_events(content):
+    """Parse the VEVENTs of an in-memory ICS feed into a list of event dicts"""
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    return list(iter_ics_events([content]))
+
+def event_row(calendar_id, event):
+    """Convert a parsed event dict into CalendarEvent column values"""
+    return {
+        'calendar_id': calendar_id,
+        'uid': event['id'],
+        'recurrence_id': to_utc_naive(event['recurrence_id']) if event['recurrence_id'] else None,
+        'sequence': event['sequence'],
+        'last_modified': to_utc_naive(event['last_modified']) if event['last_modified'] else None,
+        'subject': event['subject'],
+        'start': to_utc_naive(event['start']),
+        'end': to_utc_naive(event['end']),
+        'is_all_day': event['is_all_day'],
+        'status': event['status'],
+        'show_as': event['show_as'],
+        'description': event['description'],
+        'location': event['location'],
+        'organizer': event['organizer'],
+        'recurrence': event['recurrence'],
+        'rdates': format_dates(event['rdates']),
+        'exdates': format_dates(event['exdates']),
+        'timezone': event['timezone'],
+        'is_recurring': event['is_recurring'],
+        'series_end': to_utc_naive(event['series_end']) if event['series_end'] else None
+    }
+
+def event_span(start, end, is_recurring, series_end):
+    """The UTC range an event can occupy; open-ended series reach into the far future"""
+    if is_recurring:
+        end = series_end or FAR_FUTURE
+    return (to_utc(start), to_utc(end))
+
+def lock_calendar_refresh(calendar):
+    """
+    Serialize refreshes of one calendar until the transaction ends
+    
+    Refreshes can start together (first views of a calendar, the scheduler
+    running in every worker), and each diffs the stored events, so none may
+    read them before another has committed. PostgreSQL takes a transaction
+    advisory lock, which does not hold up bookings (they lock the calendar
+    row) while a large feed is parsed. SQLite takes its database write lock
+    with a no-op update.
+    """
+    if db.session.get_bind().dialect.name == 'postgresql':
+        db.session.execute(text("SELECT pg_advisory_xact_lock(:namespace, :calendar_id)"),
+                           {'namespace': REFRESH_LOCK_NAMESPACE, 'calendar_id': calendar.id})
+    else:
+        db.session.execute(
+            update(Calendar).where(Calendar.id == calendar.id).values(refresh_interval=Calendar.refresh_interval),
+            execution_options={'synchronize_session': False}
+        )
+
+def store_calendar_events(calendar, events):
+    """
+    Sync the stored events of a calendar with a freshly parsed set
+    
+    Events are matched by UID and RECURRENCE-ID. A matched event is left
+    alone when its SEQUENCE and LAST-MODIFIED are unchanged (or, for feeds
+    that send neither, when none of its fields changed), so only inserts,
+    updates and deletes reach the database. events may be a generator;
+    inserts and updates are written in chunks as it is consumed, so only
+    the keys of the incoming events are kept.
+    
+    Runs under lock_calendar_refresh, so concurrent refreshes of the same
+    calendar diff against each other's results. Surplus rows for a key
+    (left by refreshes that raced before the unique indexes existed) are
+    deleted.
+    
+    Returns an EventChangeSet describing what was written.
+    """
+    changes = EventChangeSet(calendar.id)
+    lock_calendar_refresh(calendar)
+    columns = [getattr(CalendarEvent, name) for name in EVENT_COLUMNS]
+    stored = {}
+    deleted_ids = []
+    for row in db.session.execute(
+        select(CalendarEvent.id, *columns).where(CalendarEvent.calendar_id == calendar.id).order_by(CalendarEvent.id)
+    ):
+        key = (row.uid, row.recurrence_id)
+        if key in stored:
+            deleted_ids.append(row.id)
+            changes.deleted.append(key)
+            changes.intervals.append(event_span(row.start, row.end, row.is_recurring, row.series_end))
+        else:
+            stored[key] = row
+    
+    inserts = []
+    updates = []
+    seen = set()
+    for event in events:
+        row = event_row(calendar.id, event)
+        key = (row['uid'], row['recurrence_id'])
+        if key in seen:
+            continue
+        seen.add(key)
+        
+        if len(inserts) >= STORE_CHUNK_SIZE:
+            db.session.execute(insert(CalendarEvent), inserts)
+            inserts = []
+        if len(updates) >= STORE_CHUNK_SIZE:
+            db.session.execute(update(CalendarEvent), updates)
+            updates = []
+        
+        existing = stored.get(key)
+        if existing is None:
+            inserts.append(row)
+            changes.inserted.append(key)
+            changes.intervals.append(event_span(event['start'], event['end'], event['is_recurring'], event['series_end']))
+            continue
         
-        if response.status_code == 200:
-            # Parse the ICS data
-            cal = ICalendar.from_ical(response.content)
-            
-            # Extract events
-            events = []
-            for component in cal.walk():
-                if component.name == "VEVENT":
-                    # Extract start and end times
-                    start_dt = component.get('dtstart').dt
-                    end_dt = component.get('dtend').dt
-                    
-                    # Check if they are date objects (all-day events) or datetime objects
-                    is_all_day = isinstance(start_dt, datetime.date) and not isinstance(start_dt, datetime)
-                    
-                    # Convert date objects to datetime for consistency
-                    if is_all_day:
-                        if not isinstance(start_dt, datetime):
-                            start_dt = datetime.combine(start_dt, datetime.min.time(), tzinfo=pytz.UTC)
-                        if not isinstance(end_dt, datetime):
-                            end_dt = datetime.combine(end_dt, datetime.min.time(), tzinfo=pytz.UTC)
-                    
-                    event = {
-                        'id': str(component.get('uid', '')),
-                        'subject': str(component.get('summary', 'No Title')),
-                        'start': start_dt,
-                        'end': end_dt,
-                        'is_all_day': is_all_day,
-                        'status': str(component.get('status', 'CONFIRMED')),
-                        'description': str(component.get('description', '')),
-                        'location': str(component.get('location', '')),
-                        'organizer': str(component.get('organizer', '')),
-                        'recurrence': component.get('rrule', None)
-                    }
-                    
-                    # Add busy/free status (ICS doesn't have this explicitly, assume all events are busy)
-                    event['show_as'] = 'busy'
-                    
-                    events.append(event)
-            
-            # Update the cache
-            calendar.cached_events = json.dumps(events, default=str)
-            calendar.last_synced = datetime.now()
-            db.session.commit()
+        if row['sequence'] or row['last_modified']:
+            if (existing.sequence, existing.last_modified) == (row['sequence'], row['last_modified']):
+                continue
+        elif all(getattr(existing, name) == row[name] for name in EVENT_COLUMNS):
+            continue
+        
+        updates.append(dict(row, id=existing.id))
+        changes.updated.append(key)
+        changes.intervals.append(event_span(existing.start, existing.end, existing.is_recurring, existing.series_end))
+        changes.intervals.append(event_span(event['start'], event['end'], event['is_recurring'], event['series_end']))
+    
+    for key, existing in stored.items():
+        if key not in seen:
+            deleted_ids.append(existing.id)
+            changes.deleted.append(key)
+            changes.intervals.append(event_span(existing.start, existing.end, existing.is_recurring, existing.series_end))
+    
+    if inserts:
+        db.session.execute(insert(CalendarEvent), inserts)
+    if updates:
+        db.session.execute(update(CalendarEvent), updates)
+    for index in range(0, len(deleted_ids), STORE_CHUNK_SIZE):
+        db.session.execute(delete(CalendarEvent).where(CalendarEvent.id.in_(deleted_ids[index:index + STORE_CHUNK_SIZE])))
+    
+    # Drop the legacy JSON cache now that events live in their own table
+    calendar.cached_events = None
+    
+    logging.debug(f"Synced calendar {calendar.id}: {changes}")
+    return changes
+
+def feed_request_headers(calendar):
+    """Build conditional request headers from the validators of the last refresh"""
+    headers = {}
+    # Calendars still on the legacy JSON cache need a full download to populate their rows
+    if calendar.cached_events:
+        return headers
+    if calendar.feed_etag:
+        headers['If-None-Match'] = calendar.feed_etag
+    if calendar.feed_last_modified:
+        headers['If-Modified-Since'] = calendar.feed_last_modified
+    return headers
+
+def apply_feed_response(calendar, response):
+    """
+    Apply a downloaded feed to a calendar without committing
+    
+    When the server answered 304, or the body hashes to the same value as
+    last time, parsing and event writes are skipped. Otherwise the body is
+    parsed one event at a time while it is written to the event store.
+    
+    Returns the EventChangeSet that was applied (empty when the feed has not
+    changed), or None if the server returned an error.
+    """
+    if response.status_code == 304:
+        calendar.last_synced = datetime.utcnow()
+        logging.debug(f"ICS feed for calendar {calendar.id} not modified")
+        return EventChangeSet(calendar.id)
+    elif response.status_code == 200:
+        content_hash = response.content_hash
+        unchanged = not calendar.cached_events and content_hash == calendar.feed_content_hash
+        
+        changes = EventChangeSet(calendar.id)
+        if not unchanged:
+            # Reject a truncated or non-ICS body before the first write, so a
+            # broken feed leaves the previous validators and events in place
+            check_envelope(response.body)
             
-            return events
+            # Stream the events into the event store
+            changes = store_calendar_events(calendar, iter_ics_events(response.iter_content()))
         else:
-            logging.error(f"Error fetching ICS feed: {response.status_code} - {response.text}")
-            return None
-    except Exception as e:
-        logging.error(f"Exception fetching ICS feed: {e}")
+            logging.debug(f"ICS feed for calendar {calendar.id} unchanged")
+        
+        calendar.feed_etag = response.headers.get('ETag')
+        calendar.feed_last_modified = response.headers.get('Last-Modified')
+        calendar.feed_content_hash = content_hash
+        calendar.last_synced = datetime.utcnow()
+        return changes
+    else:
+        logging.error(f"Error fetching ICS feed for calendar {calendar.id}: {response.status_code} - {response.text[:500]}")
         return None
 
-def create_calendar_event(calendar, event_data):
+def refresh_calendar_events(calendar):
     """
-    Create a booking event
+    Refresh events from an ICS feed and update the event store
     
-    Note: Since we're using ICS feeds which are typically read-only,
-    this function doesn't actually create an event in the original calendar.
-    Instead, it returns a simulated success response with a generated event ID.
+    The feed is requested conditionally using the ETag and Last-Modified
+    values from the previous refresh, so unchanged feeds are not reparsed.
     
-    In a real-world scenario, you would implement methods to add events to the 
-    source calendar through their respective APIs (Google, Outlook, etc.)
-    or use email notifications to notify the calendar owner about the booking.
+    Returns the EventChangeSet that was applied (empty when the feed has not
+    changed), or None if the feed could not be fetched.
     """
     try:
-        # Generate a unique ID for the event
-        event_id = f"booking_{datetime.now().strftime('%Y%m%d%H%M%S')}_{calendar.id}"
-        
-        # Simulate a successful response
-        response = {
-            'id': event_id,
-            'subject': event_data['subject'],
-            'start': event_data['start'],
-            'end': event_data['end'],
-            'attendees': event_data['attendees'],
-            'status': 'confirmed'
-        }
-        
-        logging.info(f"Created booking event for calendar {calendar.id}: {event_id}")
+        # Download the feed through the pooled feed client
+        response = fetch_feed(calendar.ics_url, headers=feed_request_headers(calendar))
         
-        # In a real implementation, you would send this data to the calendar provider
-        # or send email notifications to the calendar owner
-        
-        return response
+        try:
+            changes = apply_feed_response(calendar, response)
+        finally:
+            response.close()
+        if changes is not None:
+            db.session.commit()
+            notify_event_changes(changes)
+        return changes
     except Exception as e:
+        db.session.rollback()
+        logging.error(f"Exception fetching ICS feed: {e}")
+        return None
+
+def create_calendar_event(calendar, event_data):
+    """
+    Create a booking event in one calendar
+    
+    Note: ICS feeds are read-only, so unless CALENDAR_WRITE_URL points at a
+    provider events API the write is simulated (see calendar_writer).
+    Returns the event dict, or None if the write failed.
+    """
+    try:
+        return put_event(calendar.id, new_event_id(calendar.id), event_data)
+    except CalendarWriteError as e:
         logging.error(f"Exception creating calendar event: {e}")
         return None
 
-def get_free_slots(calendars, start_date, end_date, slot_duration=30):
-    """Find free time slots across multiple calendars"""
+def get_booked_intervals(shared_link_id, calendar_ids, start_date, end_date):
+    """UTC (start, end) ranges of the confirmed bookings that block a link's calendars"""
+    rows = db.session.execute(
+        select(Booking.start_time, Booking.end_time)
+        .where(*overlapping_bookings_filter(shared_link_id, calendar_ids, start_date, end_date))
+    )
+    return [(to_utc(start), to_utc(end)) for start, end in rows]
+
+def get_free_slots(calendars, start_date, end_date, slot_duration=30, shared_link=None):
+    """
+    Find free time slots across multiple calendars
+    
+    With a shared link, slots follow the link's availability rules (hours,
+    time zone, duration, step and buffers) and start in [start_date,
+    end_date); confirmed bookings made through it (or through any link
+    sharing its calendars) count as busy too, even before the calendar
+    feeds list them. Without one, 9:00-17:00 weekday slots of
+    slot_duration minutes are generated in start_date's time zone.
+    """
+    template = get_slot_template(shared_link) if shared_link is not None else None
+    if template is not None:
+        # Busy time just outside the window can still touch its slots or their buffers
+        busy_start = start_date - template.buffer_before
+        busy_end = end_date + template.duration + template.buffer_after
+    else:
+        busy_start, busy_end = start_date, end_date
+    
     all_events = []
     
     # Get events from each calendar
     for calendar in calendars:
-        events = get_calendar_events(calendar, start_date, end_date)
+        events = get_calendar_events(calendar, busy_start, busy_end)
         if events:
-            # Only include busy events
-            busy_events = [
-                {
-                    'start': datetime.fromisoformat(event['start']['dateTime'].replace('Z', '+00:00')),
-                    'end': datetime.fromisoformat(event['end']['dateTime'].replace('Z', '+00:00')),
-                    'is_all_day': event['isAllDay'],
-                    'show_as': event['showAs']
-                }
-                for event in events
-                if event['showAs'] in ['busy', 'tentative', 'oof', 'workingElsewhere']
-            ]
-            all_events.extend(busy_events)
-    
-    # If no events, all time is free
-    if not all_events:
-        return generate_time_slots(start_date, end_date, slot_duration)
-    
-    # Sort events by start time
-    all_events.sort(key=lambda x: x['start'])
-    
-    # Generate all possible time slots
-    all_slots = generate_time_slots(start_date, end_date, slot_duration)
-    
-    # Mark slots as unavailable if they overlap with any event
-    free_slots = []
-    for slot in all_slots:
-        slot_start = slot['start']
-        slot_end = slot['end']
-        
-        # Check if the slot overlaps with any busy event
-        is_free = True
-        for event in all_events:
-            # Check for overlap
-            if (slot_start < event['end'] and slot_end > event['start']):
-                is_free = False
-                break
-        
-        # If the slot is free, add it to the list
-        if is_free:
-            free_slots.append(slot)
+            all_events.extend(events)
     
-    return free_slots
-
-def generate_time_slots(start_date, end_date, slot_duration=30):
-    """Generate time slots between start_date and end_date with the given duration in minutes"""
-    current_time = start_date
-    slots = []
+    # Merge busy events from every calendar into one sorted interval list
+    busy_intervals = merge_busy_intervals(all_events)
+    if shared_link is not None:
+        booked = get_booked_intervals(shared_link.id, [calendar.id for calendar in calendars], busy_start, busy_end)
+        if booked:
+            busy_intervals = merge_intervals(busy_intervals + booked)
     
-    # Assuming working hours are 9 AM to 5 PM
-    working_start_hour = 9
-    working_end_hour = 17
+    # Generate the possible slots lazily and sweep them against the busy
+    # intervals, so only the free ones are ever built into the list
+    if template is not None:
+        return list(iter_free_slots(template.iter_slots(start_date, end_date),
+                                    template.expand_busy_intervals(busy_intervals)))
+    return list(iter_free_slots(iter_time_slots(start_date, end_date, slot_duration), busy_intervals))
+
+def is_time_busy(calendars, start_time, end_time):
+    """Check whether any busy calendar event overlaps the range"""
+    events = []
+    for calendar in calendars:
+        events.extend(get_calendar_events(calendar, start_time, end_time) or [])
+    start_time, end_time = to_utc(start_time), to_utc(end_time)
+    return any(busy_start < end_time and busy_end > start_time
+               for busy_start, busy_end in merge_busy_intervals(events))
+
+def overlapping_bookings_filter(shared_link_id, calendar_ids, start_time, end_time):
+    """Confirmed bookings of a link, or of any link sharing one of its calendars, that overlap the range"""
+    linked = select(shared_link_calendar.c.shared_link_id).where(shared_link_calendar.c.calendar_id.in_(calendar_ids))
+    return (
+        or_(Booking.shared_link_id == shared_link_id, Booking.shared_link_id.in_(linked)),
+        Booking.status == 'confirmed',
+        Booking.start_time < to_utc_naive(end_time),
+        Booking.end_time > to_utc_naive(start_time)
+    )
+
+def get_booking_watermark(shared_link_id, calendar_ids):
+    """
+    (count, latest ID, latest created_at) of the bookings that can block a link's calendars
+
+    Any new booking for the link, or for a link sharing one of its
+    calendars, changes it; public_cache uses it to tell whether slots may
+    have changed without computing them.
+    """
+    linked = select(shared_link_calendar.c.shared_link_id).where(shared_link_calendar.c.calendar_id.in_(calendar_ids))
+    return tuple(db.session.execute(
+        select(func.count(Booking.id), func.max(Booking.id), func.max(Booking.created_at))
+        .where(or_(Booking.shared_link_id == shared_link_id, Booking.shared_link_id.in_(linked)))
+    ).one())
+
+def lock_booking_calendars(shared_link, calendars):
+    """
+    Serialize bookings that touch the same calendars until the transaction ends
     
-    while current_time < end_date:
-        day_start = datetime(
-            current_time.year, current_time.month, current_time.day,
-            working_start_hour, 0, 0, tzinfo=current_time.tzinfo
-        )
-        day_end = datetime(
-            current_time.year, current_time.month, current_time.day,
-            working_end_hour, 0, 0, tzinfo=current_time.tzinfo
+    PostgreSQL locks the calendar rows (the link row when it has no
+    calendars) in ID order, so bookings of overlapping calendar sets cannot
+    deadlock. SQLite has no row locks: there the booking insert takes the
+    database write lock, so it is flushed before bookings are checked.
+    """
+    if db.session.get_bind().dialect.name != 'postgresql':
+        return
+    if calendars:
+        db.session.execute(
+            select(Calendar.id).where(Calendar.id.in_([calendar.id for calendar in calendars]))
+            .order_by(Calendar.id).with_for_update()
         )
-        
-        # Skip if current_time is past working hours for the day
-        if current_time.time() >= day_end.time():
-            # Move to the next day
-            current_time = datetime(
-                current_time.year, current_time.month, current_time.day,
-                0, 0, 0, tzinfo=current_time.tzinfo
-            ) + timedelta(days=1)
-            continue
-        
-        # Start from working hours if current_time is before working hours
-        if current_time.time() < day_start.time():
-            current_time = day_start
-        
-        slot_start = current_time
-        slot_end = slot_start + timedelta(minutes=slot_duration)
-        
-        # Skip if slot ends after working hours
-        if slot_end.time() > day_end.time():
-            # Move to the next day
-            current_time = datetime(
-                current_time.year, current_time.month, current_time.day,
-                0, 0, 0, tzinfo=current_time.tzinfo
-            ) + timedelta(days=1)
-            continue
-        
-        # Skip weekends (assuming 0 = Monday, 6 = Sunday)
-        weekday = slot_start.weekday()
-        if weekday < 5:  # Only include Monday to Friday
-            slots.append({
-                'start': slot_start,
-                'end': slot_end,
-                'duration': slot_duration,
-                'formatted_start': slot_start.strftime('%Y-%m-%dT%H:%M:%S'),
-                'formatted_end': slot_end.strftime('%Y-%m-%dT%H:%M:%S'),
-                'display': slot_start.strftime('%A, %B %d, %Y %I:%M %p') + ' - ' + slot_end.strftime('%I:%M %p')
-            })
-        
-        # Move to the next slot
-        current_time = slot_end
-    
-    return slots
+    else:
+        db.session.execute(select(SharedLink.id).where(SharedLink.id == shared_link.id).with_for_update())
+
+def booking_event_data(booking):
+    """The event written to every calendar of a booking's link"""
+    return {
+        'subject': booking.subject,
+        'body': {
+            'contentType': 'text',
+            'content': f"Booking made by {booking.customer_name} ({booking.customer_email})\n\n{booking.description}"
+        },
+        'start': {
+            'dateTime': to_utc(booking.start_time).strftime('%Y-%m-%dT%H:%M:%S'),
+            'timeZone': 'UTC'
+        },
+        'end': {
+            'dateTime': to_utc(booking.end_time).strftime('%Y-%m-%dT%H:%M:%S'),
+            'timeZone': 'UTC'
+        },
+        'attendees': [
+            {
+                'emailAddress': {
+                    'address': booking.customer_email,
+                    'name': booking.customer_name
+                },
+                'type': 'required'
+            }
+        ]
+    }
+
+@job_handler('booking_events')
+def write_booking_events(payload):
+    """
+    Create a booking's event in every calendar at once; raising makes the job retry
+
+    The event IDs come from the booking (see calendar_writer), so a job that
+    runs again after its writes went through replaces the same events.
+    """
+    booking = db.session.get(Booking, payload['booking_id'])
+    if not booking or booking.status != 'confirmed':
+        return
+    calendar_ids = [calendar.id for calendar in booking.shared_link.calendars]
+    # Partial writes are deleted again by write_calendar_events before it reports the error
+    event_ids, error = write_calendar_events(booking.id, calendar_ids, booking_event_data(booking))
+    if error:
+        raise CalendarWriteError(error)
+    logging.info(f"Created events for booking {booking.id} in {len(event_ids)} calendars")
 
 def create_booking(shared_link_id, customer_name, customer_email, start_time, end_time, subject, description):
-    """Create a booking and add it to all relevant calendars"""
+    """
+    Create a booking and queue its side effects
+    
+    The range must be one of the slots the link's availability rules
+    generate. The slot, widened by the link's buffers, is checked against
+    the busy events of the link's calendars and against the bookings of
+    every link sharing them. The booking check runs under lock_booking_calendars, so of
+    two concurrent bookings for the same time only the first to commit
+    succeeds. Writing the booking to the calendars and the analytics
+    rollups are queued as jobs in the same transaction.
+    """
     try:
-        # Get the shared link
-        shared_link = SharedLink.query.get(shared_link_id)
+        if end_time <= start_time:
+            return None, "The booking must end after it starts"
+        
+        # Get the shared link together with its calendars
+        shared_link = SharedLink.query.options(joinedload(SharedLink.calendars)).get(shared_link_id)
         if not shared_link:
             return None, "Shared link not found"
         
+        # The link's hours, slot grid, minimum notice and buffers apply to direct bookings as well as to listed slots
+        template = get_slot_template(shared_link)
+        if not template.is_slot(start_time, end_time):
+            return None, "The selected time is not one of this link's slots"
+        if to_utc(start_time) < template.earliest_start():
+            return None, "The selected time is too soon to book"
+        busy_start, busy_end = start_time - template.buffer_before, end_time + template.buffer_after
+        
+        # Events only change when feeds refresh (which may commit), so check them before locking
+        if is_time_busy(shared_link.calendars, busy_start, busy_end):
+            return None, "The selected time is no longer available"
+        
+        calendars = shared_link.calendars
+        lock_booking_calendars(shared_link, calendars)
+        
         # Create booking record
         booking = Booking(
             shared_link_id=shared_link_id,
             customer_name=customer_name,
             customer_email=customer_email,
-            start_time=start_time,
-            end_time=end_time,
+            start_time=to_utc_naive(start_time),
+            end_time=to_utc_naive(end_time),
             subject=subject,
             description=description,
             status="confirmed"
         )
         db.session.add(booking)
-        db.session.flush()  # Get the booking ID without committing
-        
-        # Get calendar IDs from the shared link
-        calendar_ids = shared_link.get_calendar_ids()
-        calendars = Calendar.query.filter(Calendar.id.in_(calendar_ids)).all()
-        
-        # Create events in each calendar
-        event_ids = []
-        for calendar in calendars:
-            # Prepare event data
-            event_data = {
-                'subject': subject,
-                'body': {
-                    'contentType': 'text',
-                    'content': f"Booking made by {customer_name} ({customer_email})\n\n{description}"
-                },
-                'start': {
-                    'dateTime': start_time.strftime('%Y-%m-%dT%H:%M:%S'),
-                    'timeZone': 'UTC'
-                },
-                'end': {
-                    'dateTime': end_time.strftime('%Y-%m-%dT%H:%M:%S'),
-                    'timeZone': 'UTC'
-                },
-                'attendees': [
-                    {
-                        'emailAddress': {
-                            'address': customer_email,
-                            'name': customer_name
-                        },
-                        'type': 'required'
-                    }
-                ]
-            }
-            
-            # Create the event
-            result = create_calendar_event(calendar, event_data)
-            if result and 'id' in result:
-                event_ids.append(result['id'])
-            else:
-                # If any event creation fails, roll back and return error
-                db.session.rollback()
-                return None, "Failed to create events in all calendars"
-        
-        # No need to store event IDs in the booking as we've removed that field
+        db.session.flush()  # Get the booking ID (and on SQLite the write lock) without committing
+        
+        calendar_ids = [calendar.id for calendar in calendars]
+        conflict = db.session.execute(
+            select(Booking.id)
+            .where(*overlapping_bookings_filter(shared_link.id, calendar_ids, busy_start, busy_end),
+                   Booking.id != booking.id)
+            .limit(1)
+        ).first()
+        if conflict:
+            db.session.rollback()
+            return None, "The selected time is no longer available"
+        
+        # Calendar events and analytics rollups are written by the job queue
+        # worker, so the booking commits without waiting on calendar providers
+        enqueue_job('booking_events', {'booking_id': booking.id})
+        enqueue_job('booking_rollups', {'booking_id': booking.id})
         db.session.commit()
+        notify_booking_committed(booking)
         
         return booking, None
     except Exception as e:
@@ -340,82 +783,12 @@ def get_booking_analytics(user_id, start_date=None, end_date=None):
                 "end_date": end_date
             }
         
-        # Query all bookings for these shared links within the date range
-        bookings = Booking.query.filter(
-            Booking.shared_link_id.in_(shared_link_ids),
-            Booking.start_time >= start_date,
-            Booking.start_time <= end_date
-        ).all()
-        
-        # Initialize analytics metrics
-        total_bookings = len(bookings)
-        bookings_by_link = defaultdict(int)
-        bookings_by_day = defaultdict(int)
-        bookings_by_hour = defaultdict(int)
-        bookings_by_weekday = defaultdict(int)
-        customers = Counter()
-        total_duration = timedelta(0)
-        
-        link_name_map = {link.id: link.name for link in shared_links}
-        
-        # Process each booking to collect metrics
-        for booking in bookings:
-            # Count by shared link
-            link_name = link_name_map.get(booking.shared_link_id, f"Link {booking.shared_link_id}")
-            bookings_by_link[link_name] += 1
-            
-            # Count by day
-            day_key = booking.start_time.strftime('%Y-%m-%d')
-            bookings_by_day[day_key] += 1
-            
-            # Count by hour
-            hour = booking.start_time.hour
-            bookings_by_hour[hour] += 1
-            
-            # Count by weekday
-            weekday = booking.start_time.strftime('%A')
-            bookings_by_weekday[weekday] += 1
-            
-            # Count by customer
-            customers[booking.customer_email] += 1
-            
-            # Add to total duration
-            duration = booking.end_time - booking.start_time
-            total_duration += duration
-        
-        # Calculate averages and prepare final metrics
-        average_duration = total_duration.total_seconds() / total_bookings if total_bookings > 0 else 0
-        average_duration_minutes = average_duration / 60
-        
-        # Get top 5 customers
-        top_customers = [
-            {"email": email, "count": count}
-            for email, count in customers.most_common(5)
-        ]
-        
-        # Sort the day-based metrics chronologically 
-        sorted_days = sorted(bookings_by_day.items())
-        bookings_by_day = {day: count for day, count in sorted_days}
+        if BOOKING_ANALYTICS_BACKEND == 'sql':
+            # Aggregate the bookings with GROUP BY queries in the database
+            return get_sql_booking_analytics(user_id, shared_links, start_date, end_date)
         
-        # Sort hour-based metrics
-        sorted_hours = sorted(bookings_by_hour.items())
-        bookings_by_hour = {f"{hour}:00": count for hour, count in sorted_hours}
-        
-        # Order weekdays correctly
-        weekday_order = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-        sorted_weekdays = {day: bookings_by_weekday.get(day, 0) for day in weekday_order}
-        
-        return {
-            "total_bookings": total_bookings,
-            "bookings_by_link": dict(bookings_by_link),
-            "bookings_by_day": bookings_by_day,
-            "bookings_by_hour": bookings_by_hour,
-            "bookings_by_weekday": sorted_weekdays,
-            "top_customers": top_customers,
-            "average_duration": round(average_duration_minutes, 1),
-            "start_date": start_date,
-            "end_date": end_date
-        }
+        # Read the pre-aggregated rollups instead of every booking in the range
+        return get_rollup_booking_analytics(user_id, shared_links, start_date, end_date)
     
     except Exception as e:
         logging.error(f"Error generating booking analytics: {e}")
@@ -460,161 +833,76 @@ def get_calendar_analytics(user_id, calendar_id=None, start_date=None, end_date=
         
         calendar_names = {calendar.id: calendar.name for calendar in calendars}
         
-        # Initialize analytics metrics
-        events_by_calendar = defaultdict(int)
-        events_by_day = defaultdict(int)
-        events_by_hour = defaultdict(int)
-        total_busy_minutes = 0
-        total_possible_minutes = 0
-        free_slots_count = 0
-        
-        # For each calendar, get events
-        for calendar in calendars:
-            events = get_calendar_events(calendar, start_date, end_date)
-            if not events:
-                continue
-                
-            events_by_calendar[calendar_names[calendar.id]] = len(events)
-            
-            # Process each event
-            for event in events:
-                if event['showAs'] in ['busy', 'tentative', 'oof', 'workingElsewhere']:
-                    # Calculate event start and end
-                    event_start = datetime.fromisoformat(event['start']['dateTime'].replace('Z', '+00:00'))
-                    event_end = datetime.fromisoformat(event['end']['dateTime'].replace('Z', '+00:00'))
-                    
-                    # Count by day
-                    day_key = event_start.strftime('%Y-%m-%d')
-                    events_by_day[day_key] += 1
-                    
-                    # Count by hour
-                    hour = event_start.hour
-                    events_by_hour[hour] += 1
-                    
-                    # Calculate duration in minutes
-                    duration = (event_end - event_start).total_seconds() / 60
-                    total_busy_minutes += duration
-        
-        # Calculate free time distribution
-        # Get free slots for all calendars
-        free_slots = get_free_slots(calendars, start_date, end_date)
-        
-        # Count slots by day of week
-        free_slots_by_weekday = defaultdict(int)
-        for slot in free_slots:
-            weekday = slot['start'].strftime('%A')
-            free_slots_by_weekday[weekday] += 1
-            free_slots_count += 1
-        
-        # Calculate total possible working minutes (9am-5pm, weekdays only)
-        working_days = 0
-        current_date = start_date
-        while current_date <= end_date:
-            if current_date.weekday() < 5:  # Weekday (0-4 is Monday-Friday)
-                working_days += 1
-            current_date += timedelta(days=1)
-        
-        # 8 working hours per day
-        total_possible_minutes = working_days * 8 * 60
-        
-        # Calculate busy vs free ratio
-        busy_percentage = (total_busy_minutes / total_possible_minutes * 100) if total_possible_minutes > 0 else 0
-        busy_percentage = min(100, busy_percentage)  # Cap at 100%
-        free_percentage = 100 - busy_percentage
-        
-        # Sort the day-based metrics chronologically 
-        sorted_days = sorted(events_by_day.items())
-        events_by_day = {day: count for day, count in sorted_days}
-        
-        # Sort hour-based metrics
-        sorted_hours = sorted(events_by_hour.items())
-        events_by_hour = {f"{hour}:00": count for hour, count in sorted_hours}
-        
-        # Order weekdays correctly for free slots
-        weekday_order = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-        sorted_free_slots = {day: free_slots_by_weekday.get(day, 0) for day in weekday_order}
-        
-        return {
-            "busy_vs_free": {
-                "busy": round(busy_percentage, 1),
-                "free": round(free_percentage, 1)
-            },
-            "events_by_calendar": dict(events_by_calendar),
-            "busiest_days": events_by_day,
-            "busiest_hours": events_by_hour,
-            "free_slot_distribution": sorted_free_slots,
-            "free_slots_count": free_slots_count,
-            "start_date": start_date,
-            "end_date": end_date
+        # Load each calendar's events once, as columns, and aggregate them with NumPy
+        columns_by_calendar = {
+            calendar.id: get_calendar_event_columns(calendar, start_date, end_date)
+            for calendar in calendars
         }
+        return compute_calendar_analytics(columns_by_calendar, calendar_names, start_date, end_date)
         
     except Exception as e:
         logging.error(f"Error generating calendar analytics: {e}")
         return None
 
 def setup_calendar_refresh_jobs():
-    """Set up background jobs to refresh calendar events at regular intervals"""
+    """Set up the background job that refreshes due calendars"""
+    # Imported here to avoid circular imports
+    from refresh_engine import run_refresh_cycle
+    
     try:
-        # Get all active calendars
-        calendars = Calendar.query.filter_by(active=True).all()
+        # A single job checks which calendars are due, based on each
+        # calendar's refresh_interval, and refreshes them concurrently
+        scheduler.add_job(
+            run_refresh_cycle,
+            'interval',
+            seconds=REFRESH_TICK_SECONDS,
+            id='refresh_calendars',
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+            next_run_time=datetime.now()
+        )
         
-        # Schedule jobs for each calendar based on refresh_interval
-        for calendar in calendars:
-            # Schedule the job with the calendar's refresh interval (in minutes)
-            job_id = f"refresh_calendar_{calendar.id}"
-            
-            # Remove any existing job with this ID
-            scheduler.remove_job(job_id, ignore_if_not_exists=True)
-            
-            # Schedule a new job
-            scheduler.add_job(
-                refresh_calendar_events,
-                'interval',
-                minutes=calendar.refresh_interval,
-                id=job_id,
-                replace_existing=True,
-                args=[calendar]
-            )
-            
-            logging.info(f"Scheduled refresh job for calendar {calendar.id} ('{calendar.name}') every {calendar.refresh_interval} minutes")
+        logging.info(f"Scheduled calendar refresh job every {REFRESH_TICK_SECONDS} seconds")
     
     except Exception as e:
         logging.error(f"Error setting up calendar refresh jobs: {e}")
 
+def setup_inline_job_worker():
+    """Run due background jobs from the scheduler, for deployments without a separate worker"""
+    from job_queue import run_job_cycle
+    
+    scheduler.add_job(
+        run_job_cycle,
+        'interval',
+        seconds=JOB_POLL_SECONDS,
+        id='run_background_jobs',
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True
+    )
+    logging.info(f"Scheduled background jobs every {JOB_POLL_SECONDS} seconds")
+
 def start_scheduler():
     """Start the background scheduler for calendar refreshing"""
     if not scheduler.running:
         scheduler.start()
         setup_calendar_refresh_jobs()
+        if JOB_INLINE_WORKER:
+            setup_inline_job_worker()
         logging.info("Calendar refresh scheduler started")
 
 def update_calendar_refresh_interval(calendar_id, refresh_interval):
-    """Update the refresh interval for a calendar and reschedule the job"""
+    """Update the refresh interval for a calendar"""
     try:
         calendar = Calendar.query.get(calendar_id)
         if not calendar:
             return False, "Calendar not found"
         
-        # Update the refresh interval
+        # Update the refresh interval; the refresh job picks it up on its next run
         calendar.refresh_interval = refresh_interval
         db.session.commit()
         
-        # Reschedule the job
-        if scheduler.running:
-            # Remove existing job
-            job_id = f"refresh_calendar_{calendar.id}"
-            scheduler.remove_job(job_id, ignore_if_not_exists=True)
-            
-            # Add new job with updated interval
-            scheduler.add_job(
-                refresh_calendar_events,
-                'interval',
-                minutes=refresh_interval,
-                id=job_id,
-                replace_existing=True,
-                args=[calendar]
-            )
-        
         return True, None
     except Exception as e:
         db.session.rollback()
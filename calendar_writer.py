@@ -0,0 +1,156 @@
+"""
+Writing booking events to calendars
+
+With CALENDAR_WRITE_URL set, events are written to a provider events API
+as PUT/DELETE {CALENDAR_WRITE_URL}/calendars/<calendar id>/events/<event id>,
+with event IDs chosen here so that a write whose response never arrived
+can still be deleted. Without it, writes are simulated, since ICS feeds
+are read-only.
+
+A booking's event IDs are derived from the booking, so writing it again
+(a retried job) replaces its events rather than adding a second set.
+
+write_calendar_events fans the writes for one booking out to all target
+calendars in parallel, so booking latency follows the slowest calendar
+rather than the sum of all of them.
+"""
+
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+import requests
+from requests.adapters import HTTPAdapter
+from config import (
+    CALENDAR_WRITE_CONNECT_TIMEOUT, CALENDAR_WRITE_TIMEOUT, CALENDAR_WRITE_URL, CALENDAR_WRITE_WORKERS
+)
+
+_session = None
+_executor = None
+_lock = threading.Lock()
+
+class CalendarWriteError(Exception):
+    """Raised when the provider does not accept an event write"""
+
+def get_session():
+    """Return the shared HTTP session used for provider writes"""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_maxsize=CALENDAR_WRITE_WORKERS)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _session = session
+    return _session
+
+def get_executor():
+    """Return the thread pool that runs calendar writes"""
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=CALENDAR_WRITE_WORKERS,
+                                               thread_name_prefix='calendar-write')
+    return _executor
+
+def event_url(calendar_id, event_id, base_url):
+    return f"{base_url.rstrip('/')}/calendars/{calendar_id}/events/{event_id}"
+
+def put_event(calendar_id, event_id, event_data, base_url=CALENDAR_WRITE_URL, timeout=CALENDAR_WRITE_TIMEOUT):
+    """Create (or replace) an event with a known ID; returns the provider's event dict"""
+    if not base_url:
+        # Simulate a successful response
+        logging.info(f"Created booking event for calendar {calendar_id}: {event_id}")
+        return {'id': event_id, 'subject': event_data['subject'], 'start': event_data['start'],
+                'end': event_data['end'], 'attendees': event_data['attendees'], 'status': 'confirmed'}
+    try:
+        response = get_session().put(event_url(calendar_id, event_id, base_url), json=event_data,
+                                     timeout=(CALENDAR_WRITE_CONNECT_TIMEOUT, timeout))
+    except requests.RequestException as e:
+        raise CalendarWriteError(f"Writing event {event_id} to calendar {calendar_id} failed: {e}") from e
+    if response.status_code not in (200, 201):
+        raise CalendarWriteError(f"Calendar {calendar_id} rejected event {event_id} "
+                                 f"with status {response.status_code}")
+    return response.json() if response.content else {'id': event_id}
+
+def delete_event(calendar_id, event_id, base_url=CALENDAR_WRITE_URL, timeout=CALENDAR_WRITE_TIMEOUT):
+    """Delete an event; one that does not exist counts as deleted"""
+    if not base_url:
+        logging.info(f"Deleted booking event for calendar {calendar_id}: {event_id}")
+        return
+    try:
+        response = get_session().delete(event_url(calendar_id, event_id, base_url),
+                                        timeout=(CALENDAR_WRITE_CONNECT_TIMEOUT, timeout))
+    except requests.RequestException as e:
+        raise CalendarWriteError(f"Deleting event {event_id} from calendar {calendar_id} failed: {e}") from e
+    if response.status_code not in (200, 202, 204, 404, 410):
+        raise CalendarWriteError(f"Calendar {calendar_id} refused to delete event {event_id} "
+                                 f"with status {response.status_code}")
+
+def new_event_id(calendar_id):
+    return f"booking_{uuid.uuid4().hex}_{calendar_id}"
+
+def booking_event_id(booking_id, calendar_id):
+    """The event ID of a booking in one calendar, the same on every write"""
+    return f"booking_{booking_id}_{calendar_id}"
+
+def delete_quietly(calendar_id, event_id, base_url, timeout):
+    try:
+        delete_event(calendar_id, event_id, base_url, timeout)
+    except CalendarWriteError as e:
+        logging.error(f"Could not remove event {event_id} after a failed booking: {e}")
+
+def delete_calendar_events(events, base_url=CALENDAR_WRITE_URL, timeout=CALENDAR_WRITE_TIMEOUT):
+    """Delete {calendar ID: event ID} in parallel, logging (not raising) failures"""
+    futures = [
+        get_executor().submit(delete_quietly, calendar_id, event_id, base_url, timeout)
+        for calendar_id, event_id in events.items()
+    ]
+    wait(futures, timeout=timeout + CALENDAR_WRITE_CONNECT_TIMEOUT)
+
+def write_calendar_events(booking_id, calendar_ids, event_data, base_url=CALENDAR_WRITE_URL,
+                          timeout=CALENDAR_WRITE_TIMEOUT):
+    """
+    Create a booking's event in each calendar in parallel; returns ({calendar ID: event ID}, error)
+
+    Each call is limited to timeout seconds, and so is the whole fan-out.
+    If any calendar fails or times out, the events are deleted again from
+    every calendar (compensating deletes) and the error is returned with no
+    events. Writes that are still running are deleted once they finish,
+    since their event may land after the booking was given up.
+    """
+    if not calendar_ids:
+        return {}, None
+    executor = get_executor()
+    event_ids = {calendar_id: booking_event_id(booking_id, calendar_id) for calendar_id in calendar_ids}
+    futures = {
+        executor.submit(put_event, calendar_id, event_id, event_data, base_url, timeout): calendar_id
+        for calendar_id, event_id in event_ids.items()
+    }
+    started = time.monotonic()
+    done, pending = wait(futures, timeout=timeout + CALENDAR_WRITE_CONNECT_TIMEOUT)
+
+    errors = []
+    for future in done:
+        if future.exception() is not None:
+            errors.append(str(future.exception()))
+    for future in pending:
+        errors.append(f"Writing to calendar {futures[future]} timed out")
+
+    if not errors:
+        logging.debug(f"Wrote {len(event_ids)} booking events in {time.monotonic() - started:.3f}s")
+        return event_ids, None
+
+    # A failed call may still have created its event (say the response timed
+    # out), so every finished write is deleted, not only the successful ones
+    logging.error(f"Booking events failed, removing them from {len(event_ids)} calendars: {'; '.join(errors)}")
+    for future in pending:
+        calendar_id = futures[future]
+        future.add_done_callback(
+            lambda _, calendar_id=calendar_id: delete_quietly(calendar_id, event_ids[calendar_id], base_url, timeout)
+        )
+    delete_calendar_events({futures[future]: event_ids[futures[future]] for future in done}, base_url, timeout)
+    return {}, errors[0]
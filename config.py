@@ -22,4 +22,59 @@ APP_NAME = "Calendar Sync"
 APP_DESCRIPTION = "Synchronize multiple Outlook calendars and share free slots with customers"
 
 # Time settings
-DEFAULT_SLOT_DURATION = 30  # in minutes
+DEFAULT_SLOT_DURATION = 30  # in minutes, for shared links without their own availability rules
+
+# ICS feed fetching
+FEED_CONNECT_TIMEOUT = 5  # seconds to establish a connection
+FEED_READ_TIMEOUT = 30  # seconds to wait between received bytes
+FEED_TOTAL_TIMEOUT = 120  # seconds allowed for a whole download
+FEED_MAX_BYTES = 20 * 1024 * 1024  # maximum decompressed feed size
+FEED_POOL_CONNECTIONS = 50  # number of feed hosts to keep connection pools for
+FEED_POOL_MAXSIZE = 16  # keep-alive connections per feed host, at least REFRESH_WORKERS
+FEED_SPOOL_BYTES = 1024 * 1024  # feed bodies larger than this are spooled to disk
+
+# Calendar refresh engine
+REFRESH_TICK_SECONDS = 60  # how often to look for calendars that are due
+REFRESH_WORKERS = 16  # concurrent feed downloads
+REFRESH_BATCH_SIZE = 50  # refreshed calendars committed per transaction
+
+# Booking event writes; without CALENDAR_WRITE_URL (a provider events API) writes are simulated
+CALENDAR_WRITE_URL = os.environ.get("CALENDAR_WRITE_URL", "")
+CALENDAR_WRITE_WORKERS = 16  # concurrent event writes across all bookings
+CALENDAR_WRITE_CONNECT_TIMEOUT = 3  # seconds to establish a connection
+CALENDAR_WRITE_TIMEOUT = 10  # seconds allowed for one write, and for writing a booking to all calendars
+
+# Per-link availability cache
+AVAILABILITY_CACHE_SIZE = 1000  # cached (link, window, rules, data version) entries per process
+AVAILABILITY_CACHE_TTL = 300  # seconds before an entry is recomputed even without invalidation
+
+# Free slot engine: "intervals" sweeps merged busy intervals, "bitmap" combines cached per-calendar busy bitmaps
+AVAILABILITY_ENGINE = os.environ.get("AVAILABILITY_ENGINE", "intervals")
+BITMAP_RESOLUTION = 5  # minutes per bitmap cell; must divide a day
+BITMAP_CACHE_DAYS = 100000  # cached (calendar, day) bitmaps per process
+
+# Paged /api/slots responses
+SLOT_PAGE_CHUNK_DAYS = 7  # days of availability computed (and cached) at a time while filling a page
+SLOT_PAGE_MAX_LIMIT = 500  # largest page a client may ask for
+SLOTS_GZIP_MIN_BYTES = 1024  # smaller /api/slots bodies are sent uncompressed
+SLOTS_GZIP_LEVEL = 6
+
+# HTTP caching of the public booking pages (/shared/<link_id> and /api/slots)
+PUBLIC_CACHE_MAX_AGE = int(os.environ.get("PUBLIC_CACHE_MAX_AGE", "60"))  # seconds browsers and proxies may reuse a response
+
+# Booking analytics: "rollup" reads the pre-aggregated rollup tables, "sql" aggregates bookings with GROUP BY
+BOOKING_ANALYTICS_BACKEND = os.environ.get("BOOKING_ANALYTICS_BACKEND", "rollup")
+
+# Bulk booking import
+BOOKING_IMPORT_MAX_ROWS = 50000  # rows accepted by one import request
+BOOKING_IMPORT_CHUNK_SIZE = 1000  # imported bookings inserted per transaction
+
+# Background job queue (booking side effects)
+JOB_INLINE_WORKER = os.environ.get("JOB_INLINE_WORKER", "1") == "1"  # run jobs from the web process scheduler too
+JOB_POLL_SECONDS = 2  # how often an idle worker looks for due jobs
+JOB_BATCH_SIZE = 20  # jobs claimed per poll
+JOB_MAX_ATTEMPTS = 8  # attempts before a job is marked failed
+JOB_RETRY_BASE_SECONDS = 5  # first retry delay, doubled on every further attempt
+JOB_RETRY_MAX_SECONDS = 3600  # longest retry delay
+JOB_LOCK_TIMEOUT = 600  # seconds after which a running job is presumed lost with its worker
+JOB_RETENTION_DAYS = 7  # finished jobs are purged after this long
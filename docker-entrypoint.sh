@@ -9,7 +9,7 @@ until PGPASSWORD=$POSTGRES_PASSWORD psql -h "db" -U "$POSTGRES_USER" -d "$POSTGR
 done
 echo "PostgreSQL is up - executing command"
 
-# Database tables creation is already handled in app.py within an app context
+# Database tables creation and schema migrations are already handled in app.py within an app context
 # Run a simple check to verify database connection
 python -c "from app import app; print('Database connection verified successfully')"
 
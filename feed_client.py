@@ -0,0 +1,133 @@
+import hashlib
+import logging
+import tempfile
+import threading
+import time
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from config import (
+    FEED_CONNECT_TIMEOUT, FEED_READ_TIMEOUT, FEED_TOTAL_TIMEOUT, FEED_MAX_BYTES,
+    FEED_POOL_CONNECTIONS, FEED_POOL_MAXSIZE, FEED_SPOOL_BYTES
+)
+
+# Size of the chunks read from the network while streaming a feed
+CHUNK_SIZE = 64 * 1024
+
+_session = None
+_session_lock = threading.Lock()
+
+class FeedFetchError(Exception):
+    """Raised when an ICS feed cannot be downloaded within the configured limits"""
+
+class FeedResponse:
+    """
+    The parts of an HTTP response that feed refreshes need
+
+    The body is kept in a spooled temporary file, in memory while small and
+    on disk beyond FEED_SPOOL_BYTES, along with its SHA-256 hash. Call
+    close() once the body has been consumed.
+    """
+
+    def __init__(self, status_code, headers, body, content_hash):
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+        self.content_hash = content_hash
+
+    def iter_content(self, chunk_size=CHUNK_SIZE):
+        """Read the body from the start in chunks"""
+        self.body.seek(0)
+        while True:
+            chunk = self.body.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    @property
+    def content(self):
+        self.body.seek(0)
+        return self.body.read()
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def close(self):
+        self.body.close()
+
+def get_session():
+    """Return the shared HTTP session used for all feed downloads"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=FEED_POOL_CONNECTIONS,
+                    pool_maxsize=FEED_POOL_MAXSIZE
+                )
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.headers.update({
+                    'Accept': 'text/calendar, */*;q=0.8',
+                    'Accept-Encoding': 'gzip, deflate'
+                })
+                _session = session
+    return _session
+
+def fetch_feed(url, headers=None, connect_timeout=FEED_CONNECT_TIMEOUT, read_timeout=FEED_READ_TIMEOUT,
+               total_timeout=FEED_TOTAL_TIMEOUT, max_bytes=FEED_MAX_BYTES):
+    """
+    Download an ICS feed through the pooled session
+
+    The body is streamed in chunks, decompressed on the fly and spooled to a
+    temporary file, so it is never held in memory in full. The download
+    is aborted with FeedFetchError if the decompressed size exceeds max_bytes
+    or the whole transfer takes longer than total_timeout seconds, so a host
+    that trickles bytes cannot hold a refresh thread forever.
+    """
+    deadline = time.monotonic() + total_timeout
+    try:
+        response = get_session().get(
+            url,
+            headers=headers,
+            timeout=(connect_timeout, read_timeout),
+            stream=True
+        )
+    except requests.RequestException as e:
+        raise FeedFetchError(f"Request to {url} failed: {e}") from e
+
+    try:
+        declared_length = response.headers.get('Content-Length')
+        if (declared_length and declared_length.isdigit() and 'Content-Encoding' not in response.headers
+                and int(declared_length) > max_bytes):
+            raise FeedFetchError(f"Feed at {url} is {declared_length} bytes, limit is {max_bytes}")
+
+        # read1 returns whatever has arrived instead of waiting for a full chunk,
+        # so the deadline is checked even while a server trickles bytes
+        body = tempfile.SpooledTemporaryFile(max_size=FEED_SPOOL_BYTES)
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            while True:
+                chunk = response.raw.read1(CHUNK_SIZE, decode_content=True)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise FeedFetchError(f"Feed at {url} exceeds {max_bytes} bytes")
+                if time.monotonic() > deadline:
+                    raise FeedFetchError(f"Feed at {url} took longer than {total_timeout} seconds")
+                digest.update(chunk)
+                body.write(chunk)
+        except BaseException:
+            body.close()
+            raise
+
+        logging.debug(f"Fetched {size} bytes from {url} with status {response.status_code}")
+        return FeedResponse(response.status_code, response.headers, body, digest.hexdigest())
+    except (requests.RequestException, urllib3.exceptions.HTTPError) as e:
+        raise FeedFetchError(f"Reading {url} failed: {e}") from e
+    finally:
+        response.close()
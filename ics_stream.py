@@ -0,0 +1,103 @@
+import logging
+from icalendar import Component
+
+# Size of the chunks read from a spooled feed body
+READ_SIZE = 64 * 1024
+
+class ICSFormatError(ValueError):
+    """Raised when a feed body is not an iCalendar document"""
+
+def iter_lines(chunks):
+    """Split a stream of byte chunks into lines, keeping their line endings"""
+    pending = b''
+    for chunk in chunks:
+        pending += chunk
+        lines = pending.split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            yield line + b'\n'
+    if pending:
+        yield pending
+
+def line_marker(line):
+    """Return an upper-cased BEGIN:/END: line, or None for any other line"""
+    if len(line) > 64 or line[:1] not in b'BEbe':
+        return None
+    marker = line.strip().upper()
+    if marker.startswith(b'BEGIN:') or marker.startswith(b'END:'):
+        return marker
+    return None
+
+def iter_vevents(chunks):
+    """
+    Yield the VEVENT components of an ICS feed one at a time
+
+    Only the text of the event being parsed is held in memory, so the cost
+    of a refresh no longer grows with the number of events in the feed.
+    VTIMEZONE blocks are parsed as they are met, which registers their TZID
+    with icalendar so later events can resolve it. An event that fails to
+    parse is logged and skipped. ICSFormatError is raised, before anything
+    is yielded, if the body does not start with BEGIN:VCALENDAR.
+    """
+    block = None
+    block_name = None
+    started = False
+    for line in iter_lines(chunks):
+        if not started:
+            if not line.strip():
+                continue
+            if line.lstrip(b'\xef\xbb\xbf').strip().upper() != b'BEGIN:VCALENDAR':
+                raise ICSFormatError("Feed does not start with BEGIN:VCALENDAR")
+            started = True
+            continue
+
+        if block is not None:
+            block.append(line)
+            if line_marker(line) == b'END:' + block_name:
+                text = b''.join(block)
+                block = None
+                try:
+                    component = Component.from_ical(text)
+                except Exception as e:
+                    logging.warning(f"Skipping unparsable {block_name.decode()} in ICS feed: {e}")
+                    continue
+                if component.name == 'VEVENT':
+                    yield component
+            continue
+
+        marker = line_marker(line)
+        if marker in (b'BEGIN:VEVENT', b'BEGIN:VTIMEZONE'):
+            block = [line]
+            block_name = marker[len(b'BEGIN:'):]
+
+    if not started:
+        raise ICSFormatError("Feed is empty")
+
+def iter_file_chunks(file, size=READ_SIZE):
+    """Read a binary file object from the start in fixed-size chunks"""
+    file.seek(0)
+    while True:
+        chunk = file.read(size)
+        if not chunk:
+            return
+        yield chunk
+
+def check_envelope(file):
+    """
+    Check that a spooled feed body is a complete VCALENDAR
+
+    Events are written to the store while the feed is read, so a body cut
+    off part way must be rejected before the first write rather than when
+    the stream runs out.
+    """
+    file.seek(0)
+    head = file.read(256).lstrip(b'\xef\xbb\xbf \t\r\n')
+    file.seek(0, 2)
+    size = file.tell()
+    file.seek(max(0, size - 256))
+    tail = file.read().rstrip()
+    file.seek(0)
+    if not head.upper().startswith(b'BEGIN:VCALENDAR'):
+        raise ICSFormatError("Feed does not start with BEGIN:VCALENDAR")
+    if not tail.upper().endswith(b'END:VCALENDAR'):
+        raise ICSFormatError("Feed does not end with END:VCALENDAR")
@@ -0,0 +1,194 @@
+"""
+Durable background jobs stored in the application database
+
+Jobs are enqueued in the caller's transaction, so they exist exactly when
+the change that needs them commits. Workers claim due jobs, run the
+handler registered for their kind, and retry failures with exponential
+backoff until max_attempts. A handler's database writes commit together
+with the job being marked done.
+
+Run a dedicated worker with `flask --app app run-worker`; unless
+JOB_INLINE_WORKER is off, the web process scheduler also runs due jobs.
+"""
+
+import json
+import logging
+import os
+import random
+import socket
+import time
+from datetime import datetime, timedelta
+import click
+from sqlalchemy import delete, func, select, update
+from app import app, db
+from models import Job
+from config import (
+    JOB_BATCH_SIZE, JOB_LOCK_TIMEOUT, JOB_MAX_ATTEMPTS, JOB_POLL_SECONDS, JOB_RETENTION_DAYS,
+    JOB_RETRY_BASE_SECONDS, JOB_RETRY_MAX_SECONDS
+)
+
+# Handlers by job kind; each takes the decoded payload
+job_handlers = {}
+
+def job_handler(kind):
+    """Register a function as the handler of a job kind (used as a decorator)"""
+    def register(function):
+        job_handlers[kind] = function
+        return function
+    return register
+
+def enqueue_job(kind, payload, run_at=None, max_attempts=JOB_MAX_ATTEMPTS):
+    """Add a job to the current session; it is only queued once the caller commits"""
+    job = Job(kind=kind, payload=json.dumps(payload), status='pending', attempts=0,
+              max_attempts=max_attempts, run_at=run_at or datetime.utcnow())
+    db.session.add(job)
+    return job
+
+def retry_delay(attempts):
+    """Seconds to wait before the next attempt: exponential, capped, with jitter"""
+    delay = min(JOB_RETRY_MAX_SECONDS, JOB_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def release_stale_jobs():
+    """Put back jobs whose worker has held them for longer than JOB_LOCK_TIMEOUT"""
+    now = datetime.utcnow()
+    result = db.session.execute(
+        update(Job)
+        .where(Job.status == 'running', Job.locked_at < now - timedelta(seconds=JOB_LOCK_TIMEOUT))
+        .values(status='pending', run_at=now, locked_by=None, locked_at=None)
+    )
+    db.session.commit()
+    if result.rowcount:
+        logging.warning(f"Released {result.rowcount} jobs held by lost workers")
+
+def claim_jobs(worker_id, limit=JOB_BATCH_SIZE):
+    """
+    Mark up to limit due jobs as running for this worker; returns their IDs
+
+    Each job is taken with a conditional UPDATE, so two workers never claim
+    the same one. PostgreSQL also skips rows other workers are claiming.
+    """
+    now = datetime.utcnow()
+    query = (
+        select(Job.id)
+        .where(Job.status == 'pending', Job.run_at <= now)
+        .order_by(Job.run_at, Job.id)
+        .limit(limit)
+    )
+    if db.session.get_bind().dialect.name == 'postgresql':
+        query = query.with_for_update(skip_locked=True)
+
+    claimed = []
+    for job_id in db.session.execute(query).scalars().all():
+        result = db.session.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == 'pending')
+            .values(status='running', locked_by=worker_id, locked_at=now, attempts=Job.attempts + 1)
+        )
+        if result.rowcount:
+            claimed.append(job_id)
+    db.session.commit()
+    return claimed
+
+def run_job(job_id):
+    """Run one claimed job; returns True if it succeeded"""
+    job = db.session.get(Job, job_id)
+    kind, attempts, max_attempts = job.kind, job.attempts, job.max_attempts
+    try:
+        handler = job_handlers.get(kind)
+        if handler is None:
+            raise LookupError(f"No handler registered for job kind {kind}")
+        handler(json.loads(job.payload))
+        job.status = 'done'
+        job.finished_at = datetime.utcnow()
+        job.last_error = None
+        db.session.commit()
+        return True
+    except Exception as e:
+        db.session.rollback()
+        error = f"{type(e).__name__}: {e}"
+        values = {'last_error': error[:2000], 'locked_by': None, 'locked_at': None}
+        if attempts >= max_attempts:
+            values.update(status='failed', finished_at=datetime.utcnow())
+            logging.error(f"Job {kind} #{job_id} failed for good after {attempts} attempts: {error}")
+        else:
+            delay = retry_delay(attempts)
+            values.update(status='pending', run_at=datetime.utcnow() + timedelta(seconds=delay))
+            logging.warning(f"Job {kind} #{job_id} failed (attempt {attempts}), retrying in {delay:.0f}s: {error}")
+        db.session.execute(update(Job).where(Job.id == job_id).values(**values))
+        db.session.commit()
+        return False
+
+def process_jobs(worker_id=None, limit=JOB_BATCH_SIZE):
+    """Claim and run one batch of due jobs; returns how many were run"""
+    worker_id = worker_id or default_worker_id()
+    release_stale_jobs()
+    job_ids = claim_jobs(worker_id, limit)
+    for job_id in job_ids:
+        run_job(job_id)
+    return len(job_ids)
+
+def purge_finished_jobs():
+    """Delete done and failed jobs older than JOB_RETENTION_DAYS"""
+    cutoff = datetime.utcnow() - timedelta(days=JOB_RETENTION_DAYS)
+    result = db.session.execute(delete(Job).where(Job.status.in_(['done', 'failed']), Job.finished_at < cutoff))
+    db.session.commit()
+    return result.rowcount
+
+def run_job_cycle():
+    """Run due jobs until none are left (scheduled in the web process when JOB_INLINE_WORKER is on)"""
+    with app.app_context():
+        try:
+            while process_jobs():
+                pass
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error running background jobs: {e}")
+
+def run_worker(worker_id=None, poll_seconds=JOB_POLL_SECONDS, once=False):
+    """Process jobs forever, or until the queue is empty with once"""
+    worker_id = worker_id or default_worker_id()
+    logging.info(f"Job worker {worker_id} started")
+    last_purge = 0
+    while True:
+        with app.app_context():
+            try:
+                if time.monotonic() - last_purge > 3600:
+                    purge_finished_jobs()
+                    last_purge = time.monotonic()
+                processed = process_jobs(worker_id)
+            except Exception as e:
+                db.session.rollback()
+                logging.error(f"Job worker error: {e}")
+                processed = 0
+        if not processed:
+            if once:
+                return
+            time.sleep(poll_seconds)
+
+def get_job_stats():
+    """Job counts by status, and the age of the oldest due job in seconds"""
+    counts = dict(db.session.execute(select(Job.status, func.count()).group_by(Job.status)).all())
+    oldest = db.session.execute(
+        select(func.min(Job.run_at)).where(Job.status == 'pending', Job.run_at <= datetime.utcnow())
+    ).scalar()
+    return {
+        'pending': counts.get('pending', 0),
+        'running': counts.get('running', 0),
+        'done': counts.get('done', 0),
+        'failed': counts.get('failed', 0),
+        'oldest_due_seconds': round((datetime.utcnow() - oldest).total_seconds(), 1) if oldest else 0
+    }
+
+def init_cli(app):
+    """Register the run-worker command"""
+
+    @app.cli.command('run-worker')
+    @click.option('--once', is_flag=True, help='exit once no jobs are due')
+    @click.option('--poll-seconds', type=float, default=JOB_POLL_SECONDS, show_default=True)
+    def run_worker_command(once, poll_seconds):
+        """Run booking side effects and other background jobs"""
+        run_worker(poll_seconds=poll_seconds, once=once)
@@ -0,0 +1,152 @@
+"""
+Schema migrations applied on top of db.create_all()
+
+create_all only creates missing tables, so columns and indexes added to
+existing tables are brought in here. Each migration has a version number,
+runs in its own transaction and is recorded in the schema_migrations table
+once applied. Steps check the live schema before changing it, so a
+migration is safe to rerun against a database that is already up to date
+(fresh databases get everything from create_all and only record versions).
+
+New migrations are added at the end of the file with the next version.
+"""
+
+import logging
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, delete, func, inspect, select, text
+from app import db
+from models import Booking, Calendar, CalendarEvent, SharedLink, shared_link_calendar
+
+schema_migrations = Table(
+    'schema_migrations', MetaData(),
+    Column('version', Integer, primary_key=True),
+    Column('description', String(256), nullable=False),
+    Column('applied_at', DateTime, nullable=False)
+)
+
+MIGRATIONS = []
+
+# Arbitrary key for the PostgreSQL advisory lock that serializes concurrent migration runs
+MIGRATION_LOCK_ID = 7281904
+
+def migration(version, description):
+    """Register a migration function (used as a decorator)"""
+    def register(function):
+        MIGRATIONS.append((version, description, function))
+        return function
+    return register
+
+def add_missing_columns(connection, model, names):
+    """Add the named model columns that the table does not have yet; returns the names added"""
+    table = model.__table__
+    existing = {column['name'] for column in inspect(connection).get_columns(table.name)}
+    quote = connection.dialect.identifier_preparer.quote
+    added = []
+    for name in names:
+        if name in existing:
+            continue
+        column = table.columns[name]
+        column_type = column.type.compile(dialect=connection.dialect)
+        connection.execute(text(f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(name)} {column_type}"))
+        added.append(name)
+    return added
+
+def create_missing_indexes(connection, model, names=None):
+    """Create the model's declared indexes (or the named ones) that do not exist yet"""
+    existing = {index['name'] for index in inspect(connection).get_indexes(model.__table__.name)}
+    created = []
+    for index in model.__table__.indexes:
+        if (names is None or index.name in names) and index.name not in existing:
+            index.create(connection)
+            created.append(index.name)
+    return created
+
+@migration(1, "Add feed validator columns to calendar")
+def add_feed_validators(connection):
+    add_missing_columns(connection, Calendar, ['feed_etag', 'feed_last_modified', 'feed_content_hash'])
+
+@migration(2, "Add incremental sync and recurrence columns to calendar_event")
+def add_event_sync_columns(connection):
+    added = add_missing_columns(connection, CalendarEvent, [
+        'recurrence_id', 'sequence', 'last_modified',
+        'rdates', 'exdates', 'timezone', 'is_recurring', 'series_end'
+    ])
+    create_missing_indexes(connection, CalendarEvent, [
+        'ix_calendar_event_calendar_start', 'ix_calendar_event_calendar_end', 'ix_calendar_event_calendar_recurring'
+    ])
+    if added:
+        # Rows stored before these columns existed cannot be matched by
+        # RECURRENCE-ID or expanded, so the event store is rebuilt from the
+        # feeds: calendars without last_synced are refreshed on next use
+        connection.execute(CalendarEvent.__table__.delete())
+        connection.execute(Calendar.__table__.update().values(
+            last_synced=None, feed_etag=None, feed_last_modified=None, feed_content_hash=None
+        ))
+        logging.info("Cleared the event store; calendars will be refreshed from their feeds")
+
+@migration(3, "Add composite indexes for booking, calendar and shared link lookups")
+def add_hot_path_indexes(connection):
+    create_missing_indexes(connection, Booking, ['ix_booking_link_start'])
+    create_missing_indexes(connection, Calendar, ['ix_calendar_user_active'])
+    create_missing_indexes(connection, SharedLink, ['ix_shared_link_user_active'])
+
+@migration(4, "Move shared link calendars from the calendar_ids column to shared_link_calendar")
+def link_calendars_table(connection):
+    shared_link_calendar.create(connection, checkfirst=True)
+    calendar_ids = set(connection.execute(select(Calendar.id)).scalars())
+    linked = set(connection.execute(select(shared_link_calendar.c.shared_link_id)).scalars())
+    rows = []
+    for link_id, legacy_ids in connection.execute(select(SharedLink.id, SharedLink.calendar_ids)):
+        if link_id in linked or not legacy_ids:
+            continue
+        # Skip IDs of calendars that no longer exist
+        for calendar_id in {int(value) for value in legacy_ids.split(',') if value.strip().isdigit()}:
+            if calendar_id in calendar_ids:
+                rows.append({'shared_link_id': link_id, 'calendar_id': calendar_id})
+    if rows:
+        connection.execute(shared_link_calendar.insert(), rows)
+        logging.info(f"Linked {len(rows)} shared link calendars from the legacy calendar_ids column")
+
+@migration(5, "Add availability rules to shared_link")
+def add_availability_rules(connection):
+    add_missing_columns(connection, SharedLink, ['availability_rules'])
+
+@migration(6, "Make calendar events unique per calendar, UID and RECURRENCE-ID")
+def unique_calendar_event_keys(connection):
+    # Concurrent refreshes of a calendar could each insert its events; keep the first copy of every key
+    first_ids = (
+        select(func.min(CalendarEvent.id))
+        .group_by(CalendarEvent.calendar_id, CalendarEvent.uid, CalendarEvent.recurrence_id)
+    )
+    result = connection.execute(delete(CalendarEvent).where(CalendarEvent.id.not_in(first_ids)))
+    if result.rowcount:
+        logging.info(f"Removed {result.rowcount} duplicate calendar events")
+    create_missing_indexes(connection, CalendarEvent, ['ux_calendar_event_uid', 'ux_calendar_event_uid_recurrence'])
+
+@migration(7, "Add refresh failure time to calendar")
+def add_refresh_failed_at(connection):
+    add_missing_columns(connection, Calendar, ['refresh_failed_at'])
+
+def get_applied_versions(connection):
+    return {row.version for row in connection.execute(select(schema_migrations.c.version))}
+
+def run_migrations(engine=None):
+    """Apply pending migrations in version order; returns the versions applied"""
+    engine = engine or db.engine
+    schema_migrations.create(engine, checkfirst=True)
+
+    applied = []
+    for version, description, function in sorted(MIGRATIONS, key=lambda entry: entry[0]):
+        with engine.begin() as connection:
+            if connection.dialect.name == 'postgresql':
+                # Workers starting together wait here instead of racing on DDL
+                connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {'key': MIGRATION_LOCK_ID})
+            if version in get_applied_versions(connection):
+                continue
+            logging.info(f"Applying migration {version}: {description}")
+            function(connection)
+            connection.execute(schema_migrations.insert().values(
+                version=version, description=description, applied_at=datetime.utcnow()
+            ))
+            applied.append(version)
+    return applied
@@ -1,4 +1,6 @@
 from datetime import datetime
+import pytz
+from recurrence import parse_dates
 from app import db
 from flask_login import UserMixin
 
@@ -27,32 +29,122 @@ class Calendar(db.Model):
     refresh_interval = db.Column(db.Integer, default=60)  # Refresh interval in minutes
     last_synced = db.Column(db.DateTime)
     active = db.Column(db.Boolean, default=True)
-    cached_events = db.Column(db.Text)  # Store cached events as JSON
+    cached_events = db.Column(db.Text)  # Legacy JSON cache, superseded by CalendarEvent rows
+    feed_etag = db.Column(db.String(256))  # ETag of the last fetched feed
+    feed_last_modified = db.Column(db.String(64))  # Last-Modified header of the last fetched feed
+    feed_content_hash = db.Column(db.String(64))  # SHA-256 of the last parsed feed body
+    refresh_failed_at = db.Column(db.DateTime)  # Last failed scheduled refresh (naive UTC), which waits out refresh_interval too
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        db.Index('ix_calendar_user_active', 'user_id', 'active'),
+    )
+    
     def __repr__(self):
         return f'<Calendar {self.name}>'
 
+class CalendarEvent(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    calendar_id = db.Column(db.Integer, db.ForeignKey('calendar.id'), nullable=False)
+    uid = db.Column(db.String(512))
+    recurrence_id = db.Column(db.DateTime)  # RECURRENCE-ID of an overridden instance, naive UTC
+    sequence = db.Column(db.Integer, default=0)  # SEQUENCE, bumped by the organizer on edits
+    last_modified = db.Column(db.DateTime)  # LAST-MODIFIED, naive UTC
+    subject = db.Column(db.Text)
+    start = db.Column(db.DateTime, nullable=False)  # Stored as naive UTC
+    end = db.Column(db.DateTime, nullable=False)  # Stored as naive UTC
+    is_all_day = db.Column(db.Boolean, default=False)
+    status = db.Column(db.String(32), default="CONFIRMED")
+    show_as = db.Column(db.String(32), default="busy")  # busy, tentative, free, etc.
+    description = db.Column(db.Text)
+    location = db.Column(db.Text)
+    organizer = db.Column(db.String(512))
+    recurrence = db.Column(db.Text)  # Raw RRULE value, if any
+    rdates = db.Column(db.Text)  # Comma-separated RDATE values in UTC
+    exdates = db.Column(db.Text)  # Comma-separated EXDATE values in UTC
+    timezone = db.Column(db.String(64))  # Zone of DTSTART, used to expand recurrences across DST
+    is_recurring = db.Column(db.Boolean, default=False)  # Series master with RRULE or RDATE
+    series_end = db.Column(db.DateTime)  # End of the last instance, naive UTC; NULL repeats forever
+    
+    calendar = db.relationship('Calendar', backref=db.backref('events', lazy='dynamic'))
+    
+    __table_args__ = (
+        db.Index('ix_calendar_event_calendar_start', 'calendar_id', 'start'),
+        db.Index('ix_calendar_event_calendar_end', 'calendar_id', 'end'),
+        db.Index('ix_calendar_event_calendar_recurring', 'calendar_id', 'is_recurring'),
+        # One row per (UID, RECURRENCE-ID) in a calendar. Unique indexes treat NULLs as distinct,
+        # so events without a RECURRENCE-ID get their own partial index
+        db.Index('ux_calendar_event_uid', 'calendar_id', 'uid', unique=True,
+                 postgresql_where=recurrence_id.is_(None), sqlite_where=recurrence_id.is_(None)),
+        db.Index('ux_calendar_event_uid_recurrence', 'calendar_id', 'uid', 'recurrence_id', unique=True,
+                 postgresql_where=recurrence_id.isnot(None), sqlite_where=recurrence_id.isnot(None)),
+    )
+    
+    def to_dict(self):
+        """Convert the row to the event dict shape produced by feed parsing"""
+        return {
+            'id': self.uid or '',
+            'subject': self.subject,
+            'start': self.start.replace(tzinfo=pytz.UTC),
+            'end': self.end.replace(tzinfo=pytz.UTC),
+            'is_all_day': self.is_all_day,
+            'status': self.status,
+            'description': self.description,
+            'location': self.location,
+            'organizer': self.organizer,
+            'recurrence': self.recurrence,
+            'recurrence_id': self.recurrence_id.replace(tzinfo=pytz.UTC) if self.recurrence_id else None,
+            'rdates': parse_dates(self.rdates),
+            'exdates': parse_dates(self.exdates),
+            'timezone': self.timezone,
+            'is_recurring': self.is_recurring,
+            'show_as': self.show_as
+        }
+    
+    def __repr__(self):
+        return f'<CalendarEvent {self.subject} at {self.start}>'
+
+# CalendarEvent columns written from parsed feed events (everything but the primary key)
+EVENT_COLUMNS = [
+    'calendar_id', 'uid', 'recurrence_id', 'sequence', 'last_modified', 'subject', 'start', 'end',
+    'is_all_day', 'status', 'show_as', 'description', 'location', 'organizer', 'recurrence',
+    'rdates', 'exdates', 'timezone', 'is_recurring', 'series_end'
+]
+
+# Calendars whose availability a shared link offers
+shared_link_calendar = db.Table(
+    'shared_link_calendar',
+    db.Column('shared_link_id', db.Integer, db.ForeignKey('shared_link.id'), primary_key=True),
+    db.Column('calendar_id', db.Integer, db.ForeignKey('calendar.id'), primary_key=True),
+    # The primary key serves link -> calendars; this serves calendar -> links
+    db.Index('ix_shared_link_calendar_calendar', 'calendar_id')
+)
+
 class SharedLink(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     link_id = db.Column(db.String(64), unique=True, nullable=False)
     name = db.Column(db.String(128), nullable=False)
     description = db.Column(db.Text)
-    # Store comma-separated list of calendar IDs
-    calendar_ids = db.Column(db.Text, nullable=False)
+    calendar_ids = db.Column(db.Text, nullable=False, default='')  # Legacy comma-separated IDs, superseded by calendars
     active = db.Column(db.Boolean, default=True)
+    availability_rules = db.Column(db.Text)  # JSON rules (see availability_rules.py), NULL for the defaults
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    calendars = db.relationship('Calendar', secondary=shared_link_calendar, order_by='Calendar.id',
+                                backref='shared_links')
+    
+    __table_args__ = (
+        db.Index('ix_shared_link_user_active', 'user_id', 'active'),
+    )
+    
     def get_calendar_ids(self):
-        """Convert the stored string of calendar IDs to a list of integers"""
-        if not self.calendar_ids:
-            return []
-        return [int(calendar_id) for calendar_id in self.calendar_ids.split(',')]
+        """Return the IDs of the linked calendars"""
+        return [calendar.id for calendar in self.calendars]
     
     def set_calendar_ids(self, calendar_ids):
-        """Convert a list of calendar IDs to a comma-separated string"""
-        self.calendar_ids = ','.join(str(calendar_id) for calendar_id in calendar_ids)
+        """Link the calendars with the given IDs, replacing the current ones"""
+        self.calendars = Calendar.query.filter(Calendar.id.in_(list(calendar_ids))).all() if calendar_ids else []
     
     def __repr__(self):
         return f'<SharedLink {self.name}>'
@@ -71,5 +163,63 @@ class Booking(db.Model):
     
     shared_link = db.relationship('SharedLink', backref='bookings')
     
+    __table_args__ = (
+        db.Index('ix_booking_link_start', 'shared_link_id', 'start_time'),
+    )
+    
     def __repr__(self):
         return f'<Booking {self.subject} at {self.start_time}>'
+
+class BookingHourlyRollup(db.Model):
+    """Booking counts and durations per shared link and hour, maintained as bookings are created"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    shared_link_id = db.Column(db.Integer, db.ForeignKey('shared_link.id'), nullable=False)
+    bucket = db.Column(db.DateTime, nullable=False)  # Start of the hour the bookings start in
+    booking_count = db.Column(db.Integer, nullable=False, default=0)
+    total_duration = db.Column(db.Integer, nullable=False, default=0)  # in seconds
+    
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'shared_link_id', 'bucket', name='uq_booking_hourly_rollup'),
+    )
+    
+    def __repr__(self):
+        return f'<BookingHourlyRollup link={self.shared_link_id} {self.bucket}: {self.booking_count}>'
+
+class BookingCustomerRollup(db.Model):
+    """Booking counts per shared link, day and customer, maintained as bookings are created"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    shared_link_id = db.Column(db.Integer, db.ForeignKey('shared_link.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    customer_email = db.Column(db.String(128), nullable=False)
+    booking_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'shared_link_id', 'day', 'customer_email', name='uq_booking_customer_rollup'),
+    )
+    
+    def __repr__(self):
+        return f'<BookingCustomerRollup link={self.shared_link_id} {self.day} {self.customer_email}: {self.booking_count}>'
+
+class Job(db.Model):
+    """A unit of background work (such as a booking side effect), run by the job queue worker"""
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(64), nullable=False)  # Name of the registered handler
+    payload = db.Column(db.Text, nullable=False, default='{}')  # JSON arguments for the handler
+    status = db.Column(db.String(16), nullable=False, default='pending')  # pending, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # Earliest next attempt, naive UTC
+    locked_by = db.Column(db.String(128))  # Worker running the job
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('ix_job_status_run_at', 'status', 'run_at'),
+    )
+    
+    def __repr__(self):
+        return f'<Job {self.kind} #{self.id} {self.status}>'
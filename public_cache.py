@@ -0,0 +1,93 @@
+"""
+HTTP caching for the public booking pages
+
+What /shared/<link_id> and /api/slots show for a link only changes when
+its calendars are synced, when a booking is made against its calendars,
+when the link itself is edited, or as time passes (slots start or fall
+within the minimum notice). LinkValidators turns those into a weak ETag
+and a Last-Modified date from the link and its calendars, which the
+routes have already loaded, plus one booking aggregate. A revalidation is
+then answered with 304 Not Modified before any slot is computed, and
+Cache-Control lets browsers and a reverse proxy reuse an /api/slots
+response for PUBLIC_CACHE_MAX_AGE seconds. The /shared page depends on
+the visitor's session (flashed messages, the signed-in owner), so it is
+revalidated on every view instead.
+
+Time is accounted for in windows of PUBLIC_CACHE_MAX_AGE seconds: the
+validators change when a new window starts, so a reused or revalidated
+response is never older than that.
+"""
+
+import hashlib
+from datetime import datetime
+from flask import Response
+import pytz
+from availability import to_utc
+from calendar_sync import get_booking_watermark
+from config import PUBLIC_CACHE_MAX_AGE
+
+class LinkValidators:
+    """ETag and Last-Modified for a shared link's public responses"""
+
+    def __init__(self, etag, last_modified):
+        self.etag = etag
+        self.last_modified = last_modified
+
+    def is_fresh(self, request):
+        """Whether the client's copy is current (If-None-Match wins over If-Modified-Since)"""
+        if request.if_none_match:
+            return request.if_none_match.contains_weak(self.etag)
+        return request.if_modified_since is not None and request.if_modified_since >= self.last_modified
+
+    def apply(self, response, private=False, revalidate=False):
+        """
+        Set the validators and Cache-Control on a response
+
+        Private responses (pages personalized for a signed-in owner) are
+        not stored by shared caches. Private and revalidate responses must
+        be revalidated every time rather than reused for
+        PUBLIC_CACHE_MAX_AGE seconds.
+        """
+        response.set_etag(self.etag, weak=True)
+        response.last_modified = self.last_modified
+        if private:
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+        elif revalidate:
+            response.cache_control.public = True
+            response.cache_control.no_cache = True
+        else:
+            response.cache_control.public = True
+            response.cache_control.max_age = PUBLIC_CACHE_MAX_AGE
+        return response
+
+    def not_modified(self, private=False, revalidate=False):
+        return self.apply(Response(status=304), private, revalidate)
+
+def link_validators(shared_link, calendars, *variant, now=None):
+    """
+    Validators for a link's public responses
+
+    variant adds anything else the response depends on (the query
+    string, the signed-in user). Bookings are counted as well as dated so
+    that deleted ones change the ETag too.
+    """
+    now = now or datetime.now(pytz.UTC)
+    window_seconds = max(PUBLIC_CACHE_MAX_AGE, 1)
+    window = int(now.timestamp()) // window_seconds
+    booking_count, last_booking_id, last_booked = get_booking_watermark(
+        shared_link.id, [calendar.id for calendar in calendars]
+    )
+    state = (
+        shared_link.id, shared_link.name, shared_link.description, shared_link.availability_rules,
+        [(calendar.id, calendar.last_synced) for calendar in calendars],
+        booking_count, last_booking_id, window, variant
+    )
+    etag = hashlib.blake2b(repr(state).encode(), digest_size=16).hexdigest()
+
+    # Last-Modified is the latest change, or the start of the time window if that is later
+    changes = [datetime.fromtimestamp(window * window_seconds, pytz.UTC)]
+    changes += [to_utc(value) for value in [shared_link.created_at, last_booked] if value is not None]
+    changes += [to_utc(calendar.last_synced) for calendar in calendars if calendar.last_synced is not None]
+    last_modified = min(max(changes), now).replace(microsecond=0)
+    return LinkValidators(etag, last_modified)
@@ -0,0 +1,159 @@
+import logging
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from dateutil.rrule import DAILY, WEEKLY, rrulestr, rruleset
+import pytz
+
+# Upper bound on instances materialized when computing the end of a COUNT-limited series
+MAX_COUNTED_INSTANCES = 100000
+
+def format_dates(values):
+    """Serialize a list of datetimes as comma-separated UTC timestamps"""
+    if not values:
+        return None
+    return ','.join(value.astimezone(pytz.UTC).strftime('%Y%m%dT%H%M%SZ') for value in sorted(values))
+
+def parse_dates(text):
+    """Parse the output of format_dates back into UTC datetimes"""
+    if not text:
+        return []
+    return [datetime.strptime(value, '%Y%m%dT%H%M%SZ').replace(tzinfo=pytz.UTC) for value in text.split(',')]
+
+def series_zone(event):
+    """The zone a series repeats in, so instances keep their wall-clock time across DST"""
+    if event.get('timezone'):
+        try:
+            return ZoneInfo(event['timezone'])
+        except (ZoneInfoNotFoundError, ValueError):
+            logging.warning(f"Unknown time zone {event['timezone']} for event {event.get('id')}, expanding in UTC")
+    return ZoneInfo('UTC')
+
+def parse_rule(event, dtstart=None):
+    """
+    Parse an event's RRULE with a zone-aware DTSTART
+
+    dateutil requires UNTIL in UTC once DTSTART is aware, but feeds often send
+    a DATE or floating UNTIL, so those are converted before parsing.
+    """
+    zone = series_zone(event)
+    parts = []
+    for part in event['recurrence'].split(';'):
+        name, _, value = part.partition('=')
+        if name.upper() == 'UNTIL' and not value.endswith('Z'):
+            if 'T' in value:
+                until = datetime.strptime(value, '%Y%m%dT%H%M%S').replace(tzinfo=zone)
+            else:
+                until = datetime.strptime(value, '%Y%m%d').replace(hour=23, minute=59, second=59, tzinfo=zone)
+            value = until.astimezone(pytz.UTC).strftime('%Y%m%dT%H%M%SZ')
+        parts.append(f"{name}={value}")
+    return rrulestr(';'.join(parts), dtstart=dtstart or event['start'].astimezone(zone))
+
+def build_rule_set(event, dtstart=None):
+    """Build a dateutil rule set from an event's RRULE, RDATE and EXDATE values"""
+    zone = series_zone(event)
+    dtstart = dtstart or event['start'].astimezone(zone)
+
+    rules = rruleset()
+    if event.get('recurrence'):
+        rules.rrule(parse_rule(event, dtstart))
+    for value in event.get('rdates') or []:
+        rules.rdate(value.astimezone(zone))
+    for value in event.get('exdates') or []:
+        rules.exdate(value.astimezone(zone))
+    return rules
+
+def get_series_end(event):
+    """
+    Return the end of the last instance of a series, or None if it repeats forever
+
+    Used at refresh time so queries can skip series that ended before their window.
+    """
+    duration = event['end'] - event['start']
+    last_starts = [value for value in event.get('rdates') or []]
+
+    if event.get('recurrence'):
+        rule = parse_rule(event)
+        if rule._until:
+            last_starts.append(rule._until)
+        elif rule._count:
+            last = None
+            for index, value in enumerate(rule):
+                if index >= MAX_COUNTED_INSTANCES:
+                    return None
+                last = value
+            if last:
+                last_starts.append(last)
+        else:
+            return None
+
+    if not last_starts:
+        return event['end']
+    return max(max(last_starts).astimezone(pytz.UTC) + duration, event['end'])
+
+def skip_ahead(event, window_start):
+    """
+    Move DTSTART of an open-ended DAILY or WEEKLY rule close to the window
+
+    Stepping whole rule periods keeps every instance in place, so the
+    expansion does not have to walk years of history to reach the window.
+    Returns the new DTSTART, or None when the rule cannot be shifted safely.
+    """
+    zone = series_zone(event)
+    try:
+        rule = parse_rule(event)
+    except (ValueError, TypeError):
+        return None
+    if rule._count or rule._bysetpos or rule._freq not in (DAILY, WEEKLY):
+        return None
+
+    step_days = rule._interval * (7 if rule._freq == WEEKLY else 1)
+    dtstart = event['start'].astimezone(zone)
+    # Leave a full period (plus the event duration) before the window
+    gap = window_start - dtstart - (event['end'] - event['start']) - timedelta(days=step_days)
+    periods = gap.days // step_days
+    if periods <= 0:
+        return None
+    local_start = dtstart.replace(tzinfo=None) + timedelta(days=periods * step_days)
+    return local_start.replace(tzinfo=zone)
+
+def iter_instances(event, window_start, window_end, overridden=frozenset()):
+    """
+    Lazily yield the instances of a recurring event that overlap a window
+
+    Instances are generated in the series' own zone, so they keep their
+    wall-clock time across DST changes, and only up to window_end, so an
+    infinite rule never materializes more than the window needs. Instances
+    whose start is in overridden (UTC datetimes of RECURRENCE-ID overrides)
+    are skipped, since the override row replaces them.
+    """
+    duration = event['end'] - event['start']
+    zone = series_zone(event)
+    window_start = window_start.astimezone(zone)
+    window_end = window_end.astimezone(zone)
+
+    dtstart = None
+    if event.get('recurrence'):
+        dtstart = skip_ahead(event, window_start)
+
+    try:
+        rules = build_rule_set(event, dtstart)
+    except (ValueError, TypeError) as e:
+        logging.error(f"Invalid recurrence for event {event.get('id')}: {e}")
+        return
+
+    # The series start is always an instance, even if the rule itself does not match it
+    first = event['start'].astimezone(zone)
+    if dtstart is None:
+        rules.rdate(first)
+
+    for start in rules.xafter(window_start - duration, inc=False):
+        if start >= window_end:
+            break
+        start_utc = start.astimezone(pytz.UTC)
+        if start_utc in overridden:
+            continue
+        instance = dict(event)
+        instance['start'] = start_utc
+        instance['end'] = start_utc + duration
+        instance['recurrence_id'] = start_utc
+        yield instance
@@ -0,0 +1,213 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from sqlalchemy import and_, func, or_, select, update
+from app import app, db
+from models import Calendar
+from feed_client import fetch_feed
+from calendar_sync import apply_feed_response, feed_request_headers, notify_event_changes
+from ics_stream import ICSFormatError
+from config import REFRESH_WORKERS, REFRESH_BATCH_SIZE
+
+class FeedFetch:
+    """A feed download: the inputs a worker needs and what it got back"""
+
+    def __init__(self, calendar_id, url, headers):
+        self.calendar_id = calendar_id
+        self.url = url
+        self.headers = headers
+        self.response = None
+        self.error = None
+        self.fetch_seconds = 0.0
+
+class RefreshMetrics:
+    """Thread-safe throughput counters for the refresh engine"""
+
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self._fetch_times = deque(maxlen=window)
+        self._apply_times = deque(maxlen=window)
+        self.totals = {'fetched': 0, 'updated': 0, 'unchanged': 0, 'failed': 0}
+        self.last_cycle = None
+
+    def record_fetch(self, fetch_seconds):
+        with self._lock:
+            self._fetch_times.append(fetch_seconds)
+
+    def record_apply(self, apply_seconds):
+        with self._lock:
+            self._apply_times.append(apply_seconds)
+
+    def record_outcome(self, outcome):
+        with self._lock:
+            self.totals['fetched'] += 1
+            self.totals[outcome] += 1
+
+    def record_cycle(self, started_at, feeds, duration):
+        with self._lock:
+            self.last_cycle = {
+                'started_at': started_at.isoformat(),
+                'feeds': feeds,
+                'duration_seconds': round(duration, 3),
+                'feeds_per_second': round(feeds / duration, 2) if duration > 0 else 0
+            }
+
+    def percentile(self, percent, stage='fetch'):
+        """Fetch or apply (parse and store) time percentile, in seconds, over the recent window"""
+        with self._lock:
+            times = sorted(self._fetch_times if stage == 'fetch' else self._apply_times)
+        if not times:
+            return 0
+        index = min(len(times) - 1, int(round(percent / 100 * (len(times) - 1))))
+        return times[index]
+
+    def snapshot(self):
+        with self._lock:
+            totals = dict(self.totals)
+            last_cycle = dict(self.last_cycle) if self.last_cycle else None
+        return {
+            'totals': totals,
+            'last_cycle': last_cycle,
+            'p50_fetch_seconds': round(self.percentile(50), 3),
+            'p95_fetch_seconds': round(self.percentile(95), 3),
+            'p50_apply_seconds': round(self.percentile(50, 'apply'), 3),
+            'p95_apply_seconds': round(self.percentile(95, 'apply'), 3)
+        }
+
+metrics = RefreshMetrics()
+
+def get_due_calendars(now=None):
+    """
+    Return the active calendars whose refresh interval has elapsed since their last sync and last failure
+
+    Due calendars are picked in SQL, with one cutoff per distinct refresh
+    interval so no database-specific date arithmetic is needed, and only
+    the columns needed to request their feeds are loaded: id, ics_url,
+    feed_etag, feed_last_modified and cached_events, which here is only
+    whether the legacy JSON cache is still set (see feed_request_headers).
+    """
+    now = now or datetime.utcnow()
+    interval = func.coalesce(func.nullif(Calendar.refresh_interval, 0), 60)
+    intervals = db.session.execute(select(interval).where(Calendar.active.is_(True)).distinct()).scalars().all()
+    if not intervals:
+        return []
+    due = []
+    for minutes in intervals:
+        cutoff = now - timedelta(minutes=minutes)
+        due.append(and_(
+            interval == minutes,
+            or_(Calendar.last_synced.is_(None), Calendar.last_synced <= cutoff),
+            or_(Calendar.refresh_failed_at.is_(None), Calendar.refresh_failed_at <= cutoff)
+        ))
+    return db.session.execute(
+        select(Calendar.id, Calendar.ics_url, Calendar.feed_etag, Calendar.feed_last_modified,
+               (func.length(Calendar.cached_events) > 0).label('cached_events'))
+        .where(Calendar.active.is_(True), or_(*due))
+    ).all()
+
+def fetch(feed):
+    """Download one feed; runs on a worker thread and never touches the database"""
+    started = time.perf_counter()
+    try:
+        feed.response = fetch_feed(feed.url, headers=feed.headers)
+    except Exception as e:
+        feed.error = e
+    feed.fetch_seconds = time.perf_counter() - started
+    metrics.record_fetch(feed.fetch_seconds)
+    return feed
+
+def record_refresh_failure(calendar_id):
+    """Mark a failed refresh, so the calendar waits out its refresh interval before the next attempt"""
+    db.session.execute(
+        update(Calendar).where(Calendar.id == calendar_id).values(refresh_failed_at=datetime.utcnow())
+    )
+
+def apply_batch(feeds):
+    """
+    Parse and store a batch of downloaded feeds, then commit them together
+
+    Each feed is applied in its own savepoint, so a feed that fails part way
+    through is rolled back alone and the rest of the batch still commits.
+    """
+    change_sets = []
+    for feed in feeds:
+        if feed.error:
+            logging.error(f"Exception fetching ICS feed for calendar {feed.calendar_id}: {feed.error}")
+            record_refresh_failure(feed.calendar_id)
+            metrics.record_outcome('failed')
+            continue
+
+        started = time.perf_counter()
+        try:
+            with db.session.begin_nested():
+                calendar = db.session.get(Calendar, feed.calendar_id)
+                changes = apply_feed_response(calendar, feed.response)
+        except ICSFormatError as e:
+            logging.error(f"Invalid ICS feed for calendar {feed.calendar_id}: {e}")
+            changes = None
+        except Exception as e:
+            logging.error(f"Error applying ICS feed for calendar {feed.calendar_id}: {e}")
+            changes = None
+        finally:
+            metrics.record_apply(time.perf_counter() - started)
+            feed.response.close()
+
+        if changes is None:
+            record_refresh_failure(feed.calendar_id)
+            metrics.record_outcome('failed')
+        elif changes:
+            metrics.record_outcome('updated')
+            change_sets.append(changes)
+        else:
+            metrics.record_outcome('unchanged')
+
+    try:
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error committing refreshed calendars: {e}")
+        return
+
+    for changes in change_sets:
+        notify_event_changes(changes)
+
+def run_refresh_cycle():
+    """
+    Refresh every due calendar
+
+    Feeds are downloaded concurrently on a bounded worker pool. Parsing and
+    database writes stay on this thread and are committed in batches as
+    downloads complete, so a slow host only delays its own calendar.
+    """
+    with app.app_context():
+        started_at = datetime.now()
+        started = time.perf_counter()
+
+        feeds = [
+            FeedFetch(calendar.id, calendar.ics_url, feed_request_headers(calendar))
+            for calendar in get_due_calendars()
+        ]
+        if not feeds:
+            return
+
+        with ThreadPoolExecutor(max_workers=REFRESH_WORKERS) as pool:
+            batch = []
+            for future in as_completed(pool.submit(fetch, feed) for feed in feeds):
+                batch.append(future.result())
+                if len(batch) >= REFRESH_BATCH_SIZE:
+                    apply_batch(batch)
+                    batch = []
+            if batch:
+                apply_batch(batch)
+
+        duration = time.perf_counter() - started
+        metrics.record_cycle(started_at, len(feeds), duration)
+        logging.info(f"Refreshed {len(feeds)} calendars in {duration:.2f}s "
+                     f"(p95 fetch {metrics.percentile(95):.2f}s)")
+
+def get_refresh_metrics():
+    """Return a snapshot of the refresh engine throughput metrics"""
+    return metrics.snapshot()
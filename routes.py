@@ -4,16 +4,26 @@ import uuid
 from datetime import datetime, timedelta
 import pytz
 import re
-from flask import render_template, request, redirect, url_for, session, flash, jsonify, abort
+from flask import render_template, request, redirect, url_for, session, flash, jsonify, abort, make_response
+from sqlalchemy.orm import joinedload
 from werkzeug.security import generate_password_hash, check_password_hash
 from app import db
 from models import User, Calendar, SharedLink, Booking
 from auth import register_user, login_user
+from availability_rules import AvailabilityRules, get_slot_template
+from booking_import import import_bookings, parse_booking_file, summarize_import
 from calendar_sync import (
-    get_calendar_events, get_free_slots, create_booking, 
-    get_booking_analytics, get_calendar_analytics,
+    create_booking, get_booking_analytics, get_calendar_analytics,
     refresh_calendar_events, start_scheduler, update_calendar_refresh_interval
 )
+from job_queue import get_job_stats
+from public_cache import link_validators
+from refresh_engine import get_refresh_metrics
+from slot_cache import (
+    decode_slot_cursor, encode_slot_cursor, get_cache_stats, get_link_free_slots, get_link_slot_page, invalidate_link
+)
+from slot_format import SLOT_FORMATS, compact_slots, encode_slots, json_body_response, verbose_slots
+from config import BOOKING_IMPORT_MAX_ROWS, SLOT_PAGE_MAX_LIMIT
 
 def init_routes(app):
     @app.route('/')
@@ -207,13 +217,22 @@ def init_routes(app):
             # Create a unique link ID
             link_id = str(uuid.uuid4()).replace('-', '')[:16]
             
+            # Only the user's own calendars can be shared
+            calendars = Calendar.query.filter(
+                Calendar.id.in_([int(calendar_id) for calendar_id in calendar_ids]),
+                Calendar.user_id == user_id
+            ).all()
+            if not calendars:
+                flash('Name and at least one calendar are required', 'danger')
+                return redirect(url_for('dashboard'))
+            
             # Create the shared link
             shared_link = SharedLink(
                 user_id=user_id,
                 link_id=link_id,
                 name=name,
                 description=description,
-                calendar_ids=','.join(calendar_ids)
+                calendars=calendars
             )
             
             db.session.add(shared_link)
@@ -231,31 +250,44 @@ def init_routes(app):
     @app.route('/shared/<link_id>')
     def customer_view(link_id):
         """Public view for customers to see available slots and book appointments"""
-        shared_link = SharedLink.query.filter_by(link_id=link_id).first()
+        # Load the link's calendars in the same query
+        shared_link = SharedLink.query.options(joinedload(SharedLink.calendars)).filter_by(link_id=link_id).first()
         
         if not shared_link or not shared_link.active:
             abort(404)
         
-        # Get the calendar IDs from the shared link
-        calendar_ids = shared_link.get_calendar_ids()
-        calendars = Calendar.query.filter(Calendar.id.in_(calendar_ids)).all()
-        
-        if not calendars:
-            flash('No calendars found for this link', 'warning')
-            return render_template('customer_view.html', shared_link=shared_link, slots=[])
+        calendars = shared_link.calendars
         
-        # Default to searching for slots in the next 7 days
+        # The page starts on the next 7 days and loads their slots from /api/slots
         start_date = datetime.now(pytz.utc)
         end_date = start_date + timedelta(days=7)
         
-        # Get free slots across all calendars
-        free_slots = get_free_slots(calendars, start_date, end_date)
-        
-        return render_template('customer_view.html', 
-                              shared_link=shared_link, 
-                              slots=free_slots,
-                              start_date=start_date,
-                              end_date=end_date)
+        if not calendars:
+            flash('No calendars found for this link', 'warning')
+            return render_template('customer_view.html', shared_link=shared_link,
+                                   start_date=start_date, end_date=end_date)
+        
+        # Visitors share one page, signed-in owners get a private one with their navigation,
+        # and a page showing flashed messages (say a failed booking) has no validators. Every
+        # view is revalidated, so a redirect after a failed booking reaches the server and
+        # shows its message, and Vary: Cookie keeps shared caches from mixing up sessions.
+        cacheable = '_flashes' not in session
+        private = 'user_id' in session
+        if cacheable:
+            validators = link_validators(shared_link, calendars, session.get('user_id'), session.get('username'))
+            if validators.is_fresh(request):
+                response = validators.not_modified(private, revalidate=True)
+                response.vary.add('Cookie')
+                return response
+        
+        response = make_response(render_template('customer_view.html', 
+                                                 shared_link=shared_link, 
+                                                 start_date=start_date,
+                                                 end_date=end_date))
+        if cacheable:
+            validators.apply(response, private, revalidate=True)
+        response.vary.add('Cookie')
+        return response
 
     @app.route('/api/slots', methods=['GET'])
     def get_slots_api():
@@ -267,7 +299,8 @@ def init_routes(app):
         if not link_id:
             return jsonify({'error': 'Missing link_id parameter'}), 400
         
-        shared_link = SharedLink.query.filter_by(link_id=link_id).first()
+        # Load the link's calendars in the same query
+        shared_link = SharedLink.query.options(joinedload(SharedLink.calendars)).filter_by(link_id=link_id).first()
         if not shared_link or not shared_link.active:
             return jsonify({'error': 'Shared link not found or inactive'}), 404
         
@@ -278,17 +311,49 @@ def init_routes(app):
         except ValueError:
             return jsonify({'error': 'Invalid date format'}), 400
         
-        # Get the calendar IDs from the shared link
-        calendar_ids = shared_link.get_calendar_ids()
-        calendars = Calendar.query.filter(Calendar.id.in_(calendar_ids)).all()
+        # compact (the default) sends epoch-minute starts, verbose the original slot dicts
+        slot_format = request.args.get('format', 'compact')
+        if slot_format not in SLOT_FORMATS:
+            return jsonify({'error': f"format must be one of {', '.join(SLOT_FORMATS)}"}), 400
+        
+        # Paging: limit caps the slots returned, cursor is the next_cursor of the previous page
+        limit = request.args.get('limit')
+        if limit is not None and not (limit.isdigit() and 1 <= int(limit) <= SLOT_PAGE_MAX_LIMIT):
+            return jsonify({'error': f'limit must be between 1 and {SLOT_PAGE_MAX_LIMIT}'}), 400
+        cursor = request.args.get('cursor')
+        if cursor is not None:
+            try:
+                cursor = decode_slot_cursor(cursor)
+            except ValueError:
+                return jsonify({'error': 'Invalid cursor'}), 400
+        
+        calendars = shared_link.calendars
         
         if not calendars:
             return jsonify({'error': 'No calendars found for this link'}), 404
         
-        # Get free slots across all calendars
-        free_slots = get_free_slots(calendars, start_date, end_date)
+        # Answer revalidations before computing any slots
+        validators = link_validators(shared_link, calendars, request.query_string)
+        if validators.is_fresh(request):
+            response = validators.not_modified()
+            response.vary.add('Accept-Encoding')
+            return response
+        
+        # Without limit or cursor the whole window is returned in one response
+        if limit is None and cursor is None:
+            free_slots = get_link_free_slots(shared_link, calendars, start_date, end_date)
+            next_start = None
+        else:
+            free_slots, next_start = get_link_slot_page(shared_link, calendars, start_date, end_date,
+                                                        int(limit or SLOT_PAGE_MAX_LIMIT), after=cursor)
         
-        return jsonify({'slots': free_slots})
+        if slot_format == 'compact':
+            payload = compact_slots(free_slots, get_slot_template(shared_link).slot_duration)
+        else:
+            payload = verbose_slots(free_slots)
+        if limit is not None or cursor is not None:
+            payload['next_cursor'] = encode_slot_cursor(next_start) if next_start else None
+        return json_body_response(request, encode_slots(payload, slot_format), validators)
 
     @app.route('/book', methods=['POST'])
     def book_appointment():
@@ -338,6 +403,80 @@ def init_routes(app):
             flash('An error occurred while booking the appointment', 'danger')
             return redirect(url_for('customer_view', link_id=link_id))
 
+    @app.route('/api/links/<int:shared_link_id>/bookings/import', methods=['POST'])
+    def import_bookings_api(shared_link_id):
+        """
+        API endpoint to import many bookings into a shared link
+        
+        Accepts a JSON list (or {"bookings": [...]}), a CSV body with a
+        header line, or either one uploaded as "file". Pass
+        check_calendars=false to skip checking calendar events, for history
+        the calendars already contain.
+        """
+        if 'user_id' not in session:
+            return jsonify({'error': 'Not authenticated'}), 401
+        
+        shared_link = SharedLink.query.options(joinedload(SharedLink.calendars)).filter_by(
+            id=shared_link_id, user_id=session['user_id']).first()
+        if not shared_link:
+            return jsonify({'error': 'Shared link not found'}), 404
+        
+        upload = request.files.get('file')
+        if upload:
+            content = upload.read().decode('utf-8-sig')
+            file_format = 'json' if upload.filename.lower().endswith('.json') else 'csv'
+        else:
+            content = request.get_data(as_text=True)
+            file_format = 'json' if request.is_json else 'csv'
+        file_format = request.args.get('format', file_format)
+        
+        try:
+            rows = parse_booking_file(content, file_format)
+        except ValueError as e:
+            return jsonify({'error': f'Invalid {file_format} input: {e}'}), 400
+        if len(rows) > BOOKING_IMPORT_MAX_ROWS:
+            return jsonify({'error': f'At most {BOOKING_IMPORT_MAX_ROWS} bookings can be imported at once'}), 413
+        
+        check_calendars = request.args.get('check_calendars', 'true').lower() not in ('0', 'false', 'no')
+        results = import_bookings(shared_link, rows, check_calendars=check_calendars)
+        return jsonify({**summarize_import(results), 'results': results})
+
+    @app.route('/api/links/<int:link_id>/availability', methods=['GET', 'PUT'])
+    def link_availability_api(link_id):
+        """
+        API endpoint to read or replace the availability rules of a shared link
+        
+        PUT takes a JSON object with any of timezone, weekly_hours
+        ({"monday": [["09:00", "17:00"]], ...}), slot_duration, slot_step,
+        buffer_before, buffer_after and minimum_notice (all in minutes);
+        settings that are left out get their defaults.
+        """
+        if 'user_id' not in session:
+            return jsonify({'error': 'Not authenticated'}), 401
+        
+        shared_link = SharedLink.query.filter_by(id=link_id, user_id=session['user_id']).first()
+        if not shared_link:
+            return jsonify({'error': 'Shared link not found'}), 404
+        
+        if request.method == 'GET':
+            return jsonify(AvailabilityRules.from_json(shared_link.availability_rules).to_dict())
+        
+        try:
+            rules = AvailabilityRules.from_dict(request.get_json(silent=True))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        try:
+            shared_link.availability_rules = rules.to_json()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error updating availability rules: {e}")
+            return jsonify({'error': 'Failed to update availability rules'}), 500
+        
+        invalidate_link(shared_link)
+        return jsonify(rules.to_dict())
+
     @app.route('/success/<int:booking_id>')
     def booking_success(booking_id):
         """Success page after booking an appointment"""
@@ -526,6 +665,30 @@ def init_routes(app):
         
         return jsonify(analytics_data)
 
+    @app.route('/api/refresh/metrics', methods=['GET'])
+    def refresh_metrics_api():
+        """API endpoint for calendar refresh throughput metrics"""
+        if 'user_id' not in session:
+            return jsonify({'error': 'Not authenticated'}), 401
+        
+        return jsonify(get_refresh_metrics())
+
+    @app.route('/api/availability/cache', methods=['GET'])
+    def availability_cache_api():
+        """API endpoint for availability cache hit/miss counters"""
+        if 'user_id' not in session:
+            return jsonify({'error': 'Not authenticated'}), 401
+        
+        return jsonify(get_cache_stats())
+
+    @app.route('/api/jobs/stats', methods=['GET'])
+    def job_stats_api():
+        """API endpoint for background job queue counters"""
+        if 'user_id' not in session:
+            return jsonify({'error': 'Not authenticated'}), 401
+        
+        return jsonify(get_job_stats())
+
     @app.errorhandler(404)
     def page_not_found(e):
         return render_template('404.html'), 404
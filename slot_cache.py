@@ -0,0 +1,407 @@
+import base64
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import numpy as np
+import pytz
+from availability import merge_intervals, to_utc
+from availability_bitmap import bitmap_free_mask, busy_bitmap, cells_per_day
+from availability_rules import get_slot_template
+from calendar_sync import (
+    get_booked_intervals, get_booking_watermark, get_calendar_event_columns, get_free_slots,
+    get_shared_link_ids_for_calendars, on_booking_committed, on_events_changed
+)
+from config import (
+    AVAILABILITY_CACHE_SIZE, AVAILABILITY_CACHE_TTL, AVAILABILITY_ENGINE, BITMAP_CACHE_DAYS, BITMAP_RESOLUTION,
+    SLOT_PAGE_CHUNK_DAYS
+)
+
+EPOCH = datetime(1970, 1, 1, tzinfo=pytz.UTC)
+
+class AvailabilityCache:
+    """
+    LRU cache of free slots keyed by (shared link ID, window start, window end, availability rules, data version)
+
+    The data version (see link_data_version) changes whenever any process
+    syncs one of the link's calendars or takes a booking on them, so such
+    changes make entries miss in every process. Entries expire after
+    ttl_seconds, and are dropped early in the process that saw a member
+    calendar or a booking change availability inside their busy window: the range whose busy
+    time the slots were checked against, which reaches past the slot
+    window by the slot duration and the buffers.
+    """
+
+    def __init__(self, max_entries=AVAILABILITY_CACHE_SIZE, ttl_seconds=AVAILABILITY_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, slots, busy_window):
+        """Store the slots of a key, with the (start, end) UTC range of busy time they depend on"""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, slots, busy_window)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, link_ids, intervals=None):
+        """
+        Drop entries of the given links
+
+        With intervals (sorted, non-overlapping UTC ranges), only entries whose
+        busy window overlaps one of them are dropped.
+        """
+        link_ids = set(link_ids)
+        starts = [start for start, _ in intervals] if intervals else None
+        with self._lock:
+            stale = []
+            for key, (_, _, (busy_start, busy_end)) in self._entries.items():
+                if key[0] not in link_ids:
+                    continue
+                if intervals is not None:
+                    # The last interval starting before the busy window ends is the only
+                    # one that can overlap, since the intervals do not overlap each other
+                    index = bisect_left(starts, busy_end) - 1
+                    if index < 0 or intervals[index][1] <= busy_start:
+                        continue
+                stale.append(key)
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+availability_cache = AvailabilityCache()
+
+class CalendarBitmapCache:
+    """
+    LRU cache of busy bitmaps keyed by (calendar ID, UTC day number)
+
+    Each entry is one day of a calendar at BITMAP_RESOLUTION minutes per
+    cell (288 bytes at 5 minutes), stored with the calendar's last_synced
+    so that a day built before a sync in another process misses. Days
+    expire after ttl_seconds and are dropped early when a refresh in this
+    process changes the calendar's events on them.
+    """
+
+    def __init__(self, max_days=BITMAP_CACHE_DAYS, ttl_seconds=AVAILABILITY_CACHE_TTL):
+        self.max_days = max_days
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get_many(self, calendar_id, day_numbers, version):
+        """The cached bitmaps among the given days built at this version of the calendar, as {day number: array}"""
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for day in day_numbers:
+                key = (calendar_id, day)
+                entry = self._entries.get(key)
+                if entry is None or entry[0] < now or entry[2] != version:
+                    if entry is not None:
+                        del self._entries[key]
+                    self.misses += 1
+                    continue
+                self._entries.move_to_end(key)
+                self.hits += 1
+                found[day] = entry[1]
+        return found
+
+    def put_many(self, calendar_id, bitmaps, version):
+        """Store {day number: array} for a calendar at a version (its last_synced)"""
+        expires = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            for day, bitmap in bitmaps.items():
+                self._entries[(calendar_id, day)] = (expires, bitmap, version)
+                self._entries.move_to_end((calendar_id, day))
+            while len(self._entries) > self.max_days:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, calendar_id, intervals):
+        """Drop the calendar's days that overlap one of the sorted, non-overlapping UTC intervals"""
+        starts = [start for start, _ in intervals]
+        with self._lock:
+            stale = []
+            for key in self._entries:
+                if key[0] != calendar_id:
+                    continue
+                day_start = EPOCH + timedelta(days=key[1])
+                # As in AvailabilityCache.invalidate, only the last interval starting before the day ends can overlap
+                index = bisect_left(starts, day_start + timedelta(days=1)) - 1
+                if index >= 0 and intervals[index][1] > day_start:
+                    stale.append(key)
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+calendar_bitmaps = CalendarBitmapCache()
+
+def day_number(value):
+    """Days from 1970-01-01 to the UTC day of a datetime"""
+    return (to_utc(value) - EPOCH).days
+
+def naive_utc_array(values):
+    """Aware datetimes as a naive UTC datetime64[us] array (via POSIX timestamps, which is much faster)"""
+    timestamps = np.fromiter((value.timestamp() for value in values), dtype=np.float64, count=len(values))
+    return np.round(timestamps * 1e6).astype(np.int64).astype('datetime64[us]')
+
+def get_calendar_bitmap(calendar, first_day, days):
+    """
+    Busy bitmap of a calendar for `days` UTC days from day number first_day
+
+    Days missing from the cache are built from one event load covering
+    all of them. Returns None if the calendar's events cannot be loaded.
+    """
+    day_numbers = range(first_day, first_day + days)
+    bitmaps = calendar_bitmaps.get_many(calendar.id, day_numbers, calendar.last_synced)
+    missing = [day for day in day_numbers if day not in bitmaps]
+    if missing:
+        span_start = EPOCH + timedelta(days=missing[0])
+        span_days = missing[-1] - missing[0] + 1
+        columns = get_calendar_event_columns(calendar, span_start, span_start + timedelta(days=span_days))
+        if columns is None:
+            return None
+        busy = columns.busy
+        built = busy_bitmap(columns.starts[busy], columns.ends[busy],
+                            np.datetime64(span_start.replace(tzinfo=None), 'us'), span_days, BITMAP_RESOLUTION)
+        new = {day: built[day - missing[0]] for day in missing}
+        calendar_bitmaps.put_many(calendar.id, new, calendar.last_synced)
+        bitmaps.update(new)
+    return np.stack([bitmaps[day] for day in day_numbers])
+
+def get_bitmap_free_slots(calendars, start_date, end_date, shared_link):
+    """
+    get_free_slots on busy bitmaps instead of interval lists
+
+    Each calendar's busy time comes from cached per-day bitmaps, so for
+    windows seen before, combining the calendars is a vectorized OR and
+    checking every slot is one prefix-sum lookup. Busy time is rounded out
+    to whole cells, so the slots match get_free_slots whenever events and
+    slots fall on BITMAP_RESOLUTION boundaries; otherwise a slot within one
+    cell of busy time may be left out, never a busy slot let in.
+    """
+    template = get_slot_template(shared_link)
+    slots = list(template.iter_slots(start_date, end_date))
+    if not slots:
+        return []
+
+    busy_start = slots[0].start - template.buffer_before
+    busy_end = slots[-1].end + template.buffer_after
+    first_day = day_number(busy_start)
+    days = day_number(busy_end - timedelta(microseconds=1)) - first_day + 1
+    origin = np.datetime64((EPOCH + timedelta(days=first_day)).replace(tzinfo=None), 'us')
+
+    busy = np.zeros((days, cells_per_day(BITMAP_RESOLUTION)), dtype=bool)
+    for calendar in calendars:
+        bitmap = get_calendar_bitmap(calendar, first_day, days)
+        if bitmap is not None:
+            busy |= bitmap
+
+    # Bookings change with every booking, so they are marked per request rather than cached
+    booked = get_booked_intervals(shared_link.id, [calendar.id for calendar in calendars], busy_start, busy_end)
+    if booked:
+        busy |= busy_bitmap(naive_utc_array([start for start, _ in booked]),
+                            naive_utc_array([end for _, end in booked]), origin, days, BITMAP_RESOLUTION)
+
+    # Every slot has the same length, so the ends follow from the starts
+    starts = naive_utc_array([slot.start for slot in slots])
+    free = bitmap_free_mask(starts - np.timedelta64(template.buffer_before),
+                            starts + np.timedelta64(template.duration + template.buffer_after),
+                            busy, origin, BITMAP_RESOLUTION)
+    return [slot for slot, is_free in zip(slots, free) if is_free]
+
+def align_window(start_date, end_date, step):
+    """
+    Round a window outward to multiples of step after midnight UTC
+
+    Pages default to "now", so without this every request would have a
+    different key.
+    """
+    start_date, end_date = to_utc(start_date), to_utc(end_date)
+    day_start = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
+    aligned_start = day_start + ((start_date - day_start) // step) * step
+
+    day_end = end_date.replace(hour=0, minute=0, second=0, microsecond=0)
+    end_steps = -((day_end - end_date) // step)  # Ceiling division
+    aligned_end = day_end + end_steps * step
+    return aligned_start, max(aligned_start, aligned_end)
+
+def link_data_version(shared_link, calendars):
+    """
+    What a link's free slots depend on besides its rules and the clock
+
+    The sync times of its calendars and the bookings that can block them;
+    public_cache builds its validators from the same inputs.
+    """
+    booking_count, last_booking_id, _ = get_booking_watermark(shared_link.id, [calendar.id for calendar in calendars])
+    return tuple((calendar.id, calendar.last_synced) for calendar in calendars), booking_count, last_booking_id
+
+def get_link_free_slots(shared_link, calendars, start_date, end_date, data_version=None):
+    """
+    Return the free slots of a shared link that start in [start_date, end_date)
+
+    Repeated windows are served from the cache. Slots inside the link's
+    minimum notice are dropped on the way out, since that moves with the
+    clock rather than with the calendars. Pass data_version when it is
+    already known (from link_data_version) to save its query.
+    """
+    template = get_slot_template(shared_link)
+    window_start, window_end = align_window(start_date, end_date, template.step)
+    if data_version is None:
+        data_version = link_data_version(shared_link, calendars)
+    # The stored rules and the data version are part of the key, so edited rules or
+    # calendars synced and bookings taken by other processes never see old slots
+    key = (shared_link.id, window_start, window_end, shared_link.availability_rules, data_version)
+
+    slots = availability_cache.get(key)
+    if slots is None:
+        if AVAILABILITY_ENGINE == 'bitmap':
+            slots = get_bitmap_free_slots(calendars, window_start, window_end, shared_link)
+        else:
+            slots = get_free_slots(calendars, window_start, window_end, shared_link=shared_link)
+        # Busy time this far outside the window can still touch a slot or its buffers
+        busy_window = (window_start - template.buffer_before, window_end + template.duration + template.buffer_after)
+        availability_cache.put(key, slots, busy_window)
+
+    earliest = to_utc(start_date)
+    if template.minimum_notice:
+        earliest = max(earliest, template.earliest_start())
+    first = bisect_left(slots, earliest, key=lambda slot: slot.start)
+    last = bisect_left(slots, to_utc(end_date), key=lambda slot: slot.start)
+    return slots[first:last]
+
+def iter_link_free_slots(shared_link, calendars, start_date, end_date, chunk_days=SLOT_PAGE_CHUNK_DAYS):
+    """
+    Yield the free slots of a shared link, computing chunk_days at a time
+
+    Chunks end at midnight UTC and each is cached like any other window.
+    """
+    chunk_start = to_utc(start_date)
+    end_date = to_utc(end_date)
+    data_version = link_data_version(shared_link, calendars)
+    while chunk_start < end_date:
+        midnight = chunk_start.replace(hour=0, minute=0, second=0, microsecond=0)
+        chunk_end = min(end_date, midnight + timedelta(days=chunk_days))
+        yield from get_link_free_slots(shared_link, calendars, chunk_start, chunk_end, data_version)
+        chunk_start = chunk_end
+
+def get_link_slot_page(shared_link, calendars, start_date, end_date, limit, after=None):
+    """
+    Return up to limit free slots starting at or after `after`, and the start of the next one (or None)
+
+    Only the chunks needed to fill the page are computed, so the first page
+    costs the same whatever the length of the window.
+    """
+    if after is not None:
+        start_date = max(to_utc(start_date), to_utc(after))
+    page = []
+    for slot in iter_link_free_slots(shared_link, calendars, start_date, end_date):
+        if len(page) == limit:
+            return page, slot.start
+        page.append(slot)
+    return page, None
+
+def encode_slot_cursor(slot_start):
+    """An opaque, URL-safe cursor for the slot starting at slot_start"""
+    return base64.urlsafe_b64encode(slot_start.isoformat().encode()).decode().rstrip('=')
+
+def decode_slot_cursor(cursor):
+    """The slot start a cursor stands for; raises ValueError for a malformed cursor"""
+    try:
+        value = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+    return datetime.fromisoformat(value)
+
+@on_events_changed
+def invalidate_for_event_changes(changes):
+    """Drop cached windows of every link that includes the refreshed calendar"""
+    link_ids = get_shared_link_ids_for_calendars([changes.calendar_id])
+    if link_ids:
+        dropped = availability_cache.invalidate(link_ids, merge_intervals(changes.intervals))
+        logging.debug(f"Calendar {changes.calendar_id} changed, dropped {dropped} cached availability windows")
+
+@on_events_changed
+def invalidate_calendar_bitmaps(changes):
+    """Drop the refreshed calendar's cached bitmap days that the changes touch"""
+    dropped = calendar_bitmaps.invalidate(changes.calendar_id, merge_intervals(changes.intervals))
+    if dropped:
+        logging.debug(f"Calendar {changes.calendar_id} changed, dropped {dropped} cached busy bitmap days")
+
+def invalidate_booked_time(shared_link, intervals):
+    """Drop cached windows that cover newly booked UTC ranges, for every link sharing the link's calendars"""
+    link_ids = get_shared_link_ids_for_calendars(shared_link.get_calendar_ids())
+    link_ids.append(shared_link.id)
+    return availability_cache.invalidate(link_ids, merge_intervals(intervals))
+
+@on_booking_committed
+def invalidate_for_booking(booking):
+    """Drop cached windows that cover a new booking"""
+    invalidate_booked_time(booking.shared_link, [(to_utc(booking.start_time), to_utc(booking.end_time))])
+
+def invalidate_link(shared_link):
+    """Drop every cached window of a link, such as after its availability rules change"""
+    return availability_cache.invalidate([shared_link.id])
+
+def get_cache_stats():
+    """Return hit/miss counters for the availability cache and the calendar bitmap cache"""
+    return {**availability_cache.stats(), 'engine': AVAILABILITY_ENGINE, 'bitmaps': calendar_bitmaps.stats()}
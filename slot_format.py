@@ -0,0 +1,51 @@
+"""
+Wire formats for /api/slots
+
+The compact format sends slot starts as minutes since the Unix epoch (UTC)
+with the slot duration given once, encoded with orjson:
+
+    {"format": "compact", "duration": 30, "starts": [31613040, 31613070, ...]}
+
+The verbose format is the original list of slot dicts, encoded by Flask.
+Either body is gzipped for clients that accept it and carries the link's
+validators from public_cache, so an unchanged response is answered with
+304 Not Modified.
+"""
+
+import gzip
+import orjson
+from flask import Response, current_app
+from config import SLOTS_GZIP_LEVEL, SLOTS_GZIP_MIN_BYTES
+
+SLOT_FORMATS = ('compact', 'verbose')
+
+def compact_slots(slots, duration):
+    """Slots as epoch-minute starts sharing one duration"""
+    return {'format': 'compact', 'duration': duration, 'starts': [int(slot.start.timestamp()) // 60 for slot in slots]}
+
+def verbose_slots(slots):
+    """Slots in the original shape, one dict with its display strings per slot"""
+    return {'slots': [slot.to_dict() for slot in slots]}
+
+def encode_slots(payload, slot_format):
+    """The JSON body for a payload built by compact_slots or verbose_slots"""
+    if slot_format == 'compact':
+        return orjson.dumps(payload)
+    # Keep Flask's encoding (HTTP dates for datetimes) for existing clients of the verbose shape
+    return current_app.json.dumps(payload).encode()
+
+def json_body_response(request, body, validators):
+    """
+    Respond with an encoded JSON body, gzipped when worthwhile
+
+    The response carries the weak ETag, Last-Modified and Cache-Control of
+    the link's validators (see public_cache); the caller answers
+    revalidations before building the body.
+    """
+    compress = len(body) >= SLOTS_GZIP_MIN_BYTES and request.accept_encodings['gzip'] > 0
+    response = Response(gzip.compress(body, SLOTS_GZIP_LEVEL) if compress else body, mimetype='application/json')
+    if compress:
+        response.content_encoding = 'gzip'
+    validators.apply(response)
+    response.vary.add('Accept-Encoding')
+    return response
@@ -161,19 +161,27 @@ function showBookingForm(event) {
             document.getElementById('startTimeInput').value = event.start.toISOString();
             document.getElementById('endTimeInput').value = event.end.toISOString();
             
-            // Format for display
-            const options = { 
-                weekday: 'long', 
-                year: 'numeric', 
-                month: 'long', 
-                day: 'numeric',
-                hour: '2-digit',
-                minute: '2-digit'
-            };
-            const formattedStart = event.start.toLocaleString('en-US', options);
-            const formattedEnd = event.end.toLocaleTimeString('en-US', { hour: '2-digit', minute: '2-digit' });
-            
-            document.getElementById('selectedSlot').value = `${formattedStart} - ${formattedEnd}`;
+            document.getElementById('selectedSlot').value = formatSlotLabel(event.start, event.end);
         }
     }
 }
+
+/**
+ * Label a slot for display, in the visitor's time zone
+ * @param {Date} start - Start of the slot
+ * @param {Date} end - End of the slot
+ * @returns {string} - For example "Monday, January 6, 2025 at 09:00 AM - 09:30 AM"
+ */
+function formatSlotLabel(start, end) {
+    const options = { 
+        weekday: 'long', 
+        year: 'numeric', 
+        month: 'long', 
+        day: 'numeric',
+        hour: '2-digit',
+        minute: '2-digit'
+    };
+    const formattedStart = start.toLocaleString('en-US', options);
+    const formattedEnd = end.toLocaleTimeString('en-US', { hour: '2-digit', minute: '2-digit' });
+    return `${formattedStart} - ${formattedEnd}`;
+}
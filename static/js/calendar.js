@@ -2,9 +2,9 @@ document.addEventListener('DOMContentLoaded', function() {
     // Calendar view functionality
     // This file is loaded on pages that display a calendar
 
-    // Initialize calendar if the element exists
+    // Initialize calendar if the element exists (pages marked data-page-calendar set up their own)
     const calendarEl = document.getElementById('calendar');
-    if (calendarEl) {
+    if (calendarEl && !calendarEl.hasAttribute('data-page-calendar')) {
         initializeCalendar(calendarEl);
     }
 
@@ -145,3 +145,70 @@ function fetchEvents(startDate, endDate) {
         })
         .then(data => data.events || []);
 }
+
+/**
+ * Decode a compact /api/slots response into slots
+ * @param {Object} data - The response: {duration, starts} with starts in minutes since the Unix epoch (UTC)
+ * @returns {Array<Object>} - Slots with start and end Dates and the duration in minutes
+ */
+function decodeSlots(data) {
+    const duration = data.duration;
+    return (data.starts || []).map(minutes => ({
+        start: new Date(minutes * 60000),
+        end: new Date((minutes + duration) * 60000),
+        duration: duration
+    }));
+}
+
+/**
+ * The hours and days a time grid needs to show every slot, in the visitor's time zone
+ * @param {Array<Object>} slots - Decoded slots
+ * @returns {Object} - FullCalendar slotMinTime, slotMaxTime and weekends options (office hours when there are no slots)
+ */
+function slotViewRange(slots) {
+    if (!slots.length) {
+        return { slotMinTime: '09:00:00', slotMaxTime: '17:00:00', weekends: false };
+    }
+    let first = 24 * 60;
+    let last = 0;
+    let weekends = false;
+    slots.forEach(slot => {
+        const start = slot.start.getHours() * 60 + slot.start.getMinutes();
+        // A slot that runs past midnight needs the grid to reach the end of the day
+        const sameDay = slot.end.toDateString() === slot.start.toDateString();
+        const end = sameDay ? slot.end.getHours() * 60 + slot.end.getMinutes() : 24 * 60;
+        first = Math.min(first, start);
+        last = Math.max(last, end);
+        weekends = weekends || slot.start.getDay() === 0 || slot.start.getDay() === 6;
+    });
+    const hours = minutes => `${String(minutes / 60).padStart(2, '0')}:00:00`;
+    return {
+        slotMinTime: hours(Math.floor(first / 60) * 60),
+        slotMaxTime: hours(Math.ceil(last / 60) * 60),
+        weekends: weekends
+    };
+}
+
+/**
+ * Fetch the free slots of a shared link in the compact format
+ * @param {string} linkId - The shared link ID
+ * @param {Date} startDate - Start of the window
+ * @param {Date} endDate - End of the window
+ * @returns {Promise<Array>} - Promise resolving to the decoded slots
+ */
+function fetchAvailableSlots(linkId, startDate, endDate) {
+    const params = new URLSearchParams({
+        link_id: linkId,
+        start_date: startDate.toISOString(),
+        end_date: endDate.toISOString(),
+        format: 'compact'
+    });
+    return fetch(`/api/slots?${params}`)
+        .then(response => response.json())
+        .then(data => {
+            if (data.error) {
+                throw new Error(data.error);
+            }
+            return decodeSlots(data);
+        });
+}